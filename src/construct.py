@@ -1,103 +1,348 @@
-from langchain_neo4j import Neo4jGraph
+import argparse
+import asyncio
+import contextlib
+from statistics import mean
+
 from langchain_core.documents import Document
 from langchain_experimental.graph_transformers import LLMGraphTransformer
+from langchain_community.graphs.graph_document import GraphDocument
 
-from schema.disease_schema import (
-    node_types as disease_node_types,
-    allowed_relationships as disease_allowed_relationships,
+from utils import (
+    dataframe_to_documents,
+    diff_excel_rows,
+    load_dataframe_from_excel,
+    merge_graph_documents,
+    split_document,
+    validate_graph_document,
 )
-from utils import load_document_from_excel
 from schema.disease_schema import node_types, relation_types, allowed_relationships
+from rule_extraction import (
+    extract_rule_graph_documents,
+    known_entities_prompt,
+    llm_schema,
+    row_entity_ids,
+    rule_columns,
+)
 from prompts.graph_schema_prompt import graph_schema_prompt
+from materialize import create_materialized_indexes, materialize_degree_properties
+from diagnosis import build_diagnosis_index
+from entity_linker import update_entity_index
+from text_index import build_text_index
+from graph_buffer import GraphBuffer
+from ingestion_plan import IngestionPlan, PlannedCall
+from groups import check_group_id, clear_group, create_group_indexes, group_write_statements
 from prompts.entity_and_relation_extraction_prompt import entities_and_relationships_extraction_prompt
-from deps.llm_client import get_llm_client
+from deps.graph_client import get_graph_client
+from deps.llm_cassette import AUTO, REPLAY, CassetteChatModel, CassetteMissError
+from deps.llm_client import ModelRouter, collect_usage, find_proxy, usage_totals
+from deps.token_accounting import TokenLedger
 from settings import settings
 
 
-graph_client = Neo4jGraph(
-    url=settings.graph_db.graph_db_url,
-    username=settings.graph_db.graph_db_user,
-    password=settings.graph_db.graph_db_password,
-)
+# Labels extracted by rules are left out of the LLM's schema (and prompt)
+if settings.rule_based_extraction:
+    llm_node_types, llm_relation_types, llm_allowed_relationships = llm_schema(
+        node_types, relation_types, allowed_relationships
+    )
+else:
+    llm_node_types, llm_relation_types, llm_allowed_relationships = node_types, relation_types, allowed_relationships
+
+# Short rows are extracted by `llm_small_model` first and escalate to `llm_model` on schema failures
+router = ModelRouter(settings)
+
+llm_transformers = {
+    route: LLMGraphTransformer(
+        llm=router.llm(route),
+        allowed_nodes=[node_type["label"] for node_type in llm_node_types],
+        allowed_relationships=llm_allowed_relationships,
+    )
+    for route in (ModelRouter.SMALL, ModelRouter.LARGE)
+}
 
-llm_client = get_llm_client(settings)
+# Token usage per request / row / run, and the per-stage prompt budgets
+ledger = TokenLedger(settings)
 
-llm_transformer = LLMGraphTransformer(
-    llm=llm_client,
-    allowed_nodes=[node_type["label"] for node_type in disease_node_types],
-    allowed_relationships=disease_allowed_relationships,
+# Bounds the extraction calls in flight (`extraction_concurrency`)
+extraction_slots = (
+    asyncio.Semaphore(settings.extraction_concurrency) if settings.extraction_concurrency else contextlib.nullcontext()
 )
 
 disease_graph_schema = graph_schema_prompt(
-    node_types,
-    relation_types,
-    allowed_relationships,
+    llm_node_types,
+    llm_relation_types,
+    llm_allowed_relationships,
 )
 
 
+def render_extraction_document(document: str, known_entities: str = "None") -> Document:
+    """Wrap a row document in the extraction prompt."""
+    content = entities_and_relationships_extraction_prompt.invoke(
+        input={
+            "graph_schema": disease_graph_schema,
+            "category": "disease",
+            "document": document,
+            "known_entities": known_entities,
+        }
+    ).text
+    return Document(page_content=content)
+
+
+def render_transformer_prompt(document: Document) -> str:
+    """Full prompt text the graph transformer sends for `document`, for offline token counting."""
+    return llm_transformers[ModelRouter.LARGE].chain.first.invoke({"input": document.page_content}).to_string()
+
+
+def prepare_extraction_documents(document: str, known_entities: str = "None") -> list[Document]:
+    """Render a row for extraction, split into several documents when it exceeds the extraction token budget."""
+    enhanced_document = render_extraction_document(document, known_entities)
+    if not ledger.over_budget("extraction", render_transformer_prompt(enhanced_document)):
+        return [enhanced_document]
+
+    overhead = ledger.count_tokens(render_transformer_prompt(render_extraction_document("", known_entities)))
+    parts = split_document(document, ledger.budget("extraction") - overhead, ledger.count_tokens)
+    ledger.note("extraction", split=1)
+    return [render_extraction_document(part, known_entities) for part in parts]
+
+
+async def extract_graph_document(document: Document, row_text: str, row: int) -> GraphDocument:
+    """Extract one row, escalating to the large model when the output fails schema checks."""
+    routes = router.routes(prefer_small=len(row_text) <= settings.llm_small_model_max_row_chars)
+    prompt_text = render_transformer_prompt(document)
+
+    for route in routes:
+        async with extraction_slots:
+            with router.track("extraction", route) as record, ledger.track("extraction", prompt_text, row=row):
+                graph_document = await llm_transformers[route].aprocess_response(document)
+                problems = validate_graph_document(graph_document, llm_node_types, llm_allowed_relationships)
+                if problems and route != routes[-1]:
+                    record.reject("; ".join(problems))
+                    continue
+        return graph_document
+
+
+async def extract_row(row: int, document: str, known_entities: str = "None") -> GraphDocument:
+    """Extract a row, merging the graphs of its parts when it had to be split."""
+    enhanced_documents = prepare_extraction_documents(document, known_entities)
+    graph_documents = await asyncio.gather(
+        *(
+            extract_graph_document(enhanced_document, enhanced_document.page_content, row)
+            for enhanced_document in enhanced_documents
+        )
+    )
+    if len(graph_documents) == 1:
+        return graph_documents[0]
+    return merge_graph_documents(graph_documents, source=Document(page_content=document))
+
+
+async def extract_row_into(
+    buffer: GraphBuffer,
+    row: int,
+    document: str,
+    known_entities: str = "None",
+    rule_document: GraphDocument | None = None,
+) -> None:
+    """Extract a row and add it, with its rule-extracted graph, to the run's buffer; the documents are dropped."""
+    row_documents = [await extract_row(row, document, known_entities)]
+    if rule_document is not None:
+        row_documents.append(rule_document)
+
+    n_nodes, n_relations = buffer.n_nodes, buffer.n_relationships
+    for graph_document in row_documents:
+        buffer.add_graph_document(graph_document)
+    print(
+        f"Document #{row + 1}: {sum(len(d.nodes) for d in row_documents)} nodes, "
+        f"{sum(len(d.relationships) for d in row_documents)} relations "
+        f"({buffer.n_nodes - n_nodes} new nodes, {buffer.n_relationships - n_relations} new relations)"
+    )
+
+
+def prepare_rows(df) -> tuple[list[str], list[str], list[GraphDocument | None]]:
+    """Per row: the document the LLM extracts, its known-entities prompt section and its rule-extracted graph."""
+    if not settings.rule_based_extraction:
+        return dataframe_to_documents(df), ["None"] * len(df), [None] * len(df)
+
+    # Rule columns are extracted deterministically; the LLM sees the rest of the row and the row's entity id
+    rule_documents = extract_rule_graph_documents(df)
+    documents = dataframe_to_documents(df.drop(columns=[c for c in rule_columns() if c in df.columns]))
+    known_entities = [known_entities_prompt(entity_id) for entity_id in row_entity_ids(df)]
+    print(
+        f"Rule-based extraction: {sum(len(d.nodes) for d in rule_documents)} nodes, "
+        f"{sum(len(d.relationships) for d in rule_documents)} relations from {rule_columns()}."
+    )
+    return documents, known_entities, rule_documents
+
+
 async def construct_knowledge_graph(
     data_path: str,
     sheet_name: str,
     ignored_column_names: list[str] = None,
     clear_existing_graph: bool = True,
+    group_id: str | None = settings.kg_group_id,
 ):
+    """Extract the sheet into a knowledge graph and rebuild the local indexes.
+
+    With a `group_id`, nodes and relationships are written to that group's
+    partition and `clear_existing_graph` clears only that group.
+    """
+    # Writes go through the async driver so they do not block the event loop extraction runs on
+    graph_client = get_graph_client(settings)
     try:
-        documents = load_document_from_excel(
+        if group_id is not None:
+            check_group_id(group_id)
+
+        df = load_dataframe_from_excel(
             file_path=data_path,
             sheet_name=sheet_name,
             ignored_column_names=ignored_column_names,
         )
 
-        # Convert documents to graph format with enhanced context
-        enhanced_documents = []
-        for document in documents:
-            content = entities_and_relationships_extraction_prompt.invoke(
-                input={
-                    "graph_schema": disease_graph_schema,
-                    "category": "disease",
-                    "document": document,
-                }
-            ).text
-            enhanced_documents.append(Document(page_content=content))
-
-        # Convert to graph documents
-        graph_documents = await llm_transformer.aconvert_to_graph_documents(enhanced_documents)
-
-        # Print graph information
-        total_nodes, total_relations = 0, 0
-        for i, graph_document in enumerate(graph_documents):
-            n_nodes = len(graph_document.nodes)
-            n_relations = len(graph_document.relationships)
-            print(f"\nDocument #{i+1}:")
-            print(f"  Nodes ({n_nodes}): {graph_document.nodes}")
-            print(f"  Relations ({n_relations}): {graph_document.relationships}")
-            total_nodes += n_nodes
-            total_relations += n_relations
-
-        print(f"\nTotal nodes created: {total_nodes}")
-        print(f"Total relations created: {total_relations}")
+        documents, known_entities, rule_documents = prepare_rows(df)
+
+        # One extraction per row (or per part of an oversized row), collected into a compact, de-duplicated buffer
+        buffer = GraphBuffer()
+        await asyncio.gather(
+            *(
+                extract_row_into(buffer, row, document, known_entities[row], rule_documents[row])
+                for row, document in enumerate(documents)
+            )
+        )
+        print(f"\nTotal nodes created: {buffer.n_nodes}")
+        print(f"Total relations created: {buffer.n_relationships}")
 
         if clear_existing_graph:
-            print(f"Clearing existing data from {settings.graph_db_provider}...")
-            graph_client.query("MATCH (n) DETACH DELETE n")
+            # Without a group only the untagged nodes go; other groups sharing the database are kept
+            scope = f"group {group_id!r}" if group_id is not None else "untagged data"
+            print(f"Clearing {scope} from {settings.graph_db_provider}...")
+            print(f"Deleted {await asyncio.to_thread(clear_group, graph_client, group_id)} nodes.")
 
         print(f"Adding graph documents to {settings.graph_db_provider}...")
-        graph_client.add_graph_documents(graph_documents)
+        if group_id is not None:
+            await asyncio.to_thread(create_group_indexes, graph_client)
+        statements, n_nodes, n_relations = group_write_statements(buffer, group_id)
+        await graph_client.aexecute_write(statements)
+        print(f"Wrote {n_nodes} nodes and {n_relations} relations" + (f" to group {group_id!r}." if group_id else "."))
+
+        # A full rebuild recomputes every count; otherwise only the nodes the new triples touch
+        touched = None if clear_existing_graph else buffer.touched_node_ids()
+        await asyncio.to_thread(create_materialized_indexes, graph_client)
+        n_updated = await asyncio.to_thread(materialize_degree_properties, graph_client, touched, group_id=group_id)
+        print(f"Materialized degree properties on {n_updated} nodes.")
+
+        # The local indexes read independent parts of the graph; rebuild them concurrently
+        entity_linker, text_index, diagnosis_index = await asyncio.gather(
+            asyncio.to_thread(update_entity_index, touched, graph_client, group_id=group_id),
+            asyncio.to_thread(build_text_index, graph_client, group_id=group_id),
+            asyncio.to_thread(build_diagnosis_index, graph_client, group_id=group_id),
+        )
+        print(f"Entity index: {len(entity_linker)} nodes.")
+        print(f"Text index: {len(text_index.nodes)} nodes, {len(text_index.vocabulary)} terms.")
+        print(
+            f"Diagnosis index: {len(diagnosis_index.symptoms)} symptoms, "
+            f"{len(diagnosis_index.crop_parts)} crop parts, {len(diagnosis_index.diseases)} diseases."
+        )
         print("Knowledge graph construction completed successfully!")
+        router.print_summary()
+        ledger.print_summary()
 
     except Exception as e:
         print(f"Error constructing knowledge graph: {e}")
         raise
+    finally:
+        await graph_client.aclose()
 
 
-if __name__ == "__main__":
-    import asyncio
+
+async def plan_knowledge_graph(
+    data_path: str,
+    sheet_name: str,
+    ignored_column_names: list[str] = None,
+) -> IngestionPlan:
+    """Dry run of `construct_knowledge_graph`: render every extraction prompt and plan the run, offline.
+
+    Prompts are counted with the local tokenizer. With the LLM cassette in "replay" or "auto"
+    mode, the calls it holds are replayed (a miss raises instead of reaching the provider) to
+    count them as cached and to sample the graph they produce.
+    """
+    diff = diff_excel_rows(data_path, sheet_name, ignored_column_names, update_cache=False)
+    df = load_dataframe_from_excel(data_path, sheet_name, ignored_column_names, use_cache=False)
+    documents, known_entities, rule_documents = prepare_rows(df)
+
+    plan = IngestionPlan(n_rows=len(df), calls=[], unchanged_rows=set(diff["unchanged"].index))
+    for rule_document in filter(None, rule_documents):
+        plan.rule_buffer.add_graph_document(rule_document)
+
+    # Cassettes that serve recorded responses; those in "record" mode would reach the provider
+    cassettes = {route: find_proxy(router.llm(route), CassetteChatModel) for route in router.routes()}
+    cassettes = {
+        route: cassette for route, cassette in cassettes.items() if cassette and cassette.mode in (AUTO, REPLAY)
+    }
+    latencies = {}
+    for cassette in {id(cassette): cassette for cassette in cassettes.values()}.values():
+        for entry in cassette.entries.values():
+            latencies.setdefault(entry["model"], []).append(entry["latency_s"])
+    plan.recorded_latency_s = {model: mean(values) for model, values in latencies.items()}
+
+    modes = {route: cassette.mode for route, cassette in cassettes.items()}
+    try:
+        for cassette in cassettes.values():
+            cassette.mode = REPLAY
+        for row, document in enumerate(documents):
+            for enhanced_document in prepare_extraction_documents(document, known_entities[row]):
+                # Only the first route is planned; escalations depend on the response
+                route = router.routes(
+                    prefer_small=len(enhanced_document.page_content) <= settings.llm_small_model_max_row_chars
+                )[0]
+                call = PlannedCall(
+                    row=row,
+                    model=router.model(route),
+                    prompt_tokens=ledger.count_tokens(render_transformer_prompt(enhanced_document)),
+                )
+                if route in cassettes:
+                    with collect_usage() as usage:
+                        try:
+                            graph_document = await llm_transformers[route].aprocess_response(enhanced_document)
+                        except CassetteMissError:
+                            graph_document = None
+                    if graph_document is not None:
+                        call.completion_tokens = usage_totals(usage)[1]
+                        plan.add_replayed(call, graph_document)
+                plan.calls.append(call)
+    finally:
+        for route, cassette in cassettes.items():
+            cassette.mode = modes[route]
+    return plan
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the knowledge graph from a spreadsheet.")
+    parser.add_argument("--data-path", default="docs/data/durian_pest_and_disease_data.xlsx")
+    parser.add_argument("--sheet", default="(3) Diseases Information")
+    parser.add_argument("--ignore-columns", nargs="*", default=["No.", "References"])
+    parser.add_argument("--group", default=settings.kg_group_id, help="Group to write to (default: kg_group_id)")
+    parser.add_argument("--keep-existing", action="store_true", help="Do not clear the graph (or group) first")
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Dry run: report prompt tokens, cached rows, projected time and write batches without sending anything",
+    )
+    parser.add_argument("--no-per-row", action="store_true", help="Plan summary only")
+    args = parser.parse_args()
+
+    if args.plan:
+        plan = asyncio.run(plan_knowledge_graph(args.data_path, args.sheet, args.ignore_columns))
+        plan.print_report(per_row=not args.no_per_row)
+        return
 
     asyncio.run(
         construct_knowledge_graph(
-            data_path="docs/data/durian_pest_and_disease_data.xlsx",
-            sheet_name="(3) Diseases Information",
-            ignored_column_names=["No.", "References"],
-            clear_existing_graph=True,
+            data_path=args.data_path,
+            sheet_name=args.sheet,
+            ignored_column_names=args.ignore_columns,
+            clear_existing_graph=not args.keep_existing,
+            group_id=args.group,
         )
     )
+
+
+if __name__ == "__main__":
+    main()
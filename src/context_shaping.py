@@ -0,0 +1,152 @@
+# Context shaping between Cypher execution and answer generation. Neo4j returns paths as
+# [node, "REL", node, ...] lists and relationships as (node, "REL", node) tuples, with every node's
+# full property map repeated in every row. The answer prompt only needs each node once, the edges
+# once, and long texts only when the question asks for them.
+
+import re
+from typing import Any, Callable
+
+from deps.graph_client import GraphNode
+from materialize import MATERIALIZED_PROPERTIES
+
+# Properties longer than this are dropped from nodes unless the question asks for descriptive text
+LONG_TEXT_CHARS = 200
+
+TEXT_QUESTION_PATTERN = re.compile(
+    r"\b(describe|description|explain|overview|details?|what (?:is|are)|tell me|how|why|impact|severity)\b",
+    re.IGNORECASE,
+)
+
+MATERIALIZED_PROPERTY_NAMES = {prop["property"] for prop in MATERIALIZED_PROPERTIES} | {"degree"}
+
+# `n.prop` / `n.`prop``: properties a query names explicitly (projects, filters or sorts on)
+_PROPERTY_REFERENCE = re.compile(r"\.\s*`?(\w+)`?")
+
+
+def _is_node(value: Any) -> bool:
+    # Driver nodes only (see `deps.graph_client.query_rows`); map projections with an `id` key stay rows
+    return isinstance(value, GraphNode) and "id" in value
+
+
+def _is_path(value: Any) -> bool:
+    return (
+        isinstance(value, list)
+        and len(value) >= 3
+        and len(value) % 2 == 1
+        and all(_is_node(item) for item in value[::2])
+        and all(isinstance(item, str) for item in value[1::2])
+    )
+
+
+def _is_relationship(value: Any) -> bool:
+    return (
+        isinstance(value, tuple)
+        and len(value) == 3
+        and _is_node(value[0])
+        and isinstance(value[1], str)
+        and _is_node(value[2])
+    )
+
+
+class _ContextShaper:
+    def __init__(self, keep_long_text: bool, referenced_properties: set[str] = frozenset()):
+        self.keep_long_text = keep_long_text
+        # Materialized properties are kept when the query asked for them, e.g. to rank by `n_varieties`
+        self.stripped_properties = MATERIALIZED_PROPERTY_NAMES - referenced_properties
+        self.nodes: dict[str, dict] = {}
+        self.edges: dict[tuple[str, str], list[str]] = {}
+
+    def node(self, node: dict) -> str:
+        """Record a node's (stripped) properties once and return its id."""
+        node_id = node["id"]
+        properties = {
+            key: value
+            for key, value in node.items()
+            if key != "id"
+            and key not in self.stripped_properties
+            and (self.keep_long_text or not (isinstance(value, str) and len(value) > LONG_TEXT_CHARS))
+        }
+        self.nodes.setdefault(node_id, {}).update(properties)
+        return node_id
+
+    def edge(self, source: dict, relationship: str, target: dict) -> None:
+        # Path serializations lose the direction, so edges are kept undirected
+        targets = self.edges.setdefault((self.node(source), relationship), [])
+        target_id = self.node(target)
+        if target_id not in targets:
+            targets.append(target_id)
+
+    def value(self, value: Any) -> Any:
+        """Shape a row value; paths and relationships become edges and are removed from the row."""
+        if _is_path(value):
+            for i in range(0, len(value) - 2, 2):
+                self.edge(value[i], value[i + 1], value[i + 2])
+            return None
+        if _is_relationship(value):
+            self.edge(*value)
+            return None
+        if _is_node(value):
+            return self.node(value)
+        if isinstance(value, list):
+            shaped = [self.value(item) for item in value]
+            return [item for item in shaped if item is not None] or None
+        if isinstance(value, dict):
+            shaped = {key: self.value(item) for key, item in value.items()}
+            return {key: item for key, item in shaped.items() if item is not None} or None
+        return value
+
+
+def _assemble(rows: list, relationships: list[str], nodes: dict) -> list[dict[str, Any]]:
+    return rows + ([{"relationships": relationships}] if relationships else []) + ([{"nodes": nodes}] if nodes else [])
+
+
+def shape_context(
+    context: list[dict[str, Any]],
+    question: str,
+    max_tokens: int | None = None,
+    count_tokens: Callable[[str], int] | None = None,
+    query: str = "",
+) -> list[dict[str, Any]]:
+    """Deduplicate nodes, collapse paths into adjacency summaries and cap the rows for the answer prompt.
+
+    Returns the remaining rows, followed by `{"relationships": [...]}` with one
+    `A -[REL]- B, C` line per node and relationship type, and `{"nodes": {...}}`
+    with the properties of every node that still has any. Materialized properties
+    are dropped from nodes unless the Cypher `query` references them.
+    """
+    shaper = _ContextShaper(
+        keep_long_text=bool(TEXT_QUESTION_PATTERN.search(question)),
+        referenced_properties=set(_PROPERTY_REFERENCE.findall(query)),
+    )
+
+    rows, seen = [], set()
+    for row in context:
+        shaped = shaper.value(row)
+        if shaped and repr(shaped) not in seen:
+            seen.add(repr(shaped))
+            rows.append(shaped)
+
+    relationships = [
+        f"{source} -[{relationship}]- {', '.join(targets)}" for (source, relationship), targets in shaper.edges.items()
+    ]
+    nodes = {node_id: properties for node_id, properties in shaper.nodes.items() if properties}
+
+    if max_tokens is None or count_tokens is None:
+        return _assemble(rows, relationships, nodes)
+
+    # Greedy cap: rows first, then edges, then node properties, each while it still fits
+    budget = max_tokens
+
+    def fits(text: str) -> bool:
+        nonlocal budget
+        cost = count_tokens(text)
+        if cost > budget:
+            budget = -1  # keep later (smaller) items from slipping in after a cut
+            return False
+        budget -= cost
+        return True
+
+    rows = [row for row in rows if fits(str(row))]
+    relationships = [line for line in relationships if fits(line)]
+    nodes = {node_id: properties for node_id, properties in nodes.items() if fits(f"{node_id}: {properties}")}
+    return _assemble(rows, relationships, nodes)
@@ -0,0 +1,93 @@
+from typing import Any, Optional, Sequence
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from langchain_core.runnables import Runnable
+
+
+class ChatModelProxy(BaseChatModel):
+    """Chat model that forwards every call to a wrapped chat model.
+
+    Subclasses override `_generate` / `_agenerate` to add behaviour around the
+    forwarded call. Tool bindings are kept unformatted and only resolved against
+    the model that finally serves the call, so `with_structured_output` (used by
+    `LLMGraphTransformer`) keeps working through any stack of proxies.
+    """
+
+    llm: BaseChatModel
+
+    @property
+    def _llm_type(self) -> str:
+        return self.llm._llm_type
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"proxy": type(self).__name__, **self.llm._identifying_params}
+
+    @property
+    def model_label(self) -> str:
+        """Model name of the wrapped chat model, as configured in settings."""
+        inner = self.llm
+        if isinstance(inner, ChatModelProxy):
+            return inner.model_label
+        return getattr(inner, "model_name", None) or getattr(inner, "model", None) or inner._llm_type
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable:
+        return self.bind(tool_binding=(list(tools), kwargs))
+
+    @staticmethod
+    def resolve_call_kwargs(llm: BaseChatModel, kwargs: dict[str, Any]) -> dict[str, Any]:
+        """Format a pending tool binding for `llm` and merge it into the call kwargs."""
+        kwargs = dict(kwargs)
+        tool_binding = kwargs.pop("tool_binding", None)
+        if tool_binding is None or isinstance(llm, ChatModelProxy):
+            if tool_binding is not None:
+                kwargs["tool_binding"] = tool_binding
+            return kwargs
+
+        tools, tool_kwargs = tool_binding
+        # Tracing metadata only; providers reject it as a request parameter
+        tool_kwargs = {k: v for k, v in tool_kwargs.items() if k != "ls_structured_output_format"}
+        return {**llm.bind_tools(tools, **tool_kwargs).kwargs, **kwargs}
+
+    def forward(
+        self,
+        llm: BaseChatModel,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return llm._generate(messages, stop=stop, run_manager=run_manager, **self.resolve_call_kwargs(llm, kwargs))
+
+    async def aforward(
+        self,
+        llm: BaseChatModel,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await llm._agenerate(
+            messages, stop=stop, run_manager=run_manager, **self.resolve_call_kwargs(llm, kwargs)
+        )
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return self.forward(self.llm, messages, stop=stop, run_manager=run_manager, **kwargs)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await self.aforward(self.llm, messages, stop=stop, run_manager=run_manager, **kwargs)
@@ -0,0 +1,292 @@
+import asyncio
+import contextlib
+from hashlib import md5
+from typing import Any, Optional
+
+import neo4j
+from langchain_neo4j import Neo4jGraph
+
+from settings import ProjectSettings
+
+# Lists this long (typically embeddings) are dropped from sanitized rows, as `Neo4jGraph.query` does
+LIST_LIMIT = 128
+# Marks a value `sanitize` drops (oversized lists), as opposed to a None property
+_DROPPED = object()
+
+# Label and import statements of `Neo4jGraph.add_graph_documents`, so both write paths produce the same graph
+BASE_ENTITY_LABEL = "__Entity__"
+_INCLUDE_DOCS_QUERY = (
+    "MERGE (d:Document {id:$document.metadata.id}) "
+    "SET d.text = $document.page_content "
+    "SET d += $document.metadata "
+    "WITH d "
+)
+
+
+class GraphNode(dict):
+    """A node's properties, as `record.data()` returns them, keeping its labels.
+
+    Lets consumers of query rows tell nodes apart from map projections such as
+    `{id: n.id, degree: n.degree}`, which are plain dicts.
+    """
+
+    def __init__(self, properties: dict, labels=()):
+        super().__init__(properties)
+        self.labels = frozenset(labels)
+
+
+def _typed_value(value: Any, sanitize: bool) -> Any:
+    if isinstance(value, neo4j.graph.Node):
+        return GraphNode(_typed_value(dict(value), sanitize), value.labels)
+    if isinstance(value, neo4j.graph.Relationship):
+        return (_typed_value(value.start_node, sanitize), value.type, _typed_value(value.end_node, sanitize))
+    if isinstance(value, neo4j.graph.Path):
+        items = [_typed_value(value.nodes[0], sanitize)]
+        for relationship, node in zip(value.relationships, value.nodes[1:]):
+            items += [relationship.type, _typed_value(node, sanitize)]
+        return items
+    if isinstance(value, list):
+        if sanitize and len(value) >= LIST_LIMIT:
+            return _DROPPED
+        return [item for item in (_typed_value(item, sanitize) for item in value) if item is not _DROPPED]
+    if isinstance(value, dict):
+        items = ((key, _typed_value(item, sanitize)) for key, item in value.items())
+        return {key: item for key, item in items if item is not _DROPPED}
+    return value
+
+
+def typed_rows(records: list[neo4j.Record], sanitize: bool = False) -> list[dict[str, Any]]:
+    """Rows shaped like `record.data()` (without oversized lists when `sanitize`), with nodes as `GraphNode`s."""
+    return [_typed_value(dict(record.items()), sanitize) for record in records]
+
+
+def query_rows(graph, query: str, params: Optional[dict] = None) -> list[dict[str, Any]]:
+    """`graph.query`, returning nodes as `GraphNode`s when the graph is backed by a Neo4j driver."""
+    if not hasattr(graph, "_driver"):
+        return graph.query(query, params or {})
+    records, _, _ = graph._driver.execute_query(
+        neo4j.Query(text=query, timeout=graph.timeout),
+        database_=graph._database,
+        parameters_=params or {},
+    )
+    return typed_rows(records, graph.sanitize)
+
+
+async def aquery_rows(graph, query: str, params: Optional[dict] = None) -> list[dict[str, Any]]:
+    """Async `query_rows`: a read query on the async driver, or `query_rows` in a thread for sync-only graphs."""
+    if hasattr(graph, "aquery"):
+        return await graph.aquery(query, params, read=True)
+    return await asyncio.to_thread(query_rows, graph, query, params)
+
+
+def _node_import_query(base_entity_label: bool, include_source: bool) -> str:
+    if base_entity_label:
+        return (
+            f"{_INCLUDE_DOCS_QUERY if include_source else ''}"
+            "UNWIND $data AS row "
+            f"MERGE (source:`{BASE_ENTITY_LABEL}` {{id: row.id}}) "
+            "SET source += row.properties "
+            f"{'MERGE (d)-[:MENTIONS]->(source) ' if include_source else ''}"
+            "WITH source, row "
+            "CALL apoc.create.addLabels( source, [row.type] ) YIELD node "
+            "RETURN distinct 'done' AS result"
+        )
+    return (
+        f"{_INCLUDE_DOCS_QUERY if include_source else ''}"
+        "UNWIND $data AS row "
+        "CALL apoc.merge.node([row.type], {id: row.id}, row.properties, {}) YIELD node "
+        f"{'MERGE (d)-[:MENTIONS]->(node) ' if include_source else ''}"
+        "RETURN distinct 'done' AS result"
+    )
+
+
+def _rel_import_query(base_entity_label: bool) -> str:
+    if base_entity_label:
+        return (
+            "UNWIND $data AS row "
+            f"MERGE (source:`{BASE_ENTITY_LABEL}` {{id: row.source}}) "
+            f"MERGE (target:`{BASE_ENTITY_LABEL}` {{id: row.target}}) "
+            "WITH source, target, row "
+            "CALL apoc.merge.relationship(source, row.type, {}, row.properties, target) YIELD rel "
+            "RETURN distinct 'done'"
+        )
+    return (
+        "UNWIND $data AS row "
+        "CALL apoc.merge.node([row.source_label], {id: row.source}, {}, {}) YIELD node as source "
+        "CALL apoc.merge.node([row.target_label], {id: row.target}, {}, {}) YIELD node as target "
+        "CALL apoc.merge.relationship(source, row.type, {}, row.properties, target) YIELD rel "
+        "RETURN distinct 'done'"
+    )
+
+
+def _remove_backticks(text: str) -> str:
+    return text.replace("`", "")
+
+
+class AsyncNeo4jGraph(Neo4jGraph):
+    """`Neo4jGraph` with an async Neo4j driver next to the sync one.
+
+    The sync surface (`query`, `add_graph_documents`, `schema`, ...) is unchanged,
+    so LangChain chains keep working. Async code awaits `aquery`, `aquery_many`,
+    `aexecute_write` and `aadd_graph_documents` instead of blocking the event loop.
+    Both drivers use the same pool size and connection acquisition timeout.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        username: str,
+        password: str,
+        database: Optional[str] = None,
+        *,
+        max_connection_pool_size: int = 100,
+        connection_acquisition_timeout_s: float = 60.0,
+        **kwargs: Any,
+    ) -> None:
+        self._driver_config = {
+            "max_connection_pool_size": max_connection_pool_size,
+            "connection_acquisition_timeout": connection_acquisition_timeout_s,
+        }
+        super().__init__(
+            url=url,
+            username=username,
+            password=password,
+            database=database,
+            driver_config=self._driver_config,
+            **kwargs,
+        )
+        self._url = url
+        self._auth = None if username == "" and password == "" else (username, password)
+        self._max_concurrency = max_connection_pool_size
+        self._async_drivers: dict[asyncio.AbstractEventLoop, neo4j.AsyncDriver] = {}
+
+    async def _get_async_driver(self) -> neo4j.AsyncDriver:
+        # An async driver is bound to the event loop it runs on, and each `asyncio.run` starts a new
+        # one: keep a driver per loop, closing those whose loop has ended when another is opened
+        loop = asyncio.get_running_loop()
+        if loop not in self._async_drivers:
+            await self._close_async_drivers(lambda driver_loop: driver_loop.is_closed())
+            self._async_drivers[loop] = neo4j.AsyncGraphDatabase.driver(
+                self._url, auth=self._auth, **self._driver_config
+            )
+        return self._async_drivers[loop]
+
+    async def _close_async_drivers(self, select=lambda loop: True) -> None:
+        current = asyncio.get_running_loop()
+        for loop in [loop for loop in self._async_drivers if select(loop)]:
+            driver = self._async_drivers.pop(loop)
+            if loop is current:
+                await driver.close()
+            elif loop.is_running():
+                await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(driver.close(), loop))
+            else:
+                # Its loop no longer runs, so connections cannot be shut down cleanly; release what can be
+                with contextlib.suppress(Exception):
+                    await driver.close()
+
+    async def _aexecute(self, query: str, params: Optional[dict], read: bool) -> tuple[list, neo4j.ResultSummary]:
+        driver = await self._get_async_driver()
+        records, summary, _ = await driver.execute_query(
+            neo4j.Query(text=query, timeout=self.timeout),
+            parameters_=params or {},
+            database_=self._database,
+            routing_=neo4j.RoutingControl.READ if read else neo4j.RoutingControl.WRITE,
+        )
+        return records, summary
+
+    async def aquery(self, query: str, params: Optional[dict] = None, *, read: bool = False) -> list[dict[str, Any]]:
+        """Run a query in a managed transaction (retried on transient errors), on a reader when `read`."""
+        records, _ = await self._aexecute(query, params, read)
+        return typed_rows(records, self.sanitize)
+
+    async def aprofile(self, query: str, params: Optional[dict] = None) -> tuple[list[dict[str, Any]], dict]:
+        """Run a read query with PROFILE: its rows and the profiled plan."""
+        records, summary = await self._aexecute(f"PROFILE {query}", params, read=True)
+        return typed_rows(records, self.sanitize), summary.profile
+
+    async def aquery_many(
+        self, queries: list[tuple[str, Optional[dict]]], *, read: bool = True
+    ) -> list[list[dict[str, Any]]]:
+        """Run independent queries concurrently, at most one per pooled connection; results in input order."""
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def run(query: str, params: Optional[dict]) -> list[dict[str, Any]]:
+            async with semaphore:
+                return await self.aquery(query, params, read=read)
+
+        return await asyncio.gather(*(run(query, params) for query, params in queries))
+
+    async def aexecute_write(self, statements: list[tuple[str, Optional[dict]]]) -> list[list[dict[str, Any]]]:
+        """Run statements in order in one managed write transaction; all of them commit or none do."""
+
+        # Transaction functions take plain query strings; the timeout applies to the whole unit of work
+        @neo4j.unit_of_work(timeout=self.timeout)
+        async def work(tx: neo4j.AsyncManagedTransaction) -> list[list[dict[str, Any]]]:
+            results = []
+            for query, params in statements:
+                result = await tx.run(query, params or {})
+                results.append(typed_rows([record async for record in result], self.sanitize))
+            return results
+
+        driver = await self._get_async_driver()
+        async with driver.session(database=self._database) as session:
+            return await session.execute_write(work)
+
+    async def aadd_graph_documents(
+        self, graph_documents: list, include_source: bool = False, baseEntityLabel: bool = False
+    ) -> None:
+        """Async `add_graph_documents`: each document's nodes and relationships are written in one transaction.
+
+        Documents are written one after another: concurrent MERGEs of the same node
+        id would create duplicates where no uniqueness constraint guards the label.
+        """
+        if baseEntityLabel:
+            await self.aquery(f"CREATE CONSTRAINT IF NOT EXISTS FOR (b:{BASE_ENTITY_LABEL}) REQUIRE b.id IS UNIQUE")
+        if include_source and any(document.source is None for document in graph_documents):
+            raise TypeError("include_source is set to True, but at least one document has no `source`.")
+
+        node_import_query = _node_import_query(baseEntityLabel, include_source)
+        rel_import_query = _rel_import_query(baseEntityLabel)
+        for document in graph_documents:
+            for node in document.nodes:
+                node.type = _remove_backticks(node.type)
+            node_params: dict[str, Any] = {"data": [node.__dict__ for node in document.nodes]}
+            if include_source:
+                # Same document id as `add_graph_documents`, so both paths merge the same Document nodes
+                if not document.source.metadata.get("id"):
+                    document.source.metadata["id"] = md5(document.source.page_content.encode("utf-8")).hexdigest()
+                node_params["document"] = document.source.__dict__
+            rel_params = {
+                "data": [
+                    {
+                        "source": rel.source.id,
+                        "source_label": _remove_backticks(rel.source.type),
+                        "target": rel.target.id,
+                        "target_label": _remove_backticks(rel.target.type),
+                        "type": _remove_backticks(rel.type.replace(" ", "_").upper()),
+                        "properties": rel.properties,
+                    }
+                    for rel in document.relationships
+                ]
+            }
+            await self.aexecute_write([(node_import_query, node_params), (rel_import_query, rel_params)])
+
+    async def arefresh_schema(self) -> None:
+        # Schema introspection (neo4j_graphrag) is sync only; keep it off the event loop
+        await asyncio.to_thread(self.refresh_schema)
+
+    async def aclose(self) -> None:
+        """Close the async drivers of every event loop."""
+        await self._close_async_drivers()
+
+
+def get_graph_client(settings: ProjectSettings, **kwargs: Any) -> AsyncNeo4jGraph:
+    """Graph client for the configured database, with sync and async access."""
+    return AsyncNeo4jGraph(
+        url=settings.graph_db.graph_db_url,
+        username=settings.graph_db.graph_db_user,
+        password=settings.graph_db.graph_db_password,
+        max_connection_pool_size=settings.graph_db.graph_db_max_connection_pool_size,
+        connection_acquisition_timeout_s=settings.graph_db.graph_db_connection_acquisition_timeout_s,
+        **kwargs,
+    )
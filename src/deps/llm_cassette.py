@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import Field
+
+from deps.chat_model_proxy import ChatModelProxy
+
+RECORD = "record"
+REPLAY = "replay"
+# Serve recorded responses and record the misses
+AUTO = "auto"
+
+
+class CassetteMissError(LookupError):
+    """A replayed request has no recorded response."""
+
+
+def _tool_spec(tool: Any) -> Any:
+    try:
+        return convert_to_openai_tool(tool)
+    except Exception:  # already a provider-specific dict or something we can only describe
+        return repr(tool)
+
+
+def request_fingerprint(model: str, messages: list[BaseMessage], stop: Optional[list[str]], kwargs: dict) -> str:
+    """Stable hash of everything that determines a chat model's response."""
+    kwargs = dict(kwargs)
+    tool_binding = kwargs.pop("tool_binding", None)
+    if tool_binding is not None:
+        tools, tool_kwargs = tool_binding
+        kwargs["tool_binding"] = {
+            "tools": [_tool_spec(tool) for tool in tools],
+            **{key: value for key, value in tool_kwargs.items() if key != "ls_structured_output_format"},
+        }
+    payload = {
+        "model": model,
+        "messages": [message_to_dict(message) for message in messages],
+        "stop": stop,
+        "kwargs": kwargs,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class CassetteChatModel(ChatModelProxy):
+    """Record chat model responses to a local cassette file and replay them.
+
+    Each request is keyed by a fingerprint of the model name, messages, stop words
+    and call kwargs (including pending tool bindings, so `with_structured_output`
+    calls replay too). In replay mode responses are served from memory, optionally
+    after `latency_scale` times the recorded latency.
+    """
+
+    path: Path
+    mode: str = AUTO
+    latency_scale: float = 0.0
+    entries: dict[str, dict] = Field(default_factory=dict, exclude=True)
+    hits: int = Field(default=0, exclude=True)
+    misses: int = Field(default=0, exclude=True)
+    lock: Any = Field(default_factory=threading.Lock, exclude=True)
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        if self.mode not in (RECORD, REPLAY, AUTO):
+            raise ValueError(f"Unsupported cassette mode: {self.mode!r}. Expected {RECORD!r}, {REPLAY!r} or {AUTO!r}.")
+        self.entries = load_cassette(self.path)
+
+    def _lookup(self, fingerprint: str) -> Optional[dict]:
+        if self.mode == RECORD:
+            return None
+        entry = self.entries.get(fingerprint)
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if entry is None and self.mode == REPLAY:
+            raise CassetteMissError(f"No recorded response for {self.model_label!r} request {fingerprint[:12]}")
+        return entry
+
+    def _replay(self, entry: dict) -> ChatResult:
+        generations = [
+            ChatGeneration(message=message, generation_info=info)
+            for message, info in zip(messages_from_dict(entry["messages"]), entry["generation_info"])
+        ]
+        return ChatResult(generations=generations, llm_output=entry["llm_output"])
+
+    def _record(self, fingerprint: str, result: ChatResult, latency_s: float) -> None:
+        entry = {
+            "fingerprint": fingerprint,
+            "model": self.model_label,
+            "latency_s": latency_s,
+            "messages": [message_to_dict(generation.message) for generation in result.generations],
+            "generation_info": [generation.generation_info for generation in result.generations],
+            "llm_output": result.llm_output,
+        }
+        with self.lock:
+            self.entries[fingerprint] = entry
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        fingerprint = request_fingerprint(self.model_label, messages, stop, kwargs)
+        entry = self._lookup(fingerprint)
+        if entry is not None:
+            if self.latency_scale:
+                time.sleep(entry["latency_s"] * self.latency_scale)
+            return self._replay(entry)
+
+        start = time.perf_counter()
+        result = self.forward(self.llm, messages, stop, run_manager=run_manager, **kwargs)
+        self._record(fingerprint, result, time.perf_counter() - start)
+        return result
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        fingerprint = request_fingerprint(self.model_label, messages, stop, kwargs)
+        entry = self._lookup(fingerprint)
+        if entry is not None:
+            if self.latency_scale:
+                await asyncio.sleep(entry["latency_s"] * self.latency_scale)
+            return self._replay(entry)
+
+        start = time.perf_counter()
+        result = await self.aforward(self.llm, messages, stop, run_manager=run_manager, **kwargs)
+        self._record(fingerprint, result, time.perf_counter() - start)
+        return result
+
+
+def load_cassette(path: Path) -> dict[str, dict]:
+    """Recorded entries by fingerprint; later recordings of the same request win."""
+    entries = {}
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    entries[entry["fingerprint"]] = entry
+    return entries
@@ -1,24 +1,332 @@
+import asyncio
 import os
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+import httpx
+from langchain_core.caches import InMemoryCache
+from langchain_core.callbacks import UsageMetadataCallbackHandler
+from langchain_core.messages.ai import add_usage
+from langchain_core.tracers.context import register_configure_hook
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
+from deps.chat_model_proxy import ChatModelProxy
+from deps.llm_cassette import CassetteChatModel
+from deps.llm_hedging import HedgedChatModel, hedge_stats_summary
+from deps.llm_pool import PooledChatModel
 from settings import ProjectSettings
 
+# A single registered context var: `collect_usage` scopes are cheap to open per request
+_usage_callback_var: ContextVar[UsageMetadataCallbackHandler | None] = ContextVar("kg_llm_usage", default=None)
+register_configure_hook(_usage_callback_var, inheritable=True)
+
+
+class _PerLoopTransport(httpx.AsyncBaseTransport):
+    """Async transport keeping one connection pool per event loop.
+
+    Async connections belong to the loop that opened them, and every `asyncio.run`
+    (construction, evaluation, the UI's warm-up) starts a new loop; each loop gets
+    its own pool, dropped with the loop.
+    """
+
+    def __init__(self, limits: httpx.Limits):
+        self.limits = limits
+        self.transports: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            for other in [other for other in self.transports if other.is_closed()]:
+                del self.transports[other]
+            if loop not in self.transports:
+                self.transports[loop] = httpx.AsyncHTTPTransport(limits=self.limits)
+            return self.transports[loop]
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._transport().handle_async_request(request)
 
-def get_llm_client(settings: ProjectSettings):
-    provider = settings.llm.llm_provider.lower().strip()
+    async def aclose(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            transport = self.transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
+
+
+# One keep-alive connection pool per endpoint (and event loop), shared by every client that talks to it
+_http_clients: dict[str, tuple[httpx.Client, httpx.AsyncClient]] = {}
+
+
+def _get_http_clients(endpoint: str, settings: ProjectSettings) -> tuple[httpx.Client, httpx.AsyncClient]:
+    if endpoint not in _http_clients:
+        limits = httpx.Limits(max_keepalive_connections=settings.llm.llm_pool_max_keepalive_connections)
+        _http_clients[endpoint] = (httpx.Client(limits=limits), httpx.AsyncClient(transport=_PerLoopTransport(limits)))
+    return _http_clients[endpoint]
+
+
+def _build_chat_model(
+    settings: ProjectSettings,
+    provider: str,
+    model_name: str,
+    api_key: str | None,
+    endpoint: str,
+):
+    provider = provider.lower().strip()
 
     if provider == "openai":
+        http_client, http_async_client = _get_http_clients(endpoint, settings)
+        # Without an endpoint, keep the SDK default (which honours OPENAI_API_BASE)
+        endpoint_kwargs = {"base_url": endpoint} if endpoint else {}
         return ChatOpenAI(
-            api_key=settings.llm.llm_api_key,
-            model_name=settings.llm.llm_model,
+            api_key=api_key,
+            model_name=model_name,
             temperature=settings.llm.llm_temperature,
+            max_tokens=settings.llm.llm_max_tokens,
+            timeout=settings.llm.llm_timeout_s,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            **endpoint_kwargs,
         )
     elif provider == "gemini":
-        # Ensure key is present for google genai SDK
-        os.environ.setdefault("GOOGLE_API_KEY", settings.llm.llm_api_key)
         return ChatGoogleGenerativeAI(
-            model=settings.llm.llm_model,
+            model=model_name,
+            google_api_key=api_key,
+            client_options={"api_endpoint": endpoint} if endpoint else None,
             temperature=settings.llm.llm_temperature,
+            max_output_tokens=settings.llm.llm_max_tokens,
+            thinking_budget=settings.llm.llm_thinking_budget,
+            timeout=settings.llm.llm_timeout_s,
         )
     else:
-        raise ValueError(f"Unsupported LLM provider: {settings.llm.llm_provider!r}. " "Expected 'openai' or 'gemini'.")
+        raise ValueError(f"Unsupported LLM provider: {provider!r}. " "Expected 'openai' or 'gemini'.")
+
+
+def get_llm_client(settings: ProjectSettings, model_name: str | None = None):
+    model_name = model_name or settings.llm.llm_model
+
+    if settings.llm.llm_provider.lower().strip() == "gemini":
+        # Ensure key is present for google genai SDK
+        os.environ.setdefault("GOOGLE_API_KEY", settings.llm.llm_api_key)
+
+    client = _build_chat_model(
+        settings,
+        settings.llm.llm_provider,
+        model_name,
+        settings.llm.llm_api_key,
+        settings.llm.llm_endpoint,
+    )
+
+    pool_members = [member for member in settings.llm.llm_pool if member.model in (None, model_name)]
+    if pool_members:
+        members = [client] + [
+            _build_chat_model(settings, member.provider, model_name, member.api_key, member.endpoint)
+            for member in pool_members
+        ]
+        client = PooledChatModel(
+            llm=client,
+            members=members,
+            member_names=[f"{settings.llm.llm_provider}:{settings.llm.llm_endpoint or 'default'}"]
+            + [f"{member.provider}:{member.endpoint or 'default'}#{i}" for i, member in enumerate(pool_members, 1)],
+            weights=[1.0] + [member.weight for member in pool_members],
+            strategy=settings.llm.llm_pool_strategy,
+            unhealthy_after=settings.llm.llm_pool_unhealthy_after,
+            cooldown_s=settings.llm.llm_pool_cooldown_s,
+        )
+
+    if settings.llm.llm_hedge_after_s is not None:
+        # The SDK timeout bounds each request; plain calls need nothing more, hedged ones are bounded as a whole
+        client = HedgedChatModel(
+            llm=client,
+            timeout_s=settings.llm.llm_timeout_s,
+            hedge_after_s=settings.llm.llm_hedge_after_s,
+            hedge_budget=settings.llm.llm_hedge_budget,
+        )
+
+    if settings.llm.llm_cassette_mode is not None:
+        # Outermost, so replayed calls skip pooling and hedging altogether
+        client = CassetteChatModel(
+            llm=client,
+            path=settings.llm.llm_cassette_path,
+            mode=settings.llm.llm_cassette_mode,
+            latency_scale=settings.llm.llm_cassette_latency_scale,
+        )
+
+    if settings.llm.llm_cache_max_size:
+        # On the outermost model: a hit skips the cassette, hedging and pooling
+        client.cache = InMemoryCache(maxsize=settings.llm.llm_cache_max_size)
+    return client
+
+
+def find_proxy(llm, proxy_type: type[ChatModelProxy]):
+    """Return the first `proxy_type` wrapper in a stack of chat model proxies, if any."""
+    while isinstance(llm, ChatModelProxy):
+        if isinstance(llm, proxy_type):
+            return llm
+        llm = llm.llm
+    return None
+
+
+def estimate_cost(settings: ProjectSettings, model_name: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimate the USD cost of a call from the `llm_model_costs` price table (0.0 if the model is not priced).
+
+    Providers report dated model names (e.g. `gpt-4.1-mini-2025-04-14`), so the
+    longest configured name that prefixes `model_name` is used.
+    """
+    prices = settings.llm.llm_model_costs.get(model_name)
+    if prices is None:
+        matches = [name for name in settings.llm.llm_model_costs if model_name.startswith(name)]
+        prices = settings.llm.llm_model_costs[max(matches, key=len)] if matches else None
+    if not prices:
+        return 0.0
+    input_price, output_price = prices
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+@contextmanager
+def collect_usage():
+    """Collect the token usage of every LLM call made inside the block.
+
+    Usage rolls up into an enclosing `collect_usage` block, so nested scopes
+    (e.g. a route inside a stage) both see the calls.
+    """
+    handler = UsageMetadataCallbackHandler()
+    token = _usage_callback_var.set(handler)
+    try:
+        yield handler
+    finally:
+        _usage_callback_var.reset(token)
+        parent = _usage_callback_var.get()
+        if parent is not None:
+            for model, usage in handler.usage_metadata.items():
+                parent.usage_metadata[model] = add_usage(parent.usage_metadata.get(model), usage)
+
+
+def usage_totals(handler: UsageMetadataCallbackHandler) -> tuple[int, int]:
+    """Return (input_tokens, output_tokens) summed over all models seen by `handler`."""
+    input_tokens = sum(usage.get("input_tokens", 0) for usage in handler.usage_metadata.values())
+    output_tokens = sum(usage.get("output_tokens", 0) for usage in handler.usage_metadata.values())
+    return input_tokens, output_tokens
+
+
+@dataclass
+class RouteRecord:
+    """One routed LLM call: which model served it, what it cost and whether its output was kept."""
+
+    task: str
+    route: str
+    model: str
+    latency_s: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+    accepted: bool = True
+    reason: str = ""
+
+    def reject(self, reason: str) -> None:
+        """Mark the output as unusable so the caller escalates to the next route."""
+        self.accepted = False
+        self.reason = reason
+
+
+class ModelRouter:
+    """Route LLM work to `llm_small_model` first and escalate to `llm_model` when its output is rejected.
+
+    Callers wrap each attempt in `track(task, route)` and call `record.reject(...)`
+    when the output fails their checks; `routes()` gives the order to try.
+    """
+
+    SMALL = "small"
+    LARGE = "large"
+
+    def __init__(self, settings: ProjectSettings):
+        self.settings = settings
+        self.large_model = settings.llm.llm_model
+        self.small_model = settings.llm.llm_small_model or settings.llm.llm_model
+        self.large_llm = get_llm_client(settings, self.large_model)
+        self.small_llm = self.large_llm if not self.enabled else get_llm_client(settings, self.small_model)
+        self.records: list[RouteRecord] = []
+
+    @property
+    def enabled(self) -> bool:
+        """Routing only makes sense when a distinct small model is configured."""
+        return self.small_model != self.large_model
+
+    def llm(self, route: str):
+        return self.small_llm if route == self.SMALL else self.large_llm
+
+    def model(self, route: str) -> str:
+        return self.small_model if route == self.SMALL else self.large_model
+
+    def routes(self, prefer_small: bool = True) -> list[str]:
+        """Routes to try in order: small then large, or only large when routing is off or not preferred."""
+        if self.enabled and prefer_small:
+            return [self.SMALL, self.LARGE]
+        return [self.LARGE]
+
+    @contextmanager
+    def track(self, task: str, route: str):
+        """Time one attempt on `route` and record its token usage and estimated cost."""
+        record = RouteRecord(task=task, route=route, model=self.model(route))
+        start = time.perf_counter()
+        with collect_usage() as usage:
+            try:
+                yield record
+            except Exception as e:
+                record.reject(f"error: {e}")
+                raise
+            finally:
+                record.latency_s = time.perf_counter() - start
+                record.input_tokens, record.output_tokens = usage_totals(usage)
+                record.cost = estimate_cost(self.settings, record.model, record.input_tokens, record.output_tokens)
+                self.records.append(record)
+
+    def summary(self) -> dict[str, dict[str, dict]]:
+        """Aggregate records per task and route: calls, rejections, latency, tokens and cost."""
+        summary: dict[str, dict[str, dict]] = defaultdict(dict)
+        for record in self.records:
+            stats = summary[record.task].setdefault(
+                record.route,
+                {
+                    "model": record.model,
+                    "calls": 0,
+                    "rejected": 0,
+                    "total_latency_s": 0.0,
+                    "input_tokens": 0,
+                    "output_tokens": 0,
+                    "cost": 0.0,
+                },
+            )
+            stats["calls"] += 1
+            stats["rejected"] += not record.accepted
+            stats["total_latency_s"] += record.latency_s
+            stats["input_tokens"] += record.input_tokens
+            stats["output_tokens"] += record.output_tokens
+            stats["cost"] += record.cost
+
+        for routes in summary.values():
+            for stats in routes.values():
+                stats["mean_latency_s"] = stats["total_latency_s"] / stats["calls"]
+        return dict(summary)
+
+    def print_summary(self) -> None:
+        for model_name, stats in hedge_stats_summary().items():
+            print(f"[hedging] {model_name}: {stats}")
+        for route in (self.SMALL, self.LARGE) if self.enabled else (self.LARGE,):
+            pool = find_proxy(self.llm(route), PooledChatModel)
+            if pool is not None:
+                for stats in pool.member_stats():
+                    print(f"[pool] {self.model(route)}: {stats}")
+        for task, routes in self.summary().items():
+            print(f"[router] {task}:")
+            for route, stats in routes.items():
+                print(
+                    f"  {route} ({stats['model']}): {stats['calls']} calls, {stats['rejected']} rejected, "
+                    f"mean {stats['mean_latency_s']:.2f}s, {stats['input_tokens']}+{stats['output_tokens']} tokens, "
+                    f"${stats['cost']:.4f}"
+                )
@@ -0,0 +1,180 @@
+import asyncio
+import statistics
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from pydantic import Field
+
+from deps.chat_model_proxy import ChatModelProxy
+
+# Sync calls are driven through the async path on this background loop, so losing and timed-out
+# attempts are cancelled instead of holding a worker thread until the provider answers
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-hedge", daemon=True).start()
+        return _loop
+
+
+def _async_run_manager(run_manager: Optional[CallbackManagerForLLMRun]) -> Optional[AsyncCallbackManagerForLLMRun]:
+    """The same run's callbacks, for the async path a sync call is driven through."""
+    if run_manager is None:
+        return None
+    return AsyncCallbackManagerForLLMRun(
+        run_id=run_manager.run_id,
+        handlers=run_manager.handlers,
+        inheritable_handlers=run_manager.inheritable_handlers,
+        parent_run_id=run_manager.parent_run_id,
+        tags=run_manager.tags,
+        inheritable_tags=run_manager.inheritable_tags,
+        metadata=run_manager.metadata,
+        inheritable_metadata=run_manager.inheritable_metadata,
+    )
+
+
+@dataclass
+class HedgeStats:
+    """Counters for one model's hedged / deadline-bounded calls."""
+
+    calls: int = 0
+    hedged: int = 0
+    hedge_wins: int = 0
+    timeouts: int = 0
+    errors: int = 0
+    latencies_s: deque = field(default_factory=lambda: deque(maxlen=10_000))
+    lock: Any = field(default_factory=threading.Lock, repr=False)
+
+    def may_hedge(self, budget: float) -> bool:
+        """Allow a hedge while hedges stay within `budget` (a fraction of all calls)."""
+        with self.lock:
+            if self.hedged < budget * self.calls:
+                self.hedged += 1
+                return True
+            return False
+
+    def summary(self) -> dict[str, float]:
+        latencies = sorted(self.latencies_s)
+        summary = {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "timeouts": self.timeouts,
+            "errors": self.errors,
+        }
+        if len(latencies) >= 2:
+            quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+            summary.update(p50_s=quantiles[49], p95_s=quantiles[94], p99_s=quantiles[98])
+        return summary
+
+
+# Keyed by model name so every client of the same model reports into one place
+hedge_stats: dict[str, HedgeStats] = {}
+
+
+def get_hedge_stats(model_name: str) -> HedgeStats:
+    return hedge_stats.setdefault(model_name, HedgeStats())
+
+
+def hedge_stats_summary() -> dict[str, dict[str, float]]:
+    """Hedge and timeout statistics for every model seen so far."""
+    return {model_name: stats.summary() for model_name, stats in hedge_stats.items()}
+
+
+class HedgedChatModel(ChatModelProxy):
+    """Bound every call by a deadline and optionally hedge slow calls.
+
+    When the first attempt has not answered after `hedge_after_s`, a duplicate
+    request is sent (while hedges stay under `hedge_budget` of all calls) and the
+    first successful response wins. Calls still running at `timeout_s` raise
+    `TimeoutError`. Losing and timed-out attempts are cancelled; sync calls run
+    through the async path too, so the wrapped model's `_agenerate` should be
+    natively async. Callbacks (and streaming) follow the first attempt only.
+    """
+
+    timeout_s: Optional[float] = None
+    hedge_after_s: Optional[float] = None
+    hedge_budget: float = 0.1
+    stats: HedgeStats = Field(default=None, exclude=True)
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        if self.stats is None:
+            self.stats = get_hedge_stats(self.model_label)
+
+    def _wait_plan(self) -> tuple[Optional[float], Optional[float]]:
+        """Return (seconds before hedging, seconds before the deadline) for a new call."""
+        with self.stats.lock:
+            self.stats.calls += 1
+        return self.hedge_after_s, self.timeout_s
+
+    def _record(self, start: float, hedge_won: bool) -> None:
+        with self.stats.lock:
+            self.stats.latencies_s.append(time.perf_counter() - start)
+            self.stats.hedge_wins += hedge_won
+
+    def _record_failure(self, timed_out: bool) -> None:
+        with self.stats.lock:
+            if timed_out:
+                self.stats.timeouts += 1
+            else:
+                self.stats.errors += 1
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        coroutine = self._agenerate(messages, stop, _async_run_manager(run_manager), **kwargs)
+        return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        hedge_after_s, timeout_s = self._wait_plan()
+        start = time.perf_counter()
+        attempts = [asyncio.ensure_future(self.aforward(self.llm, messages, stop, run_manager=run_manager, **kwargs))]
+
+        try:
+            if hedge_after_s is not None:
+                done, _ = await asyncio.wait(attempts, timeout=hedge_after_s)
+                if not done and self.stats.may_hedge(self.hedge_budget):
+                    attempts.append(asyncio.ensure_future(self.aforward(self.llm, messages, stop, **kwargs)))
+
+            pending = set(attempts)
+            while pending:
+                remaining = None if timeout_s is None else max(timeout_s - (time.perf_counter() - start), 0)
+                done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    break
+                for task in done:
+                    if task.exception() is None:
+                        self._record(start, hedge_won=task is not attempts[0])
+                        return task.result()
+                if not pending:
+                    self._record_failure(timed_out=False)
+                    raise next(iter(done)).exception()
+
+            self._record_failure(timed_out=True)
+            raise TimeoutError(f"LLM call to {self.model_label!r} exceeded {timeout_s}s")
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
@@ -0,0 +1,183 @@
+import asyncio
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import httpx
+import openai
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+from pydantic import Field
+
+from deps.chat_model_proxy import ChatModelProxy
+
+LEAST_OUTSTANDING = "least_outstanding"
+WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
+
+
+def is_transient(error: BaseException) -> bool:
+    """Whether another member may succeed: timeouts, connection errors, rate limits (429) and server errors (5xx).
+
+    Anything else (400, authentication, validation errors) would fail on every member too.
+    """
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError, openai.APIConnectionError)):
+        return True
+    # `status_code` on OpenAI / httpx errors, an integer `code` on Google API errors
+    status = getattr(error, "status_code", None)
+    if status is None and isinstance(getattr(error, "code", None), int):
+        status = error.code
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+@dataclass
+class PoolMemberState:
+    """Load and health bookkeeping for one pooled chat model."""
+
+    name: str
+    weight: float = 1.0
+    outstanding: int = 0
+    requests: int = 0
+    failures: int = 0
+    consecutive_failures: int = 0
+    down_until: float = 0.0
+    current_weight: float = 0.0  # smooth weighted round-robin accumulator
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.down_until
+
+
+class PooledChatModel(ChatModelProxy):
+    """Spread calls across several chat models (keys, providers or endpoints) serving the same role.
+
+    Members are picked by least outstanding requests (weighted) or smooth weighted
+    round-robin. A member that fails `unhealthy_after` times in a row is taken out
+    of rotation for `cooldown_s`; a call failing with a transient error (see
+    `is_transient`) is retried on the next member. Other errors are raised as is
+    and do not count against the member's health.
+    """
+
+    members: list[BaseChatModel]
+    member_names: list[str] = Field(default_factory=list)
+    weights: list[float] = Field(default_factory=list)
+    strategy: str = LEAST_OUTSTANDING
+    unhealthy_after: int = 3
+    cooldown_s: float = 30.0
+    states: list[PoolMemberState] = Field(default_factory=list, exclude=True)
+    lock: Any = Field(default_factory=threading.Lock, exclude=True)
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        if self.strategy not in (LEAST_OUTSTANDING, WEIGHTED_ROUND_ROBIN):
+            raise ValueError(
+                f"Unsupported pool strategy: {self.strategy!r}. "
+                f"Expected {LEAST_OUTSTANDING!r} or {WEIGHTED_ROUND_ROBIN!r}."
+            )
+        names = self.member_names or [f"member-{i}" for i in range(len(self.members))]
+        weights = self.weights or [1.0] * len(self.members)
+        self.states = [PoolMemberState(name=name, weight=weight) for name, weight in zip(names, weights)]
+
+    def _acquire(self, exclude: set[int]) -> int:
+        """Pick a member, count it as outstanding and return its index."""
+        with self.lock:
+            now = time.monotonic()
+            candidates = [
+                i for i, state in enumerate(self.states) if i not in exclude and state.healthy(now)
+            ] or [
+                # Everything is down: try the member that comes back soonest
+                min((i for i in range(len(self.states)) if i not in exclude), key=lambda i: self.states[i].down_until)
+            ]
+
+            if self.strategy == WEIGHTED_ROUND_ROBIN:
+                total_weight = sum(self.states[i].weight for i in candidates)
+                for i in candidates:
+                    self.states[i].current_weight += self.states[i].weight
+                index = max(candidates, key=lambda i: self.states[i].current_weight)
+                self.states[index].current_weight -= total_weight
+            else:
+                index = min(candidates, key=lambda i: (self.states[i].outstanding / self.states[i].weight, i))
+
+            self.states[index].outstanding += 1
+            self.states[index].requests += 1
+            return index
+
+    def _release(self, index: int, error: Optional[BaseException]) -> None:
+        with self.lock:
+            state = self.states[index]
+            state.outstanding -= 1
+            if error is None:
+                state.consecutive_failures = 0
+                return
+            state.failures += 1
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= self.unhealthy_after:
+                state.down_until = time.monotonic() + self.cooldown_s
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tried: set[int] = set()
+        while True:
+            index = self._acquire(tried)
+            tried.add(index)
+            try:
+                result = self.forward(self.members[index], messages, stop, run_manager=run_manager, **kwargs)
+            except Exception as e:
+                if not is_transient(e):
+                    self._release(index, None)
+                    raise
+                self._release(index, e)
+                if len(tried) == len(self.members):
+                    raise
+                continue
+            self._release(index, None)
+            return result
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: Optional[list[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        tried: set[int] = set()
+        while True:
+            index = self._acquire(tried)
+            tried.add(index)
+            try:
+                result = await self.aforward(self.members[index], messages, stop, run_manager=run_manager, **kwargs)
+            except asyncio.CancelledError:
+                # A cancelled call (e.g. a losing hedge) says nothing about the member's health
+                self._release(index, None)
+                raise
+            except Exception as e:
+                if not is_transient(e):
+                    self._release(index, None)
+                    raise
+                self._release(index, e)
+                if len(tried) == len(self.members):
+                    raise
+                continue
+            self._release(index, None)
+            return result
+
+    def member_stats(self) -> list[dict[str, Any]]:
+        now = time.monotonic()
+        with self.lock:
+            return [
+                {
+                    "member": state.name,
+                    "weight": state.weight,
+                    "requests": state.requests,
+                    "failures": state.failures,
+                    "outstanding": state.outstanding,
+                    "healthy": state.healthy(now),
+                }
+                for state in self.states
+            ]
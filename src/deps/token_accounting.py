@@ -0,0 +1,152 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Callable
+
+from deps.llm_client import collect_usage, estimate_cost
+from settings import ProjectSettings
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken ships with langchain-openai; keep a heuristic for other installs
+    tiktoken = None
+
+
+@lru_cache(maxsize=None)
+def get_token_counter(model_name: str) -> Callable[[str], int]:
+    """Return an offline token counter for `model_name`.
+
+    Uses the model's tiktoken encoding (o200k_base for unknown models, e.g. Gemini,
+    where it is a close estimate). Falls back to ~4 characters per token when
+    tiktoken or its encoding files are not available.
+    """
+    if tiktoken is not None:
+        try:
+            try:
+                encoding = tiktoken.encoding_for_model(model_name)
+            except KeyError:
+                encoding = tiktoken.get_encoding("o200k_base")
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        except Exception as e:  # encoding files are downloaded on first use
+            print(f"tiktoken encoding unavailable ({e}); estimating tokens from characters.")
+    return lambda text: len(text) // 4 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int, count_tokens: Callable[[str], int]) -> str:
+    """Cut `text` so that it fits in `max_tokens` (binary search on the character length)."""
+    if count_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+@dataclass
+class StageUsage:
+    """Token usage of one LLM-facing stage over a run."""
+
+    requests: int = 0
+    estimated_prompt_tokens: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    truncated: int = 0
+    split: int = 0
+    rows: dict = field(default_factory=lambda: defaultdict(lambda: [0, 0]))
+
+
+class TokenLedger:
+    """Per-request, per-row and per-run token accounting for extraction, Cypher and answer stages.
+
+    Prompts are counted offline before they are sent; actual usage and cost come
+    from the provider's usage metadata. `budget(stage)` reads
+    `llm_stage_token_budgets`, which callers enforce by splitting or truncating
+    their inputs.
+    """
+
+    def __init__(self, settings: ProjectSettings):
+        self.settings = settings
+        self.count_tokens = get_token_counter(settings.llm.llm_model)
+        self.stages: dict[str, StageUsage] = defaultdict(StageUsage)
+        self.lock = threading.Lock()
+
+    def budget(self, stage: str) -> int | None:
+        return self.settings.llm.llm_stage_token_budgets.get(stage)
+
+    def over_budget(self, stage: str, prompt_text: str) -> bool:
+        budget = self.budget(stage)
+        return budget is not None and self.count_tokens(prompt_text) > budget
+
+    def note(self, stage: str, truncated: int = 0, split: int = 0) -> None:
+        """Record that a stage had to truncate or split an input to stay within budget."""
+        with self.lock:
+            self.stages[stage].truncated += truncated
+            self.stages[stage].split += split
+
+    @contextmanager
+    def track(self, stage: str, prompt_text: str, row: int | None = None):
+        """Count one request's prompt tokens up front and its actual usage once it returns."""
+        estimated = self.count_tokens(prompt_text)
+        with collect_usage() as usage:
+            try:
+                yield estimated
+            finally:
+                prompt_tokens = completion_tokens = 0
+                cost = 0.0
+                for model_name, model_usage in usage.usage_metadata.items():
+                    prompt_tokens += model_usage.get("input_tokens", 0)
+                    completion_tokens += model_usage.get("output_tokens", 0)
+                    cost += estimate_cost(
+                        self.settings,
+                        model_name,
+                        model_usage.get("input_tokens", 0),
+                        model_usage.get("output_tokens", 0),
+                    )
+
+                with self.lock:
+                    stage_usage = self.stages[stage]
+                    stage_usage.requests += 1
+                    stage_usage.estimated_prompt_tokens += estimated
+                    stage_usage.prompt_tokens += prompt_tokens
+                    stage_usage.completion_tokens += completion_tokens
+                    stage_usage.cost += cost
+                    if row is not None:
+                        stage_usage.rows[row][0] += prompt_tokens or estimated
+                        stage_usage.rows[row][1] += completion_tokens
+
+    def summary(self) -> dict[str, dict]:
+        """Run summary: tokens and estimated cost broken down by stage, plus totals."""
+        summary = {}
+        for stage, usage in self.stages.items():
+            summary[stage] = {
+                "requests": usage.requests,
+                "estimated_prompt_tokens": usage.estimated_prompt_tokens,
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "cost": usage.cost,
+                "truncated": usage.truncated,
+                "split": usage.split,
+            }
+            if usage.rows:
+                summary[stage]["max_row_tokens"] = max(sum(tokens) for tokens in usage.rows.values())
+        summary["total"] = {
+            key: sum(stage[key] for stage in summary.values())
+            for key in ("requests", "estimated_prompt_tokens", "prompt_tokens", "completion_tokens", "cost")
+        }
+        return summary
+
+    def print_summary(self) -> None:
+        for stage, usage in self.summary().items():
+            print(
+                f"[tokens] {stage}: {usage['requests']} requests, "
+                f"prompt {usage['prompt_tokens']} (estimated {usage['estimated_prompt_tokens']}), "
+                f"completion {usage['completion_tokens']}, ${usage['cost']:.4f}"
+                + (f", {usage['split']} split, {usage['truncated']} truncated" if stage != "total" else "")
+            )
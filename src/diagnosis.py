@@ -0,0 +1,261 @@
+# In-process diagnosis: the SYMPTOM <-HAS_SYMPTOM- CROP_PART -HAS_DISEASE-> DISEASE paths are loaded once
+# after ingestion into a sparse symptom x (crop part, disease) incidence matrix, so ranking diseases for a
+# set of symptoms is a few vectorized operations instead of a multi-hop traversal and an LLM-written query.
+
+import re
+import time
+from pathlib import Path
+
+import numpy as np
+
+from entity_linker import stem
+from groups import graph_cli, group_path
+from settings import settings
+
+try:
+    from scipy import sparse
+except ImportError:  # scipy is optional; fall back to dense arrays (fine for graphs of this size)
+    sparse = None
+
+DIAGNOSIS_PATHS_QUERY = """
+MATCH (s:Symptom)<-[:HAS_SYMPTOM]-(cp:Crop_part)-[:HAS_DISEASE]->(d:Disease)
+WHERE $group_id IS NULL OR d.group_id = $group_id
+RETURN DISTINCT s.id AS symptom, cp.id AS crop_part, d.id AS disease
+"""
+
+DISEASE_SEASONS_QUERY = """
+MATCH (d:Disease)-[:PEAKS_DURING]->(s:Seasonality)
+WHERE $group_id IS NULL OR d.group_id = $group_id
+RETURN DISTINCT d.id AS disease, s.id AS season
+"""
+
+# Questions that ask which disease explains what the user observes ("what disease could it be?",
+# "what's wrong with my tree?"); treatment or symptom questions that merely name a symptom are left to Cypher
+DIAGNOSIS_QUESTION_PATTERN = re.compile(
+    r"\b(?:what|which)\s+(?:diseases?|illness(?:es)?|infections?|problems?)\b"
+    r"|\bwhat(?:'s| is)\s+(?:wrong|causing|behind)\b|\bdiagnos\w*",
+    re.IGNORECASE,
+)
+
+
+def _tokens(text: str) -> frozenset[str]:
+    return frozenset(stem(token) for token in re.findall(r"\w+", text.casefold()))
+
+
+def _mentioned(labels: list[str], label_tokens: list[frozenset[str]], question_tokens: frozenset[str]) -> list[int]:
+    """Indices of labels whose every token appears in the question."""
+    return [i for i, tokens in enumerate(label_tokens) if tokens and tokens <= question_tokens]
+
+
+class DiagnosisIndex:
+    """Rank diseases for a set of symptoms, optionally restricted to crop parts and seasons.
+
+    A disease's score is the IDF-weighted share of the given symptoms it explains
+    (through any of the allowed crop parts), so symptoms shared by many diseases
+    count less than distinctive ones.
+    """
+
+    def __init__(
+        self,
+        symptoms: list[str],
+        crop_parts: list[str],
+        diseases: list[str],
+        seasons: list[str],
+        paths: np.ndarray,
+        disease_seasons: np.ndarray,
+    ):
+        self.symptoms, self.crop_parts, self.diseases, self.seasons = symptoms, crop_parts, diseases, seasons
+        self.paths = paths.reshape(-1, 3).astype(np.int32)
+        self.disease_seasons = disease_seasons.reshape(-1, 2).astype(np.int32)
+
+        self.symptom_ids = {name: i for i, name in enumerate(symptoms)}
+        self.crop_part_ids = {name: i for i, name in enumerate(crop_parts)}
+        self.season_ids = {name: i for i, name in enumerate(seasons)}
+        self.symptom_tokens = [_tokens(name) for name in symptoms]
+        self.crop_part_tokens = [_tokens(name) for name in crop_parts]
+        self.season_tokens = [_tokens(name) for name in seasons]
+        self.disease_tokens = [_tokens(name) for name in diseases]
+
+        n_symptoms, n_parts, n_diseases = len(symptoms), len(crop_parts), len(diseases)
+        symptom_idx, part_idx, disease_idx = self.paths.T if len(self.paths) else (np.empty(0, np.int32),) * 3
+        ones = np.ones(len(self.paths), dtype=np.float32)
+
+        # symptom x (crop part, disease), and the same collapsed over crop parts
+        self.part_incidence = self._matrix(
+            ones, symptom_idx, part_idx * n_diseases + disease_idx, n_symptoms, n_parts * n_diseases
+        )
+        self.incidence = self._matrix(ones, symptom_idx, disease_idx, n_symptoms, n_diseases)
+        season_disease = self._matrix(
+            np.ones(len(self.disease_seasons), dtype=np.float32),
+            self.disease_seasons[:, 1],
+            self.disease_seasons[:, 0],
+            len(seasons),
+            n_diseases,
+        )
+        self.season_mask = self._dense(season_disease) > 0
+
+        # Inverse document frequency of each symptom over diseases
+        document_frequency = np.asarray((self._dense(self.incidence) > 0).sum(axis=1)).ravel()
+        self.idf = np.log1p(n_diseases / np.maximum(document_frequency, 1)).astype(np.float32)
+
+    @staticmethod
+    def _matrix(values, rows, cols, n_rows, n_cols):
+        """Binary incidence matrix (duplicate entries collapse to 1)."""
+        if sparse is not None:
+            matrix = sparse.csr_matrix((values, (rows, cols)), shape=(n_rows, n_cols))
+            matrix.data[:] = 1
+            return matrix
+        matrix = np.zeros((n_rows, n_cols), dtype=np.float32)
+        matrix[rows, cols] = 1
+        return matrix
+
+    @staticmethod
+    def _dense(matrix) -> np.ndarray:
+        return matrix.toarray() if sparse is not None and sparse.issparse(matrix) else np.asarray(matrix)
+
+    @classmethod
+    def from_graph(cls, graph, group_id: str | None = None) -> "DiagnosisIndex":
+        """Load the diagnosis paths from the knowledge graph (of `group_id` only, when given)."""
+        path_rows = graph.query(DIAGNOSIS_PATHS_QUERY, {"group_id": group_id})
+        season_rows = graph.query(DISEASE_SEASONS_QUERY, {"group_id": group_id})
+
+        symptoms = sorted({row["symptom"] for row in path_rows})
+        crop_parts = sorted({row["crop_part"] for row in path_rows})
+        diseases = sorted({row["disease"] for row in path_rows} | {row["disease"] for row in season_rows})
+        seasons = sorted({row["season"] for row in season_rows})
+
+        symptom_ids = {name: i for i, name in enumerate(symptoms)}
+        crop_part_ids = {name: i for i, name in enumerate(crop_parts)}
+        disease_ids = {name: i for i, name in enumerate(diseases)}
+        season_ids = {name: i for i, name in enumerate(seasons)}
+        paths = np.array(
+            [(symptom_ids[r["symptom"]], crop_part_ids[r["crop_part"]], disease_ids[r["disease"]]) for r in path_rows],
+            dtype=np.int32,
+        )
+        disease_seasons = np.array(
+            [(disease_ids[r["disease"]], season_ids[r["season"]]) for r in season_rows], dtype=np.int32
+        )
+        return cls(symptoms, crop_parts, diseases, seasons, paths, disease_seasons)
+
+    def save(self, path: Path = settings.diagnosis_index_path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as f:  # np.savez would append `.npz` to a str path
+            np.savez(
+                f,
+                symptoms=np.array(self.symptoms, dtype=str),
+                crop_parts=np.array(self.crop_parts, dtype=str),
+                diseases=np.array(self.diseases, dtype=str),
+                seasons=np.array(self.seasons, dtype=str),
+                paths=self.paths,
+                disease_seasons=self.disease_seasons,
+            )
+
+    @classmethod
+    def load(cls, path: Path = settings.diagnosis_index_path) -> "DiagnosisIndex":
+        with np.load(path) as data:
+            return cls(
+                data["symptoms"].tolist(),
+                data["crop_parts"].tolist(),
+                data["diseases"].tolist(),
+                data["seasons"].tolist(),
+                data["paths"],
+                data["disease_seasons"],
+            )
+
+    def diagnose(
+        self,
+        symptoms: list[str],
+        crop_parts: list[str] | None = None,
+        seasons: list[str] | None = None,
+        top_k: int = 5,
+    ) -> list[dict]:
+        """Rank diseases for `symptoms` (node ids); unknown names are ignored.
+
+        `crop_parts` only counts symptom paths through those parts; `seasons` keeps
+        diseases that peak in any of those seasons.
+        """
+        symptom_idx = np.array([self.symptom_ids[s] for s in symptoms if s in self.symptom_ids], dtype=np.int32)
+        if not len(symptom_idx):
+            return []
+
+        part_idx = [self.crop_part_ids[p] for p in crop_parts or [] if p in self.crop_part_ids]
+        if part_idx:
+            by_part = self._dense(self.part_incidence[symptom_idx]).reshape(len(symptom_idx), len(self.crop_parts), -1)
+            evidence = by_part[:, part_idx, :].max(axis=1)
+        else:
+            evidence = self._dense(self.incidence[symptom_idx])
+
+        weights = self.idf[symptom_idx]
+        scores = weights @ evidence / weights.sum()
+
+        season_idx = [self.season_ids[s] for s in seasons or [] if s in self.season_ids]
+        if season_idx:
+            scores = scores * self.season_mask[season_idx].any(axis=0)
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+        return [
+            {
+                "disease": self.diseases[d],
+                "score": round(float(scores[d]), 4),
+                "matched_symptoms": [self.symptoms[s] for s, hit in zip(symptom_idx, evidence[:, d]) if hit],
+            }
+            for d in candidates
+        ]
+
+    def parse_question(self, question: str) -> dict[str, list[str]]:
+        """Symptoms, crop parts and seasons named in a question (all tokens of the node id present)."""
+        question_tokens = _tokens(question)
+        return {
+            "symptoms": [self.symptoms[i] for i in _mentioned(self.symptoms, self.symptom_tokens, question_tokens)],
+            "crop_parts": [
+                self.crop_parts[i] for i in _mentioned(self.crop_parts, self.crop_part_tokens, question_tokens)
+            ],
+            "seasons": [self.seasons[i] for i in _mentioned(self.seasons, self.season_tokens, question_tokens)],
+        }
+
+    def diagnose_question(self, question: str, top_k: int = 5) -> list[dict]:
+        """Ranked diagnosis for a symptom question, or [] when it is not one (the caller falls back to Cypher).
+
+        A question that names a disease already knows the diagnosis and asks something else about it.
+        """
+        if not DIAGNOSIS_QUESTION_PATTERN.search(question):
+            return []
+        if _mentioned(self.diseases, self.disease_tokens, _tokens(question)):
+            return []
+        mentioned = self.parse_question(question)
+        if not mentioned["symptoms"]:
+            return []
+        return self.diagnose(mentioned["symptoms"], mentioned["crop_parts"], mentioned["seasons"], top_k=top_k)
+
+
+def build_diagnosis_index(
+    graph, path: Path = settings.diagnosis_index_path, group_id: str | None = None
+) -> DiagnosisIndex:
+    """Rebuild the diagnosis index from the graph and save it next to the other local caches (per group)."""
+    index = DiagnosisIndex.from_graph(graph, group_id=group_id)
+    index.save(group_path(path, group_id))
+    return index
+
+
+def load_diagnosis_index(
+    graph, path: Path = settings.diagnosis_index_path, group_id: str | None = None
+) -> DiagnosisIndex:
+    """Load the saved diagnosis index (of `group_id`), building it from the graph the first time."""
+    if group_path(path, group_id).exists():
+        return DiagnosisIndex.load(group_path(path, group_id))
+    return build_diagnosis_index(graph, path, group_id)
+
+
+if __name__ == "__main__":
+    graph_client, group_id = graph_cli("Rebuild the diagnosis index from the knowledge graph.")
+    index = build_diagnosis_index(graph_client, group_id=group_id)
+    print(f"{len(index.symptoms)} symptoms, {len(index.crop_parts)} crop parts, {len(index.diseases)} diseases")
+
+    question = "If my tree has yellowing leaves, what disease could it be?"
+    start = time.perf_counter()
+    diagnosis = index.diagnose_question(question)
+    print(f"{question}\n{diagnosis}\n({(time.perf_counter() - start) * 1e6:.0f} µs)")
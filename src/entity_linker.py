@@ -0,0 +1,265 @@
+# Local entity linking: question terms are resolved to graph node ids before Cypher generation, so the
+# LLM refers to nodes through query parameters instead of guessing ids ("Unilateral Yellowing" vs
+# "unilateral yellowing"). Lookups go exact -> case/diacritic-folded -> prefix (trie) -> char n-gram.
+
+import json
+import math
+import re
+import time
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+
+from materialize import graph_label
+from groups import graph_cli, group_path
+from settings import settings
+
+NODE_IDS_QUERY = """
+MATCH (n)
+WHERE n.id IS NOT NULL AND ($group_id IS NULL OR n.group_id = $group_id)
+RETURN labels(n) AS labels, n.id AS id
+"""
+
+# Labels LangChain adds for bookkeeping rather than for the domain schema
+IGNORED_LABELS = {"__Entity__", "Document"}
+
+# Words that never start or end a linked span (English and Vietnamese question words)
+STOP_WORDS = set(
+    "a an and are be by can could do does for from has have how if in is it its my of on or the to what when where "
+    "which who why with la nao gi cua cho va co khong nhung cac trong tren o bi".split()
+)
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Case- and diacritic-insensitive form (Vietnamese `Bệnh thối rễ` -> `benh thoi re`)."""
+    text = unicodedata.normalize("NFKD", text.casefold().replace("đ", "d"))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(_TOKEN_PATTERN.findall(text))
+
+
+def stem(token: str) -> str:
+    """Crude singular form, enough to match `leaves` to `leaf` and `spots` to `spot`."""
+    if token.endswith("ves") and len(token) > 4:
+        return token[:-3] + "f"
+    if token.endswith("ies") and len(token) > 4:
+        return token[:-3] + "y"
+    if token.endswith("s") and not token.endswith("ss") and len(token) > 3:
+        return token[:-1]
+    return token
+
+
+def _ngrams(text: str, n: int = 3) -> frozenset[str]:
+    padded = f" {text} "
+    return frozenset(padded[i : i + n] for i in range(max(len(padded) - n + 1, 1)))
+
+
+class EntityLinker:
+    """Index of graph node ids per label for exact, folded, prefix and fuzzy lookup.
+
+    Nodes can be added at any time (`add`); every structure is updated in place,
+    so ingestion only has to add the nodes it wrote.
+    """
+
+    def __init__(self, min_fuzzy_score: float = 0.75):
+        self.min_fuzzy_score = min_fuzzy_score
+        self.entries: list[tuple[str, str]] = []  # (label, node id)
+        self.entry_ids: dict[tuple[str, str], int] = {}
+        self.exact: dict[str, list[int]] = defaultdict(list)
+        self.folded: dict[str, list[int]] = defaultdict(list)
+        self.trie: dict = {}
+        self.ngram_postings: dict[str, list[int]] = defaultdict(list)
+        self.entry_ngrams: list[frozenset[str]] = []
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, label: str, node_id: str) -> bool:
+        """Index one node; returns False when it is already indexed."""
+        key = (graph_label(label), node_id)
+        if key in self.entry_ids:
+            return False
+        index = len(self.entries)
+        self.entries.append(key)
+        self.entry_ids[key] = index
+
+        folded = fold(node_id)
+        self.exact[node_id].append(index)
+        self.folded[folded].append(index)
+
+        node = self.trie
+        for char in folded:
+            node = node.setdefault(char, {})
+        node.setdefault("", []).append(index)
+
+        ngrams = _ngrams(folded)
+        for ngram in ngrams:
+            self.ngram_postings[ngram].append(index)
+        self.entry_ngrams.append(ngrams)
+        return True
+
+    def add_nodes(self, node_ids: dict[str, set[str]]) -> int:
+        """Index nodes given as label -> ids (e.g. `materialize.touched_node_ids`); returns how many were new."""
+        return sum(self.add(label, node_id) for label, ids in node_ids.items() for node_id in ids)
+
+    def _prefix_matches(self, folded: str, limit: int) -> list[int]:
+        node = self.trie
+        for char in folded:
+            node = node.get(char)
+            if node is None:
+                return []
+        matches, stack = [], [node]
+        while stack and len(matches) < limit:
+            node = stack.pop()
+            for char, child in node.items():
+                if char == "":
+                    matches.extend(child)
+                else:
+                    stack.append(child)
+        return matches[:limit]
+
+    def _fuzzy_matches(self, folded: str, limit: int) -> list[tuple[int, float]]:
+        """Entries ranked by Dice similarity of their character trigram sets, at least `min_fuzzy_score`.
+
+        A match shares at least `k` trigrams with the term, hence one of its
+        `size - k + 1` rarest ones, so only those postings are scanned for candidates.
+        """
+        ngrams = _ngrams(folded)
+        size = len(ngrams)
+        threshold = self.min_fuzzy_score
+        k = math.ceil(threshold * size / (2 - threshold))
+        rarest = sorted(ngrams, key=lambda ngram: len(self.ngram_postings.get(ngram, ())))
+
+        candidates = set()
+        for ngram in rarest[: size - k + 1]:
+            candidates.update(self.ngram_postings.get(ngram, ()))
+
+        scored = []
+        for index in candidates:
+            other = self.entry_ngrams[index]
+            score = 2 * len(ngrams & other) / (size + len(other))
+            if score >= threshold:
+                scored.append((index, score))
+        return sorted(scored, key=lambda item: -item[1])[:limit]
+
+    def lookup(self, term: str, label: str | None = None, limit: int = 5) -> list[dict]:
+        """Candidate nodes for `term`, best first, from the first lookup stage that finds any."""
+        folded = fold(term)
+        if not folded:
+            return []
+
+        if term in self.exact:
+            scored = [(index, 1.0, "exact") for index in self.exact[term]]
+        elif folded in self.folded:
+            scored = [(index, 0.95, "folded") for index in self.folded[folded]]
+        elif prefix := self._prefix_matches(folded, limit):
+            # Score prefix matches by how much of the node id the term covers
+            scored = [(index, 0.9 * len(folded) / len(fold(self.entries[index][1])), "prefix") for index in prefix]
+        else:
+            scored = [(index, 0.9 * score, "fuzzy") for index, score in self._fuzzy_matches(folded, limit)]
+
+        candidates = [
+            {"label": self.entries[index][0], "id": self.entries[index][1], "score": round(score, 4), "match": match}
+            for index, score, match in sorted(scored, key=lambda item: -item[1])
+            if label is None or self.entries[index][0] == graph_label(label)
+        ]
+        return candidates[:limit]
+
+    def link(self, question: str, max_span_tokens: int = 5, min_score: float = 0.6) -> list[dict]:
+        """Link non-overlapping question spans to their best node, longest and best-scoring spans first."""
+        tokens = fold(question).split()
+        spans = []
+        for start in range(len(tokens)):
+            if tokens[start] in STOP_WORDS:
+                continue
+            for end in range(start + 1, min(start + max_span_tokens, len(tokens)) + 1):
+                if tokens[end - 1] in STOP_WORDS:
+                    continue
+                span = " ".join(tokens[start:end])
+                if len(span) < 3:
+                    continue
+                candidates = self.lookup(span, limit=1)
+                if candidates and candidates[0]["score"] >= min_score:
+                    spans.append((candidates[0]["score"], end - start, start, end, span, candidates[0]))
+
+        linked, taken = [], set()
+        for score, _, start, end, span, candidate in sorted(spans, key=lambda item: (-item[0], -item[1], item[2])):
+            if taken.isdisjoint(range(start, end)):
+                taken.update(range(start, end))
+                linked.append((start, {"span": span, **candidate}))
+        return [entity for _, entity in sorted(linked, key=lambda item: item[0])]
+
+    @classmethod
+    def from_graph(cls, graph, group_id: str | None = None, **kwargs) -> "EntityLinker":
+        linker = cls(**kwargs)
+        for row in graph.query(NODE_IDS_QUERY, {"group_id": group_id}):
+            for label in row["labels"]:
+                if label not in IGNORED_LABELS:
+                    linker.add(label, row["id"])
+        return linker
+
+    def save(self, path: Path = settings.entity_index_path) -> None:
+        """Persist the indexed (label, id) pairs; lookup structures are rebuilt on load."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.entries, ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: Path = settings.entity_index_path, **kwargs) -> "EntityLinker":
+        linker = cls(**kwargs)
+        for label, node_id in json.loads(path.read_text(encoding="utf-8")):
+            linker.add(label, node_id)
+        return linker
+
+
+def linked_entities_prompt(linked: list[dict]) -> tuple[str, dict[str, str]]:
+    """Render linked entities for the Cypher prompt, with the query parameters that carry their ids."""
+    if not linked:
+        return "None", {}
+    lines, params = [], {}
+    for i, entity in enumerate(linked):
+        params[f"e{i}"] = entity["id"]
+        lines.append(f'- $e{i}: {entity["label"]} node "{entity["id"]}" (question term "{entity["span"]}")')
+    return "\n".join(lines), params
+
+
+def update_entity_index(
+    node_ids: dict[str, set[str]] | None,
+    graph=None,
+    path: Path = settings.entity_index_path,
+    group_id: str | None = None,
+) -> EntityLinker:
+    """Add ingested nodes to the saved index, or rebuild it from `graph` when `node_ids` is None.
+
+    With a `group_id`, the index covers that group only and is saved per group.
+    """
+    path = group_path(path, group_id)
+    if node_ids is None or not path.exists():
+        linker = EntityLinker.from_graph(graph, group_id=group_id)
+    else:
+        linker = EntityLinker.load(path)
+        linker.add_nodes(node_ids)
+    linker.save(path)
+    return linker
+
+
+def load_entity_linker(graph, path: Path = settings.entity_index_path, group_id: str | None = None) -> EntityLinker:
+    """Load the saved entity index (of `group_id`), building it from the graph the first time."""
+    if group_path(path, group_id).exists():
+        return EntityLinker.load(group_path(path, group_id))
+    return update_entity_index(None, graph, path, group_id)
+
+
+if __name__ == "__main__":
+    graph_client, group_id = graph_cli("Rebuild the entity index from the knowledge graph.")
+    linker = update_entity_index(None, graph_client, group_id=group_id)
+    print(f"Indexed {len(linker)} nodes.")
+
+    for question in [
+        "If my tree has unilateral yellowing leaves, what disease could it be?",
+        "Which diseases on durian caused by Phytophthora Palmivora?",
+        "Bệnh nào ảnh hưởng đến nhiều loại giống cây trồng nhất?",
+    ]:
+        start = time.perf_counter()
+        linked = linker.link(question)
+        print(f"{question}\n{linked}\n({(time.perf_counter() - start) * 1e6:.0f} µs)")
@@ -0,0 +1,202 @@
+import argparse
+import asyncio
+import csv
+import json
+import re
+import statistics
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+from typing import Any
+
+from query_profiler import query_shape
+
+# Answers at least this similar to the expected answer count as a fuzzy match
+FUZZY_MATCH_THRESHOLD = 0.8
+
+
+def load_questions(path: Path) -> list[dict[str, Any]]:
+    """Read questions from CSV or JSONL with a `question` column and optional `expected_cypher` / `expected_answer`."""
+    if path.suffix == ".csv":
+        with open(path, newline="", encoding="utf-8") as f:
+            rows = list(csv.DictReader(f))
+    else:
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    return [{key: value for key, value in row.items() if value not in (None, "")} for row in rows]
+
+
+def _normalize_answer(text: str) -> str:
+    return " ".join(re.findall(r"\w+", text.casefold()))
+
+
+def _normalize_cypher(query: str) -> str:
+    return query_shape(query).casefold().rstrip(";")
+
+
+def _intermediate(steps: list[dict], key: str, default: Any = None) -> Any:
+    return next((step[key] for step in steps if key in step), default)
+
+
+async def run_question(chain, question: dict[str, Any], semaphore: asyncio.Semaphore) -> dict[str, Any]:
+    """Answer one question through `ainvoke` and record its answer, Cypher, per-stage timings or error."""
+    async with semaphore:
+        start = time.perf_counter()
+        result = {**question}
+        try:
+            response = await chain.ainvoke({"query": question["question"]})
+        except Exception as e:
+            result.update(error=f"{type(e).__name__}: {e}", cypher_error=_is_cypher_error(e))
+        else:
+            steps = response.get("intermediate_steps", [])
+            result.update(
+                answer=response["result"],
+                cypher=_intermediate(steps, "query"),
+                fast_path="diagnosis" if _intermediate(steps, "diagnosis") else None,
+                timings=_intermediate(steps, "timings", {}),
+            )
+        result["latency_s"] = time.perf_counter() - start
+        return result
+
+
+def _is_cypher_error(error: Exception) -> bool:
+    """Whether the query failed in Neo4j rather than in an LLM call."""
+    from neo4j.exceptions import Neo4jError
+
+    return isinstance(error, Neo4jError)
+
+
+async def run_questions(chain, questions: list[dict[str, Any]], concurrency: int) -> tuple[list[dict[str, Any]], float]:
+    """Run every question with at most `concurrency` in flight; returns the results and the wall time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_question(chain, question, semaphore) for question in questions))
+    return results, time.perf_counter() - start
+
+
+def score_result(result: dict[str, Any]) -> dict[str, Any]:
+    """Compare a result to its expected Cypher / answer (when given)."""
+    scores = {}
+    if "expected_cypher" in result and result.get("cypher") is not None:
+        scores["cypher_match"] = _normalize_cypher(result["cypher"]) == _normalize_cypher(result["expected_cypher"])
+    if "expected_answer" in result and "answer" in result:
+        expected, answer = _normalize_answer(result["expected_answer"]), _normalize_answer(result["answer"])
+        similarity = SequenceMatcher(None, expected, answer).ratio()
+        scores.update(
+            exact_match=expected == answer,
+            # A short expected answer contained in a longer one also counts
+            fuzzy_match=similarity >= FUZZY_MATCH_THRESHOLD or (bool(expected) and expected in answer),
+            similarity=round(similarity, 4),
+        )
+    return scores
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    if len(values) < 2:
+        return {"p50": values[0], "p95": values[0], "p99": values[0]} if values else {}
+    quantiles = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": quantiles[49], "p95": quantiles[94], "p99": quantiles[98]}
+
+
+def summarize(results: list[dict[str, Any]], wall_time_s: float | None = None) -> dict[str, Any]:
+    """Latency percentiles (end to end and per stage), throughput, error rates and answer match rates."""
+    scored = [{**result, **score_result(result)} for result in results]
+    answered = [result for result in scored if "error" not in result]
+
+    summary: dict[str, Any] = {
+        "questions": len(results),
+        "errors": len(results) - len(answered),
+        "cypher_error_rate": sum(bool(result.get("cypher_error")) for result in scored) / max(len(results), 1),
+        "latency_s": _percentiles(sorted(result["latency_s"] for result in scored)),
+        "stages_s": {},
+    }
+    if wall_time_s:
+        summary["throughput_qps"] = len(results) / wall_time_s
+
+    stages = sorted({stage for result in answered for stage in result.get("timings", {})})
+    for stage in stages:
+        summary["stages_s"][stage] = _percentiles(
+            sorted(result["timings"][stage] for result in answered if stage in result.get("timings", {}))
+        )
+
+    for key in ("cypher_match", "exact_match", "fuzzy_match"):
+        values = [result[key] for result in scored if key in result]
+        if values:
+            summary[f"{key}_rate"] = sum(values) / len(values)
+    return summary
+
+
+def print_summary(summary: dict[str, Any]) -> None:
+    def fmt(percentiles: dict[str, float]) -> str:
+        return " ".join(f"{name}={value:.3f}s" for name, value in percentiles.items())
+
+    print(f"Questions: {summary['questions']}, errors: {summary['errors']}")
+    if "throughput_qps" in summary:
+        print(f"Throughput: {summary['throughput_qps']:.2f} questions/s")
+    print(f"Latency: {fmt(summary['latency_s'])}")
+    for stage, percentiles in summary["stages_s"].items():
+        print(f"  {stage}: {fmt(percentiles)}")
+    print(f"Cypher execution error rate: {summary['cypher_error_rate']:.1%}")
+    for key in ("cypher_match", "exact_match", "fuzzy_match"):
+        if f"{key}_rate" in summary:
+            print(f"{key.replace('_', ' ').capitalize()}: {summary[f'{key}_rate']:.1%}")
+
+
+def write_results(results: list[dict[str, Any]], path: Path) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(json.dumps(result, ensure_ascii=False, default=str) + "\n")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Batch QA over the knowledge graph with latency and accuracy report.")
+    parser.add_argument("questions", type=Path, help="CSV or JSONL file of questions (or of results with --rescore)")
+    parser.add_argument("--concurrency", type=int, default=4, help="questions in flight at once")
+    parser.add_argument("--output", type=Path, help="write per-question results as JSONL")
+    parser.add_argument(
+        "--rescore", action="store_true", help="score a results JSONL from an earlier run instead of running QA"
+    )
+    parser.add_argument("--cassette", type=Path, help="record LLM responses to / replay them from this cassette file")
+    parser.add_argument(
+        "--cassette-mode",
+        choices=("record", "replay", "auto"),
+        default="auto",
+        help="with --cassette: record every call, only replay (misses fail) or replay and record misses",
+    )
+    parser.add_argument(
+        "--cassette-latency-scale",
+        type=float,
+        default=0.0,
+        help="replayed responses wait this fraction of their recorded latency",
+    )
+    args = parser.parse_args()
+
+    if args.rescore:
+        with open(args.questions, encoding="utf-8") as f:
+            results = [json.loads(line) for line in f if line.strip()]
+        print_summary(summarize(results))
+        return
+
+    from retrieve import build_chain
+    from settings import settings
+
+    if args.cassette:
+        settings = settings.model_copy(
+            update={
+                "llm_cassette_mode": args.cassette_mode,
+                "llm_cassette_path": args.cassette,
+                "llm_cassette_latency_scale": args.cassette_latency_scale,
+            }
+        )
+
+    chain = build_chain(settings)
+    chain.return_intermediate_steps = True
+    chain.verbose = False
+    results, wall_time_s = asyncio.run(run_questions(chain, load_questions(args.questions), args.concurrency))
+    if args.output:
+        write_results(results, args.output)
+    print_summary(summarize(results, wall_time_s))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,82 @@
+import html
 import sys
+import time
 import gradio as gr
+import uvicorn
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from pathlib import Path
 
 # Add the src directory to the Python path
 src_path = Path(__file__).parent
 sys.path.append(str(src_path))
 
-from retrieve import chain, graph_client
-from settings import settings
+from settings import ProjectSettings, settings
+from retrieve import build_chain
+from graph_view import fetch_subgraph, render_html
+from warmup import Warmup
+
+# Example questions for quick access, also pre-run by the warm-up unless `qa_warmup_questions` is set
+EXAMPLE_QUESTIONS = [
+    "Which disease in Thailand affects the most durian varieties?",
+    "Which disease appears in more than two seasons in a year, and which seasons are they?",
+    "Which disease usually appears on durian trees during the rainy season?",
+    "If my tree has yellowing leaves, what disease could it be?",
+    "Which disease appears on the most parts of the durian tree, and which parts are they?",
+    "Bệnh nào ảnh hưởng đến nhiều loại giống cây trồng nhất?",
+]
+
+
+def ui_settings(settings: ProjectSettings) -> ProjectSettings:
+    """Settings the UI's chain is built from: warmed-up questions are only served warm from an LLM response cache."""
+    if settings.qa_warmup and not settings.llm_cache_max_size:
+        return settings.model_copy(update={"llm_cache_max_size": settings.qa_warmup_llm_cache_max_size})
+    return settings
+
+
+def graph_explorer_tab(graph_client):
+    """Instance-level view of a sampled neighbourhood (see `graph_view`), rendered in a sandboxed iframe."""
+    with gr.Row():
+        center_input = gr.Textbox(label="Node id contains", placeholder="e.g., Phytophthora, Leaf, Monthong")
+        label_input = gr.Textbox(label="Label", placeholder="e.g., Disease, Crop_part (optional)")
+        hops_input = gr.Slider(1, 4, value=2, step=1, label="Hops")
+        max_nodes_input = gr.Number(value=20000, precision=0, label="Max nodes")
+        cluster_size_input = gr.Number(value=25, precision=0, label="Collapse groups larger than")
+    render_btn = gr.Button("🕸️ Render Subgraph", variant="primary")
+    view_output = gr.HTML()
+    file_output = gr.File(label="Download HTML")
+
+    def render_subgraph(center, label, hops, max_nodes, cluster_size):
+        try:
+            subgraph = fetch_subgraph(
+                graph_client,
+                center=center.strip() or None,
+                label=label.strip() or None,
+                hops=int(hops),
+                max_nodes=int(max_nodes),
+                cluster_size=int(cluster_size),
+                group_id=settings.kg_group_id,
+            )
+        except Exception as e:
+            return f"<p>❌ Error occurred: {html.escape(str(e))}</p>", None
+
+        page = render_html(subgraph, title=f"Knowledge graph: {center or label or 'hubs'}")
+        out_path = settings.graph_view_dir / f"graph_view_{int(time.time())}.html"
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        out_path.write_text(page, encoding="utf-8")
+        # gr.HTML does not run scripts; the page runs inside an iframe instead
+        frame = (
+            f'<iframe srcdoc="{html.escape(page, quote=True)}" sandbox="allow-scripts" '
+            'style="width: 100%; height: 720px; border: 1px solid #ddd; border-radius: 5px;"></iframe>'
+        )
+        return frame, str(out_path)
+
+    inputs = [center_input, label_input, hops_input, max_nodes_input, cluster_size_input]
+    render_btn.click(fn=render_subgraph, inputs=inputs, outputs=[view_output, file_output])
+    center_input.submit(fn=render_subgraph, inputs=inputs, outputs=[view_output, file_output])
 
 
-def gradio_qa_interface():
+def gradio_qa_interface(chain):
     """Create and return a Gradio interface for Q&A."""
 
     def answer_question(question):
@@ -25,16 +91,6 @@ def gradio_qa_interface():
         except Exception as e:
             return f"❌ Error occurred: {str(e)}\n\nPlease check your database connection and API keys."
 
-    # Example questions for quick access
-    examples = [
-        "Which disease in Thailand affects the most durian varieties?",
-        "Which disease appears in more than two seasons in a year, and which seasons are they?",
-        "Which disease usually appears on durian trees during the rainy season?",
-        "If my tree has yellowing leaves, what disease could it be?",
-        "Which disease appears on the most parts of the durian tree, and which parts are they?",
-        "Bệnh nào ảnh hưởng đến nhiều loại giống cây trồng nhất?",
-    ]
-
     # Create the Gradio interface
     with gr.Blocks(
         title="🌳 Durian Knowledge Graph Q&A",
@@ -71,61 +127,65 @@ def gradio_qa_interface():
             """
             )
 
-        # Main Q&A section
-        with gr.Row():
-            with gr.Column(scale=2):
-                question_input = gr.Textbox(
-                    label="❓ Ask Your Question",
-                    placeholder="e.g., Which disease affects durian leaves during rainy season?",
-                    lines=3,
-                    max_lines=5,
-                )
-
-                submit_btn = gr.Button("🔍 Get Answer", variant="primary", size="lg")
-
-                answer_output = gr.Textbox(label="💡 Answer", lines=8, max_lines=15, interactive=False)
-
-            with gr.Column(scale=1):
-                # Connection status
-                try:
-                    schema = graph_client.schema
-                    status_html = f"""
-                        <div style="background: #d4edda; border: 1px solid #c3e6cb; border-radius: 5px; padding: 1rem; margin-bottom: 1rem;">
-                            <h4>✅ Connected to Neo4j Database</h4>
-                            <p><strong>Database:</strong> {settings.graph_db.graph_db_url}</p>
-                            <p><strong>Model:</strong> {settings.llm.llm_model}</p>
-                            <p><strong>Temperature:</strong> {settings.llm.llm_temperature}</p>
-                        </div>
-                    """
-                except Exception as e:
-                    status_html = f"""
-                        <div style="background: #f8d7da; border: 1px solid #f5c6cb; border-radius: 5px; padding: 1rem; margin-bottom: 1rem;">
-                            <h4>❌ Database Connection Failed</h4>
-                            <p><strong>Error:</strong> {str(e)}</p>
-                        </div>
-                    """
-
-                gr.HTML(status_html)
-
-                # Example questions
-                gr.HTML("<h4>💡 Example Questions</h4>")
-                for i, example in enumerate(examples):
-                    gr.HTML(
-                        f"""
-                        <div style="background: #fff3cd; border: 1px solid #ffeaa7; border-radius: 5px; padding: 0.5rem; margin: 0.5rem 0; cursor: pointer;" 
-                              onclick="document.querySelector('textarea[data-testid=\\'question_input\\']').value = '{example.replace("'", "\\'")}'">
-                            {example}
-                        </div>
-                    """
+        with gr.Tab("💬 Q&A"):
+            # Main Q&A section
+            with gr.Row():
+                with gr.Column(scale=2):
+                    question_input = gr.Textbox(
+                        label="❓ Ask Your Question",
+                        placeholder="e.g., Which disease affects durian leaves during rainy season?",
+                        lines=3,
+                        max_lines=5,
                     )
 
-        # Database schema section
-        with gr.Row():
-            with gr.Accordion("📊 Database Schema", open=False):
-                try:
-                    gr.Code(schema, language="cypher", label="Neo4j Schema")
-                except:
-                    gr.HTML("<p>Unable to load database schema</p>")
+                    submit_btn = gr.Button("🔍 Get Answer", variant="primary", size="lg")
+
+                    answer_output = gr.Textbox(label="💡 Answer", lines=8, max_lines=15, interactive=False)
+
+                with gr.Column(scale=1):
+                    # Connection status
+                    try:
+                        schema = chain.graph.schema
+                        status_html = f"""
+                            <div style="background: #d4edda; border: 1px solid #c3e6cb; border-radius: 5px; padding: 1rem; margin-bottom: 1rem;">
+                                <h4>✅ Connected to Neo4j Database</h4>
+                                <p><strong>Database:</strong> {settings.graph_db.graph_db_url}</p>
+                                <p><strong>Model:</strong> {settings.llm.llm_model}</p>
+                                <p><strong>Temperature:</strong> {settings.llm.llm_temperature}</p>
+                            </div>
+                        """
+                    except Exception as e:
+                        status_html = f"""
+                            <div style="background: #f8d7da; border: 1px solid #f5c6cb; border-radius: 5px; padding: 1rem; margin-bottom: 1rem;">
+                                <h4>❌ Database Connection Failed</h4>
+                                <p><strong>Error:</strong> {str(e)}</p>
+                            </div>
+                        """
+
+                    gr.HTML(status_html)
+
+                    # Example questions
+                    gr.HTML("<h4>💡 Example Questions</h4>")
+                    for i, example in enumerate(EXAMPLE_QUESTIONS):
+                        gr.HTML(
+                            f"""
+                            <div style="background: #fff3cd; border: 1px solid #ffeaa7; border-radius: 5px; padding: 0.5rem; margin: 0.5rem 0; cursor: pointer;" 
+                                  onclick="document.querySelector('textarea[data-testid=\\'question_input\\']').value = '{example.replace("'", "\\'")}'">
+                                {example}
+                            </div>
+                        """
+                        )
+
+            # Database schema section
+            with gr.Row():
+                with gr.Accordion("📊 Database Schema", open=False):
+                    try:
+                        gr.Code(schema, language="cypher", label="Neo4j Schema")
+                    except:
+                        gr.HTML("<p>Unable to load database schema</p>")
+
+        with gr.Tab("🕸️ Graph Explorer"):
+            graph_explorer_tab(chain.graph)
 
         # Footer
         gr.HTML(
@@ -147,8 +207,24 @@ def gradio_qa_interface():
 
 
 def main():
-    interface = gradio_qa_interface()
-    interface.launch(server_name="0.0.0.0", server_port=7860, share=False, show_error=True, quiet=False)
+    chain = build_chain(ui_settings(settings))
+    interface = gradio_qa_interface(chain)
+
+    # The UI is served while the warm-up runs; load balancers and orchestrators gate traffic on /ready
+    warmup = Warmup(chain, chain.graph, settings.qa_warmup_questions or EXAMPLE_QUESTIONS, settings)
+    app = FastAPI()
+
+    @app.get("/ready")
+    def ready():
+        return JSONResponse(warmup.status(), status_code=200 if warmup.ready.is_set() else 503)
+
+    if settings.qa_warmup:
+        warmup.start()
+    else:
+        warmup.ready.set()
+
+    app = gr.mount_gradio_app(app, interface, path="/", show_error=True)
+    uvicorn.run(app, host="0.0.0.0", port=7860)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,351 @@
+# Compact in-memory graph for ingestion. Extracted GraphDocuments hold one pydantic Node /
+# Relationship per mention, repeating label, id and type strings and empty property dicts; the
+# buffer keeps each distinct string once (interned, referenced by integer handle) and nodes and
+# relationships as rows of parallel int arrays, de-duplicated as they are added. Construction
+# converts GraphDocuments into the buffer as rows are extracted, then validates, writes and
+# computes touched nodes from it; GraphDocuments are only rebuilt on request.
+
+import sys
+from array import array
+from collections import defaultdict
+from typing import Iterable, Iterator
+
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+from langchain_core.documents import Document
+
+
+class GraphBuffer:
+    """De-duplicated nodes and relationships as integer-handle tables over an interned string table.
+
+    A node is keyed by (label, id), a relationship by (source label, source id, type,
+    target label, target id); adding an existing key merges its properties. Labels
+    and relationship types are normalized the way they are written to Neo4j.
+    """
+
+    __slots__ = (
+        "_strings",
+        "_handles",
+        "node_label",
+        "node_id",
+        "node_properties",
+        "_node_rows",
+        "rel_source_label",
+        "rel_source_id",
+        "rel_type",
+        "rel_target_label",
+        "rel_target_id",
+        "rel_properties",
+        "_rel_rows",
+    )
+
+    def __init__(self) -> None:
+        self._strings: list[str] = []
+        self._handles: dict[str, int] = {}
+        self.node_label = array("i")
+        self.node_id = array("i")
+        # None for the (common) nodes without properties
+        self.node_properties: list[dict | None] = []
+        self._node_rows: dict[tuple[int, int], int] = {}
+        self.rel_source_label = array("i")
+        self.rel_source_id = array("i")
+        self.rel_type = array("i")
+        self.rel_target_label = array("i")
+        self.rel_target_id = array("i")
+        self.rel_properties: list[dict | None] = []
+        self._rel_rows: dict[tuple[int, int, int, int, int], int] = {}
+
+    @classmethod
+    def from_graph_documents(cls, graph_documents: Iterable[GraphDocument]) -> "GraphBuffer":
+        buffer = cls()
+        for graph_document in graph_documents:
+            buffer.add_graph_document(graph_document)
+        return buffer
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_id)
+
+    @property
+    def n_relationships(self) -> int:
+        return len(self.rel_type)
+
+    def intern(self, value: str) -> int:
+        """Handle of a string, adding it to the table on first use."""
+        handle = self._handles.get(value)
+        if handle is None:
+            handle = len(self._strings)
+            value = sys.intern(value)
+            self._strings.append(value)
+            self._handles[value] = handle
+        return handle
+
+    def string(self, handle: int) -> str:
+        return self._strings[handle]
+
+    def add_node(self, label: str, node_id: str, properties: dict | None = None) -> int:
+        """Row of the (label, id) node, added if new; properties are merged into existing ones."""
+        key = (self.intern(label.replace("`", "")), self.intern(node_id))
+        row = self._node_rows.get(key)
+        if row is None:
+            row = len(self.node_id)
+            self._node_rows[key] = row
+            self.node_label.append(key[0])
+            self.node_id.append(key[1])
+            self.node_properties.append(dict(properties) if properties else None)
+        elif properties:
+            self.node_properties[row] = {**(self.node_properties[row] or {}), **properties}
+        return row
+
+    def add_relationship(
+        self,
+        source_label: str,
+        source_id: str,
+        rel_type: str,
+        target_label: str,
+        target_id: str,
+        properties: dict | None = None,
+    ) -> int:
+        """Row of the relationship, added if new; properties are merged into existing ones."""
+        key = (
+            self.intern(source_label.replace("`", "")),
+            self.intern(source_id),
+            self.intern(rel_type.replace(" ", "_").upper().replace("`", "")),
+            self.intern(target_label.replace("`", "")),
+            self.intern(target_id),
+        )
+        row = self._rel_rows.get(key)
+        if row is None:
+            row = len(self.rel_type)
+            self._rel_rows[key] = row
+            self.rel_source_label.append(key[0])
+            self.rel_source_id.append(key[1])
+            self.rel_type.append(key[2])
+            self.rel_target_label.append(key[3])
+            self.rel_target_id.append(key[4])
+            self.rel_properties.append(dict(properties) if properties else None)
+        elif properties:
+            self.rel_properties[row] = {**(self.rel_properties[row] or {}), **properties}
+        return row
+
+    def add_graph_document(self, graph_document: GraphDocument) -> "GraphBuffer":
+        for node in graph_document.nodes:
+            self.add_node(node.type, node.id, node.properties)
+        for rel in graph_document.relationships:
+            self.add_relationship(
+                rel.source.type, rel.source.id, rel.type, rel.target.type, rel.target.id, rel.properties
+            )
+        return self
+
+    def add_buffer(self, other: "GraphBuffer") -> "GraphBuffer":
+        """Merge another buffer's nodes and relationships into this one."""
+        for label, node_id, properties in other.nodes():
+            self.add_node(label, node_id, properties)
+        for relationship in other.relationships():
+            self.add_relationship(*relationship)
+        return self
+
+    def nodes(self) -> Iterator[tuple[str, str, dict]]:
+        """(label, id, properties) per node."""
+        strings = self._strings
+        for label, node_id, properties in zip(self.node_label, self.node_id, self.node_properties):
+            yield strings[label], strings[node_id], properties or {}
+
+    def relationships(self) -> Iterator[tuple[str, str, str, str, str, dict]]:
+        """(source label, source id, type, target label, target id, properties) per relationship."""
+        strings = self._strings
+        for *key, properties in zip(
+            self.rel_source_label,
+            self.rel_source_id,
+            self.rel_type,
+            self.rel_target_label,
+            self.rel_target_id,
+            self.rel_properties,
+        ):
+            yield (*(strings[handle] for handle in key), properties or {})
+
+    def to_graph_document(self, source: Document) -> GraphDocument:
+        """The whole buffer as one GraphDocument (endpoint nodes are shared with the node list)."""
+        nodes = {
+            (label, node_id): Node(id=node_id, type=label, properties=properties)
+            for label, node_id, properties in self.nodes()
+        }
+
+        def node(label: str, node_id: str) -> Node:
+            return nodes.get((label, node_id)) or Node(id=node_id, type=label)
+
+        relationships = [
+            Relationship(
+                source=node(source_label, source_id),
+                target=node(target_label, target_id),
+                type=rel_type,
+                properties=properties,
+            )
+            for source_label, source_id, rel_type, target_label, target_id, properties in self.relationships()
+        ]
+        return GraphDocument(nodes=list(nodes.values()), relationships=relationships, source=source)
+
+    def validate(self, node_types: list[dict], allowed_relationships: list[tuple]) -> list[str]:
+        """Check the buffer against the schema; return the problems found (empty when valid)."""
+        strings = self._strings
+        allowed_labels = {node_type["label"].lower() for node_type in node_types}
+        allowed_patterns = {(src.lower(), rel.lower(), dst.lower()) for src, rel, dst in allowed_relationships}
+
+        problems = []
+        if not self.n_nodes:
+            problems.append("no nodes extracted")
+        if not self.n_relationships:
+            problems.append("no relationships extracted")
+
+        # Checks run once per distinct label / pattern handle, not per node or relationship
+        node_labels = {strings[handle] for handle in set(self.node_label)}
+        if node_labels and not any(label.lower() == "disease" for label in node_labels):
+            problems.append("no DISEASE node extracted")
+        unknown_labels = {label for label in node_labels if label.lower() not in allowed_labels}
+        if unknown_labels:
+            problems.append(f"unknown node labels: {sorted(unknown_labels)}")
+
+        for source, rel, target in dict.fromkeys(zip(self.rel_source_label, self.rel_type, self.rel_target_label)):
+            pattern = (strings[source], strings[rel], strings[target])
+            if tuple(part.lower() for part in pattern) not in allowed_patterns:
+                problems.append(f"relationship not in schema: {pattern[0]}-[{pattern[1]}]->{pattern[2]}")
+
+        return problems
+
+    def touched_node_ids(self) -> dict[str, set[str]]:
+        """Ids per schema label of every node the buffer writes or links to."""
+        strings = self._strings
+        node_ids = defaultdict(set)
+        for label, node_id in zip(self.node_label, self.node_id):
+            node_ids[strings[label].upper()].add(strings[node_id])
+        for labels, ids in ((self.rel_source_label, self.rel_source_id), (self.rel_target_label, self.rel_target_id)):
+            for label, node_id in zip(labels, ids):
+                node_ids[strings[label].upper()].add(strings[node_id])
+        return dict(node_ids)
+
+    def write_rows(self) -> tuple[dict[str, list[dict]], dict[tuple[str, str, str], list[dict]]]:
+        """UNWIND parameter rows for writing the buffer: node rows per label, relationship rows per pattern."""
+        strings = self._strings
+        node_rows = defaultdict(list)
+        for label, node_id, properties in zip(self.node_label, self.node_id, self.node_properties):
+            node_rows[strings[label]].append({"id": strings[node_id], "properties": properties or {}})
+
+        rel_rows = defaultdict(list)
+        for source_label, source_id, rel_type, target_label, target_id, properties in zip(
+            self.rel_source_label,
+            self.rel_source_id,
+            self.rel_type,
+            self.rel_target_label,
+            self.rel_target_id,
+            self.rel_properties,
+        ):
+            rel_rows[(strings[source_label], strings[rel_type], strings[target_label])].append(
+                {"source": strings[source_id], "target": strings[target_id], "properties": properties or {}}
+            )
+        return dict(node_rows), dict(rel_rows)
+
+
+def _synthetic_graph_document(row: int, rng) -> GraphDocument:
+    """A row graph shaped like the disease sheet's: shared vocabularies, one DISEASE, ~100 relationships."""
+    disease = Node(id=f"Disease {row}", type="Disease")
+    crop = Node(id="Durian", type="Crop")
+    nodes, relationships = [disease, crop], [Relationship(source=crop, target=disease, type="AFFECTED_BY")]
+    for label, rel_type, vocabulary, count, outgoing in [
+        ("Crop_part", "HAS_DISEASE", 12, 4, False),
+        ("Symptom", "HAS_SYMPTOM", 400, 20, None),
+        ("Pathogen", "CAUSED_BY", 60, 2, True),
+        ("Treatment", "MANAGED_BY", 150, 10, True),
+        ("Prevention_method", "PREVENTED_BY", 150, 10, True),
+        ("Spread_method", "SPREADS_VIA", 40, 5, True),
+        ("Risk_factor", "TRIGGERED_BY", 80, 8, True),
+        ("Location", "OCCURS_IN", 14, 5, True),
+        ("Seasonality", "PEAKS_DURING", 7, 3, True),
+        ("Variety", "SUSCEPTIBLE_TO", 14, 6, False),
+    ]:
+        for index in rng.sample(range(vocabulary), count):
+            properties = {"type": "fungus"} if label == "Pathogen" else {}
+            node = Node(id=f"{label.replace('_', ' ')} {index}".title(), type=label, properties=properties)
+            nodes.append(node)
+            if outgoing is None:
+                # Symptoms hang off a crop part of the row
+                part = nodes[2 + rng.randrange(4)]
+                relationships.append(Relationship(source=part, target=node, type=rel_type))
+            elif outgoing:
+                relationships.append(Relationship(source=disease, target=node, type=rel_type))
+            else:
+                relationships.append(Relationship(source=node, target=disease, type=rel_type))
+    return GraphDocument(nodes=nodes, relationships=relationships, source=Document(page_content=f"row {row}"))
+
+
+def _object_pipeline(graph_documents: list[GraphDocument], node_types: list[dict], allowed_relationships: list):
+    """What construction did before the buffer: validate per object, de-duplicate and build write rows per object."""
+    allowed_labels = {node_type["label"].lower() for node_type in node_types}
+    allowed_patterns = {(src.lower(), rel.lower(), dst.lower()) for src, rel, dst in allowed_relationships}
+    problems = 0
+    nodes, relationships = defaultdict(dict), defaultdict(dict)
+    for graph_document in graph_documents:
+        problems += sum(node.type.lower() not in allowed_labels for node in graph_document.nodes)
+        problems += sum(
+            (rel.source.type.lower(), rel.type.lower(), rel.target.type.lower()) not in allowed_patterns
+            for rel in graph_document.relationships
+        )
+        for node in graph_document.nodes:
+            nodes[node.type.replace("`", "")].setdefault(node.id, {}).update(node.properties)
+        for rel in graph_document.relationships:
+            key = (rel.source.type, rel.type.replace(" ", "_").upper(), rel.target.type)
+            relationships[key].setdefault((rel.source.id, rel.target.id), {}).update(rel.properties)
+    return problems, sum(map(len, nodes.values())), sum(map(len, relationships.values()))
+
+
+if __name__ == "__main__":
+    import argparse
+    import gc
+    import random
+    import time
+    import tracemalloc
+
+    from schema.disease_schema import allowed_relationships, node_types
+
+    parser = argparse.ArgumentParser(description="Memory and CPU time of GraphBuffer vs. GraphDocument objects.")
+    parser.add_argument("--rows", type=int, default=2000, help="Synthetic sheet rows (~100 relationships each)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        result = build()
+        elapsed = time.perf_counter() - start
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return result, retained, peak, elapsed
+
+    # Objects: every row's GraphDocument is kept until the write, as construction used to
+    rng = random.Random(args.seed)
+    documents, objects_retained, objects_peak, objects_build_s = measure(
+        lambda: [_synthetic_graph_document(row, rng) for row in range(args.rows)]
+    )
+    start = time.perf_counter()
+    _, objects_nodes, objects_relationships = _object_pipeline(documents, node_types, allowed_relationships)
+    objects_process_s = time.perf_counter() - start
+    del documents
+
+    # Buffer: each row's GraphDocument is converted as it arrives and dropped
+    rng = random.Random(args.seed)
+    buffer, buffer_retained, buffer_peak, buffer_build_s = measure(
+        lambda: GraphBuffer.from_graph_documents(_synthetic_graph_document(row, rng) for row in range(args.rows))
+    )
+    start = time.perf_counter()
+    buffer.validate(node_types, allowed_relationships)
+    buffer.write_rows()
+    buffer_process_s = time.perf_counter() - start
+
+    assert (buffer.n_nodes, buffer.n_relationships) == (objects_nodes, objects_relationships)
+    print(f"{args.rows} rows -> {buffer.n_nodes} nodes, {buffer.n_relationships} relationships")
+    # The buffer de-duplicates while it is built; the objects do so while processed
+    print(f"{'':<12}{'retained MB':>12}{'peak MB':>10}{'build s':>10}{'process s':>12}")
+    for name, retained, peak, build_s, process_s in [
+        ("objects", objects_retained, objects_peak, objects_build_s, objects_process_s),
+        ("buffer", buffer_retained, buffer_peak, buffer_build_s, buffer_process_s),
+    ]:
+        print(f"{name:<12}{retained / 2**20:>12.1f}{peak / 2**20:>10.1f}{build_s:>10.2f}{process_s:>12.3f}")
@@ -0,0 +1,471 @@
+# Instance-level graph visualization (schema/visualize_schema.py draws only the ontology). A subgraph
+# is fetched hop by hop with server-side limits: per node and (relationship, neighbour label) group the
+# database returns a count and the highest-degree neighbours only, and groups larger than `cluster_size`
+# (e.g. all SYMPTOM nodes of one CROP_PART) collapse into one cluster node next to their top members.
+# The result is laid out radially (O(n), no physics) and written as a single static HTML page that
+# draws on a canvas progressively, with level-of-detail for nodes, edges and labels, so 50k+ elements
+# stay responsive in a browser.
+
+import json
+import math
+import time
+from pathlib import Path
+
+from schema.visualize_schema import CATEGORY_COLORS, label_category
+
+_SEED_QUERY = """
+MATCH (n)
+WHERE ($label IS NULL OR $label IN labels(n))
+  AND ($center IS NULL OR toLower(toString(n.id)) CONTAINS toLower($center))
+  AND ($group_id IS NULL OR n.group_id = $group_id)
+RETURN elementId(n) AS key, n.id AS id, labels(n)[0] AS label, coalesce(n.degree, 0) AS degree
+ORDER BY degree DESC
+LIMIT $max_seeds
+"""
+
+# One row per frontier node and (relationship type, direction, neighbour label): the group size and
+# its `cluster_size` highest-degree members, so large neighbourhoods never leave the database
+_EXPAND_QUERY = """
+UNWIND $keys AS key
+MATCH (n) WHERE elementId(n) = key
+MATCH (n)-[r]-(m)
+WHERE $group_id IS NULL OR m.group_id = $group_id
+WITH key, type(r) AS type, startNode(r) = n AS outgoing, labels(m)[0] AS label, m
+ORDER BY coalesce(m.degree, 0) DESC
+WITH key, type, outgoing, label, count(m) AS total,
+     collect({key: elementId(m), id: m.id, degree: coalesce(m.degree, 0)})[..$cluster_size] AS members
+RETURN key, type, outgoing, label, total, members
+"""
+
+
+class Subgraph:
+    """Sampled nodes (with their BFS level and parent, for the layout) and edges of a graph neighbourhood."""
+
+    def __init__(self) -> None:
+        # {"key", "id", "label", "degree", "level", "parent", "cluster"}; `cluster` counts collapsed members
+        self.nodes: list[dict] = []
+        self.edges: list[tuple[int, int, str]] = []
+        self.truncated = False
+        self._positions: dict[str, int] = {}
+        self._edge_keys: set[tuple[int, int, str]] = set()
+
+    def position(self, key: str) -> int | None:
+        return self._positions.get(key)
+
+    def add_node(
+        self, key: str, node_id, label: str, degree: int, level: int, parent: int | None, cluster: int = 0
+    ) -> int:
+        position = self._positions.get(key)
+        if position is None:
+            position = len(self.nodes)
+            self._positions[key] = position
+            self.nodes.append(
+                {
+                    "key": key,
+                    "id": str(node_id),
+                    "label": label,
+                    "degree": degree,
+                    "level": level,
+                    "parent": parent,
+                    "cluster": cluster,
+                }
+            )
+        return position
+
+    def add_edge(self, source: int, target: int, rel_type: str) -> None:
+        if (source, target, rel_type) not in self._edge_keys:
+            self._edge_keys.add((source, target, rel_type))
+            self.edges.append((source, target, rel_type))
+
+
+def fetch_subgraph(
+    graph,
+    center: str | None = None,
+    label: str | None = None,
+    hops: int = 2,
+    max_nodes: int = 50000,
+    cluster_size: int = 25,
+    keep_top: int = 3,
+    max_seeds: int = 20,
+    batch_size: int = 500,
+    group_id: str | None = None,
+) -> Subgraph:
+    """Fetch the neighbourhood of the seed nodes, `hops` deep and at most `max_nodes` nodes.
+
+    Seeds are the highest-degree nodes whose id contains `center` and / or with
+    `label` (the whole graph's hubs when neither is given). Neighbour groups with
+    more than `cluster_size` members keep their `keep_top` highest-degree members
+    and collapse the rest into a cluster node, which is not expanded further.
+    Frontiers are expanded `batch_size` nodes per query, highest degree first.
+    """
+    subgraph = Subgraph()
+    seeds = graph.query(
+        _SEED_QUERY,
+        {"center": center, "label": label, "group_id": group_id, "max_seeds": max_seeds},
+    )
+    frontier = [
+        subgraph.add_node(row["key"], row["id"], row["label"], row["degree"], 0, None) for row in seeds[:max_nodes]
+    ]
+
+    for level in range(1, hops + 1):
+        frontier.sort(key=lambda position: -subgraph.nodes[position]["degree"])
+        next_frontier = []
+        for start in range(0, len(frontier), batch_size):
+            keys = [subgraph.nodes[position]["key"] for position in frontier[start : start + batch_size]]
+            rows = graph.query(_EXPAND_QUERY, {"keys": keys, "group_id": group_id, "cluster_size": cluster_size})
+            for row in rows:
+                parent = subgraph.position(row["key"])
+                members = row["members"] if row["total"] <= cluster_size else row["members"][:keep_top]
+                linked = []
+                for member in members:
+                    position = subgraph.position(member["key"])
+                    if position is None:
+                        if len(subgraph.nodes) >= max_nodes:
+                            subgraph.truncated = True
+                            continue
+                        position = subgraph.add_node(
+                            member["key"], member["id"], row["label"], member["degree"], level, parent
+                        )
+                        next_frontier.append(position)
+                    linked.append(position)
+
+                collapsed = row["total"] - len(members)
+                if collapsed > 0:
+                    if len(subgraph.nodes) < max_nodes:
+                        cluster_key = f"{row['key']}|{row['type']}|{row['outgoing']}|{row['label']}"
+                        linked.append(
+                            subgraph.add_node(
+                                cluster_key,
+                                f"{collapsed} more {row['label']}",
+                                row["label"],
+                                collapsed,
+                                level,
+                                parent,
+                                cluster=collapsed,
+                            )
+                        )
+                    else:
+                        subgraph.truncated = True
+
+                for position in linked:
+                    if row["outgoing"]:
+                        subgraph.add_edge(parent, position, row["type"])
+                    else:
+                        subgraph.add_edge(position, parent, row["type"])
+        frontier = next_frontier
+        if not frontier:
+            break
+
+    return subgraph
+
+
+def radial_layout(subgraph: Subgraph, ring_gap: float = 160.0, spacing: float = 14.0) -> list[tuple[float, float]]:
+    """Place nodes on rings by BFS level, each subtree in an angular wedge proportional to its size.
+
+    A ring is widened until its nodes are at least `spacing` apart, so dense levels
+    do not overlap.
+    """
+    nodes = subgraph.nodes
+    if not nodes:
+        return []
+
+    children = [[] for _ in nodes]
+    roots = []
+    for position, node in enumerate(nodes):
+        (roots if node["parent"] is None else children[node["parent"]]).append(position)
+
+    # Nodes are added in BFS order, so walking backwards sizes every child before its parent
+    weight = [1.0] * len(nodes)
+    for position in range(len(nodes) - 1, -1, -1):
+        if children[position]:
+            weight[position] = sum(weight[child] for child in children[position])
+
+    levels = max(node["level"] for node in nodes) + 1
+    per_level = [0] * levels
+    for node in nodes:
+        per_level[node["level"]] += 1
+    radius = [0.0 if len(roots) == 1 else max(ring_gap / 2, per_level[0] * spacing / (2 * math.pi))]
+    for level in range(1, levels):
+        radius.append(max(radius[-1] + ring_gap, per_level[level] * spacing / (2 * math.pi)))
+
+    coordinates = [(0.0, 0.0)] * len(nodes)
+    total = sum(weight[root] for root in roots)
+    stack, start = [], 0.0
+    for root in roots:
+        span = 2 * math.pi * weight[root] / total
+        stack.append((root, start, span))
+        start += span
+    while stack:
+        position, start, span = stack.pop()
+        angle, r = start + span / 2, radius[nodes[position]["level"]]
+        coordinates[position] = (r * math.cos(angle), r * math.sin(angle))
+        for child in children[position]:
+            child_span = span * weight[child] / weight[position]
+            stack.append((child, start, child_span))
+            start += child_span
+    return coordinates
+
+
+def _label_color(label: str) -> str:
+    return CATEGORY_COLORS.get(label_category(label.upper()), "#FFFFFF")
+
+
+def render_html(subgraph: Subgraph, title: str = "Knowledge graph") -> str:
+    """A self-contained HTML page drawing the subgraph on a canvas (pan, zoom, hover)."""
+    coordinates = radial_layout(subgraph)
+    labels = sorted({node["label"] for node in subgraph.nodes})
+    label_index = {label: index for index, label in enumerate(labels)}
+    types = sorted({rel_type for _, _, rel_type in subgraph.edges})
+    type_index = {rel_type: index for index, rel_type in enumerate(types)}
+
+    data = {
+        "title": title,
+        "truncated": subgraph.truncated,
+        "labels": labels,
+        "colors": [_label_color(label) for label in labels],
+        "types": types,
+        # Column arrays keep the embedded JSON small and the drawing loops flat
+        "x": [round(x, 1) for x, _ in coordinates],
+        "y": [round(y, 1) for _, y in coordinates],
+        "l": [label_index[node["label"]] for node in subgraph.nodes],
+        "d": [node["degree"] for node in subgraph.nodes],
+        "c": [node["cluster"] for node in subgraph.nodes],
+        "t": [node["id"] for node in subgraph.nodes],
+        "e": [position for source, target, _ in subgraph.edges for position in (source, target)],
+        "et": [type_index[rel_type] for _, _, rel_type in subgraph.edges],
+    }
+    # `</` would end the script element early
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+    return _HTML_TEMPLATE.replace("__TITLE__", json.dumps(title)[1:-1]).replace("__DATA__", payload)
+
+
+def write_graph_view(graph, out_html: str | Path, title: str | None = None, **fetch_kwargs) -> Path:
+    """Fetch a subgraph (see `fetch_subgraph`) and write it as a static HTML page."""
+    start = time.perf_counter()
+    subgraph = fetch_subgraph(graph, **fetch_kwargs)
+    fetch_s = time.perf_counter() - start
+
+    out_path = Path(out_html)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(render_html(subgraph, title or "Knowledge graph"), encoding="utf-8")
+    print(
+        f"[graph view] {len(subgraph.nodes)} nodes, {len(subgraph.edges)} edges "
+        f"({sum(node['cluster'] > 0 for node in subgraph.nodes)} clusters"
+        f"{', truncated' if subgraph.truncated else ''}) fetched in {fetch_s:.1f}s -> {out_path}"
+    )
+    return out_path
+
+
+_HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>__TITLE__</title>
+<style>
+  html, body { margin: 0; height: 100%; overflow: hidden; background: #1e1f24;
+               font: 13px Helvetica, Arial, sans-serif; }
+  canvas { display: block; cursor: grab; }
+  #panel { position: absolute; top: 10px; left: 10px; padding: 8px 12px; border-radius: 6px;
+           background: rgba(255, 255, 255, 0.92); max-height: 90%; overflow: auto; }
+  #panel h3 { margin: 0 0 6px; font-size: 14px; }
+  .swatch { display: inline-block; width: 10px; height: 10px; border-radius: 50%; margin-right: 6px; }
+  #tip { position: absolute; pointer-events: none; display: none; padding: 6px 8px; border-radius: 4px;
+         background: rgba(0, 0, 0, 0.85); color: #fff; white-space: nowrap; }
+</style>
+</head>
+<body>
+<canvas id="canvas"></canvas>
+<div id="panel"><h3 id="title"></h3><div id="stats"></div><div id="legend"></div></div>
+<div id="tip"></div>
+<script>
+const D = __DATA__;
+const N = D.x.length, M = D.et.length;
+const canvas = document.getElementById("canvas"), ctx = canvas.getContext("2d");
+const tip = document.getElementById("tip");
+const size = new Float32Array(N);
+for (let i = 0; i < N; i++) size[i] = D.c[i] ? 5 + 3 * Math.log1p(D.c[i]) : 3 + 1.5 * Math.log1p(D.d[i]);
+
+document.getElementById("title").textContent = D.title;
+document.getElementById("stats").textContent =
+  N.toLocaleString() + " nodes, " + M.toLocaleString() + " edges" + (D.truncated ? " (truncated)" : "");
+const counts = new Array(D.labels.length).fill(0);
+for (let i = 0; i < N; i++) counts[D.l[i]]++;
+document.getElementById("legend").innerHTML = D.labels.map((label, i) =>
+  '<div><span class="swatch" style="background:' + D.colors[i] + '"></span>' + label + " (" + counts[i] + ")</div>"
+).join("");
+
+// Spatial hash for hover lookups, built once in world coordinates
+const CELL = 40, grid = new Map();
+for (let i = 0; i < N; i++) {
+  const key = Math.floor(D.x[i] / CELL) + "," + Math.floor(D.y[i] / CELL);
+  if (!grid.has(key)) grid.set(key, []);
+  grid.get(key).push(i);
+}
+
+let dpr = 1, width = 0, height = 0, scale = 1, tx = 0, ty = 0, job = 0, drag = null;
+
+function fit() {
+  let x0 = Infinity, y0 = Infinity, x1 = -Infinity, y1 = -Infinity;
+  for (let i = 0; i < N; i++) {
+    x0 = Math.min(x0, D.x[i]); x1 = Math.max(x1, D.x[i]); y0 = Math.min(y0, D.y[i]); y1 = Math.max(y1, D.y[i]);
+  }
+  if (!N) { x0 = y0 = -1; x1 = y1 = 1; }
+  scale = 0.9 * Math.min(width / Math.max(x1 - x0, 1), height / Math.max(y1 - y0, 1));
+  scale = Math.min(scale, 2);
+  tx = width / 2 - scale * (x0 + x1) / 2;
+  ty = height / 2 - scale * (y0 + y1) / 2;
+}
+
+function resize() {
+  dpr = window.devicePixelRatio || 1;
+  width = window.innerWidth; height = window.innerHeight;
+  canvas.width = width * dpr; canvas.height = height * dpr;
+  canvas.style.width = width + "px"; canvas.style.height = height + "px";
+}
+
+// Progressive drawing: edges, then nodes, then labels, CHUNK elements per animation frame.
+// Any pan / zoom starts a new job, which abandons the previous one.
+const CHUNK = 25000;
+function draw() {
+  const id = ++job;
+  ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+  ctx.fillStyle = "#1e1f24";
+  ctx.fillRect(0, 0, width, height);
+  const pad = 20 / scale;
+  const vx0 = -tx / scale - pad, vy0 = -ty / scale - pad;
+  const vx1 = (width - tx) / scale + pad, vy1 = (height - ty) / scale + pad;
+  const visible = (i) => D.x[i] >= vx0 && D.x[i] <= vx1 && D.y[i] >= vy0 && D.y[i] <= vy1;
+  const world = () => ctx.setTransform(dpr * scale, 0, 0, dpr * scale, dpr * tx, dpr * ty);
+  // While dragging a large graph, skip edges until the drag ends
+  const skipEdges = drag && M > 20000;
+  let i = 0;
+
+  function edges() {
+    if (id !== job) return;
+    world();
+    ctx.strokeStyle = M > 20000 ? "rgba(170, 170, 170, 0.12)" : "rgba(170, 170, 170, 0.35)";
+    ctx.lineWidth = 1 / scale;
+    ctx.beginPath();
+    const end = Math.min(M, i + CHUNK);
+    for (; i < end; i++) {
+      const a = D.e[2 * i], b = D.e[2 * i + 1];
+      if (!visible(a) && !visible(b)) continue;
+      ctx.moveTo(D.x[a], D.y[a]);
+      ctx.lineTo(D.x[b], D.y[b]);
+    }
+    ctx.stroke();
+    if (i < M) requestAnimationFrame(edges); else { i = 0; requestAnimationFrame(nodes); }
+  }
+
+  function nodes() {
+    if (id !== job) return;
+    world();
+    const end = Math.min(N, i + CHUNK);
+    for (; i < end; i++) {
+      if (!visible(i)) continue;
+      ctx.fillStyle = D.colors[D.l[i]];
+      const r = size[i];
+      if (r * scale < 1.5) {
+        // Far zoom: a pixel-sized square is indistinguishable from a circle and much cheaper
+        ctx.fillRect(D.x[i] - 1 / scale, D.y[i] - 1 / scale, 2 / scale, 2 / scale);
+      } else {
+        ctx.beginPath();
+        ctx.arc(D.x[i], D.y[i], r, 0, 2 * Math.PI);
+        ctx.fill();
+        if (D.c[i]) { ctx.strokeStyle = "#ffffff"; ctx.lineWidth = 1.5 / scale; ctx.stroke(); }
+      }
+    }
+    if (i < N) requestAnimationFrame(nodes); else { i = 0; requestAnimationFrame(labels); }
+  }
+
+  function labels() {
+    if (id !== job || drag) return;
+    ctx.setTransform(dpr, 0, 0, dpr, 0, 0);
+    ctx.fillStyle = "#f0f0f0";
+    ctx.font = "11px Helvetica, Arial, sans-serif";
+    let shown = 0;
+    // Only nodes drawn large enough get labels, and at most 400 per frame
+    for (let k = 0; k < N && shown < 400; k++) {
+      if (size[k] * scale < 6 || !visible(k)) continue;
+      ctx.fillText(D.t[k], D.x[k] * scale + tx + size[k] * scale + 2, D.y[k] * scale + ty + 4);
+      shown++;
+    }
+  }
+
+  if (skipEdges) requestAnimationFrame(nodes); else requestAnimationFrame(edges);
+}
+
+function nodeAt(px, py) {
+  const wx = (px - tx) / scale, wy = (py - ty) / scale;
+  const cx = Math.floor(wx / CELL), cy = Math.floor(wy / CELL);
+  let best = -1, bestDistance = Infinity;
+  for (let dx = -1; dx <= 1; dx++) for (let dy = -1; dy <= 1; dy++) {
+    for (const i of grid.get((cx + dx) + "," + (cy + dy)) || []) {
+      const distance = Math.hypot(D.x[i] - wx, D.y[i] - wy);
+      if (distance < Math.max(size[i], 4 / scale) && distance < bestDistance) { best = i; bestDistance = distance; }
+    }
+  }
+  return best;
+}
+
+canvas.addEventListener("wheel", (event) => {
+  event.preventDefault();
+  const factor = Math.exp(-event.deltaY * 0.0015);
+  tx = event.clientX - (event.clientX - tx) * factor;
+  ty = event.clientY - (event.clientY - ty) * factor;
+  scale *= factor;
+  draw();
+}, { passive: false });
+canvas.addEventListener("mousedown", (event) => { drag = { x: event.clientX - tx, y: event.clientY - ty }; });
+window.addEventListener("mouseup", () => { if (drag) { drag = null; draw(); } });
+canvas.addEventListener("mousemove", (event) => {
+  if (drag) { tx = event.clientX - drag.x; ty = event.clientY - drag.y; tip.style.display = "none"; draw(); return; }
+  const i = nodeAt(event.clientX, event.clientY);
+  if (i < 0) { tip.style.display = "none"; return; }
+  tip.textContent = D.labels[D.l[i]] + ": " + D.t[i] + (D.c[i] ? " (collapsed cluster)" : "  degree " + D.d[i]);
+  tip.style.left = event.clientX + 12 + "px";
+  tip.style.top = event.clientY + 12 + "px";
+  tip.style.display = "block";
+});
+window.addEventListener("resize", () => { resize(); draw(); });
+
+resize();
+fit();
+draw();
+</script>
+</body>
+</html>
+"""
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from deps.graph_client import get_graph_client
+    from settings import settings
+
+    parser = argparse.ArgumentParser(description="Render a sampled neighbourhood of the knowledge graph as HTML.")
+    parser.add_argument("--center", help="Seed nodes whose id contains this text (case-insensitive)")
+    parser.add_argument("--label", help="Seed nodes with this label, as stored (e.g. Disease, Crop_part)")
+    parser.add_argument("--hops", type=int, default=2)
+    parser.add_argument("--max-nodes", type=int, default=50000)
+    parser.add_argument("--cluster-size", type=int, default=25, help="Collapse neighbour groups larger than this")
+    parser.add_argument("--keep-top", type=int, default=3, help="Highest-degree members kept next to a cluster")
+    parser.add_argument("--max-seeds", type=int, default=20)
+    parser.add_argument("--out", default="docs/graph_view.html")
+    args = parser.parse_args()
+
+    graph = get_graph_client(settings, refresh_schema=False)
+    write_graph_view(
+        graph,
+        args.out,
+        title=f"Knowledge graph: {args.center or args.label or 'hubs'}",
+        center=args.center,
+        label=args.label,
+        hops=args.hops,
+        max_nodes=args.max_nodes,
+        cluster_size=args.cluster_size,
+        keep_top=args.keep_top,
+        max_seeds=args.max_seeds,
+        group_id=settings.kg_group_id,
+    )
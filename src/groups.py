@@ -0,0 +1,186 @@
+# Group-partitioned graphs: several crops / clients share one Neo4j database. Every node and
+# relationship written for a group carries a `group_id` property, nodes are keyed by (group_id, id)
+# with a composite index per label, clears only delete one group, and generated Cypher is rewritten
+# so its node patterns only match the querying group's partition.
+
+import argparse
+import re
+from pathlib import Path
+from typing import Iterable
+
+from deps.graph_client import AsyncNeo4jGraph, get_graph_client
+from graph_buffer import GraphBuffer
+from materialize import graph_label
+from schema.disease_schema import node_types
+from settings import ProjectSettings, settings
+
+GROUP_PROPERTY = "group_id"
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+# `(var:Label ...)`, `(:Label:Other {...})`, `(var)`, `()`: a node pattern, or a parenthesized variable
+# (function calls such as `count(n)` are excluded by the lookbehind)
+_NODE = re.compile(r"(?<![\w.`])\(\s*(\w*)\s*((?::\s*(?:`[^`]+`|\w+)\s*)*)(\{[^{}]*\})?\s*\)")
+# An unlabelled node is a pattern when it touches a relationship, or starts a pattern of a MATCH /
+# MERGE / CREATE clause (after the keyword, a comma or a path variable)
+_RELATIONSHIP_BEFORE = re.compile(r"(?:->|--|\]-)\s*$")
+_RELATIONSHIP_AFTER = re.compile(r"^\s*(?:<-|-[-\[>])")
+_PATTERN_START = re.compile(r"(?:\b(?:MATCH|MERGE|CREATE)|[,=])\s*$", re.IGNORECASE)
+_CLAUSE = re.compile(r"\b(MATCH|MERGE|CREATE|WHERE|WITH|RETURN|UNWIND|SET|DELETE|REMOVE|ORDER|CALL|YIELD)\b", re.I)
+
+
+def check_group_id(group_id: str, settings: ProjectSettings = settings) -> str:
+    """Reject groups outside `available_kg_group_ids` (any group is allowed while that list is empty)."""
+    if settings.available_kg_group_ids and group_id not in settings.available_kg_group_ids:
+        raise ValueError(
+            f"Unknown knowledge graph group: {group_id!r}. Expected one of {settings.available_kg_group_ids}."
+        )
+    return group_id
+
+
+def group_path(path: Path, group_id: str | None) -> Path:
+    """Per-group location of a local index file or directory (the path itself without a group)."""
+    if group_id is None:
+        return path
+    return path.with_name(f"{path.stem}_{group_id}{path.suffix}")
+
+
+def graph_cli(description: str, settings: ProjectSettings = settings) -> tuple[AsyncNeo4jGraph, str | None]:
+    """Graph client and `--group` (default `kg_group_id`) of a script run standalone against the graph."""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--group", default=settings.kg_group_id, help="Group to work on (default: kg_group_id)")
+    args = parser.parse_args()
+    if args.group is not None:
+        check_group_id(args.group, settings)
+    return get_graph_client(settings), args.group
+
+
+def create_group_indexes(graph, labels: Iterable[str] | None = None) -> None:
+    """Create a composite (group_id, id) index per label, schema labels by default (no-op for existing ones)."""
+    labels = labels or [graph_label(node_type["label"]) for node_type in node_types]
+    for label in labels:
+        graph.query(
+            f"CREATE INDEX {label.lower()}_{GROUP_PROPERTY}_id IF NOT EXISTS "
+            f"FOR (n:`{label}`) ON (n.`{GROUP_PROPERTY}`, n.id)"
+        )
+
+
+def group_write_statements(
+    graph_documents, group_id: str | None, batch_size: int = 1000
+) -> tuple[list[tuple[str, dict]], int, int]:
+    """UNWIND statements merging graph documents into a group's partition, and the node / relationship counts.
+
+    `graph_documents` is a list of GraphDocuments or a `GraphBuffer`. One statement
+    per label or relationship pattern and batch. Like `Neo4jGraph.add_graph_documents`
+    (without APOC), but nodes are merged on (group_id, id) so groups sharing a node
+    id keep separate nodes; without a `group_id`, on id and untagged.
+    """
+    buffer = graph_documents
+    if not isinstance(buffer, GraphBuffer):
+        buffer = GraphBuffer.from_graph_documents(graph_documents)
+    node_rows, rel_rows = buffer.write_rows()
+    group = f", {GROUP_PROPERTY}: $group_id" if group_id is not None else ""
+    rel_group = f" {{{GROUP_PROPERTY}: $group_id}}" if group_id is not None else ""
+
+    statements = []
+    for label, rows in node_rows.items():
+        query = f"UNWIND $rows AS row MERGE (n:`{label}` {{id: row.id{group}}}) SET n += row.properties"
+        for start in range(0, len(rows), batch_size):
+            statements.append((query, {"rows": rows[start : start + batch_size], "group_id": group_id}))
+
+    for (source_label, rel_type, target_label), rows in rel_rows.items():
+        query = (
+            f"UNWIND $rows AS row "
+            f"MERGE (s:`{source_label}` {{id: row.source{group}}}) "
+            f"MERGE (t:`{target_label}` {{id: row.target{group}}}) "
+            f"MERGE (s)-[r:`{rel_type}`{rel_group}]->(t) "
+            f"SET r += row.properties"
+        )
+        for start in range(0, len(rows), batch_size):
+            statements.append((query, {"rows": rows[start : start + batch_size], "group_id": group_id}))
+
+    return statements, buffer.n_nodes, buffer.n_relationships
+
+
+def add_group_graph_documents(graph, graph_documents, group_id: str, batch_size: int = 1000) -> tuple[int, int]:
+    """Merge graph documents into a group's partition; returns the number of nodes and relationships written."""
+    statements, n_nodes, n_relationships = group_write_statements(graph_documents, group_id, batch_size)
+    for query, params in statements:
+        graph.query(query, params)
+    return n_nodes, n_relationships
+
+
+async def aadd_group_graph_documents(
+    graph, graph_documents, group_id: str, batch_size: int = 1000
+) -> tuple[int, int]:
+    """`add_group_graph_documents` in one write transaction on an `AsyncNeo4jGraph`."""
+    statements, n_nodes, n_relationships = group_write_statements(graph_documents, group_id, batch_size)
+    await graph.aexecute_write(statements)
+    return n_nodes, n_relationships
+
+
+def clear_group(graph, group_id: str | None, batch_size: int = 10000) -> int:
+    """Delete a group's nodes (and their relationships) in batches, label by label; returns the nodes deleted.
+
+    Without a `group_id`, only untagged nodes (labelled or not) are deleted, so the groups sharing the
+    database are kept.
+    """
+    if group_id is None:
+        return _delete_in_batches(graph, f"MATCH (n) WHERE n.`{GROUP_PROPERTY}` IS NULL", {}, batch_size)
+
+    deleted = 0
+    for row in graph.query("CALL db.labels() YIELD label RETURN label"):
+        deleted += _delete_in_batches(
+            graph,
+            f"MATCH (n:`{row['label']}`) WHERE n.`{GROUP_PROPERTY}` = $group_id",
+            {"group_id": group_id},
+            batch_size,
+        )
+    return deleted
+
+
+def _delete_in_batches(graph, match: str, params: dict, batch_size: int) -> int:
+    deleted = 0
+    while True:
+        rows = graph.query(
+            f"{match} WITH n LIMIT $batch_size DETACH DELETE n RETURN count(*) AS deleted",
+            {**params, "batch_size": batch_size},
+        )
+        n_deleted = rows[0]["deleted"] if rows else 0
+        deleted += n_deleted
+        if n_deleted < batch_size:
+            return deleted
+
+
+def _in_pattern(match: re.Match) -> bool:
+    before, after = match.string[: match.start()], match.string[match.end() :]
+    if _RELATIONSHIP_BEFORE.search(before) or _RELATIONSHIP_AFTER.match(after):
+        return True
+    clauses = _CLAUSE.findall(before)
+    return bool(_PATTERN_START.search(before)) and bool(clauses) and clauses[-1].upper() in ("MATCH", "MERGE", "CREATE")
+
+
+def _scope_node(match: re.Match) -> str:
+    variable, labels, properties = match.group(1), match.group(2).rstrip(), match.group(3)
+    if not labels and properties is None and not _in_pattern(match):
+        # A parenthesized expression, e.g. `RETURN (n)`, not a node pattern
+        return match.group(0)
+    if properties is None:
+        properties = f"{{{GROUP_PROPERTY}: ${GROUP_PROPERTY}}}"
+    elif GROUP_PROPERTY not in properties:
+        body = properties[1:-1].strip()
+        properties = f"{{{body + ', ' if body else ''}{GROUP_PROPERTY}: ${GROUP_PROPERTY}}}"
+    return f"({variable}{labels} {properties})" if variable or labels else f"({properties})"
+
+
+def scope_query(query: str) -> str:
+    """Restrict a Cypher query to the `$group_id` partition.
+
+    Every node pattern, labelled or not and including anonymous `()` nodes, gets a
+    `group_id` property filter, so no node of a pattern (in MATCH clauses or pattern
+    predicates) can bind outside the group. String literals are left untouched.
+    """
+    literals = _STRING_LITERAL.findall(query)
+    masked = _STRING_LITERAL.sub("\x00", query)
+    masked = _NODE.sub(_scope_node, masked)
+    parts = masked.split("\x00")
+    return "".join(part + literal for part, literal in zip(parts, literals + [""]))
@@ -0,0 +1,213 @@
+# Dry-run plan of a knowledge graph construction (`python src/construct.py --plan`). It lists the
+# extraction calls a run would send, with prompt tokens counted by the local tokenizer, and which of
+# them the LLM cassette already holds. From those it projects cost, wall time under
+# `extraction_concurrency` and the provider rate limits, and the graph write batches. Nothing is sent
+# to the LLM provider or the graph database.
+
+import math
+from collections import Counter
+from dataclasses import dataclass, field
+
+from deps.llm_client import estimate_cost
+from langchain_community.graphs.graph_document import GraphDocument
+
+from graph_buffer import GraphBuffer
+from settings import ProjectSettings, settings
+
+
+@dataclass
+class PlannedCall:
+    """One extraction request: a row, or one part of a row split to fit the extraction budget."""
+
+    row: int
+    model: str
+    prompt_tokens: int
+    # Replayed from the LLM cassette, with the completion tokens it recorded
+    cached: bool = False
+    completion_tokens: int = 0
+    # Nodes per label and relationships per pattern of the replayed response, before de-duplication across calls
+    node_counts: Counter = field(default_factory=Counter)
+    rel_counts: Counter = field(default_factory=Counter)
+
+
+@dataclass
+class IngestionPlan:
+    """The calls of a planned run and the projections derived from them."""
+
+    n_rows: int
+    calls: list[PlannedCall]
+    # Rows identical to the last cached load of the sheet (see `utils.diff_excel_rows`)
+    unchanged_rows: set[int] = field(default_factory=set)
+    # Graph extracted by the column rules, and by the calls replayed from the cassette
+    rule_buffer: GraphBuffer = field(default_factory=GraphBuffer)
+    cached_buffer: GraphBuffer = field(default_factory=GraphBuffer)
+    # Mean recorded latency per model in the cassette
+    recorded_latency_s: dict[str, float] = field(default_factory=dict)
+    settings: ProjectSettings = field(default_factory=lambda: settings)
+
+    def add_replayed(self, call: PlannedCall, graph_document: GraphDocument) -> None:
+        """Mark a call as served from the cassette and record the graph its response produced."""
+        call.cached = True
+        call.node_counts, call.rel_counts = _write_counts(GraphBuffer().add_graph_document(graph_document))
+        self.cached_buffer.add_graph_document(graph_document)
+
+    @property
+    def sent_calls(self) -> list[PlannedCall]:
+        return [call for call in self.calls if not call.cached]
+
+    @property
+    def cached_rows(self) -> set[int]:
+        """Rows whose every call is served from the cassette."""
+        rows = {call.row for call in self.calls}
+        return rows - {call.row for call in self.sent_calls}
+
+    def completion_tokens_per_call(self) -> float:
+        """Mean completion tokens of the replayed calls, or `plan_completion_tokens_per_call` without any."""
+        recorded = [call.completion_tokens for call in self.calls if call.cached and call.completion_tokens]
+        if not recorded:
+            return self.settings.plan_completion_tokens_per_call
+        return sum(recorded) / len(recorded)
+
+    def call_latency_s(self) -> float:
+        """Mean latency of the calls to send, from the cassette's recordings of their models where available."""
+        sent = self.sent_calls
+        if not sent:
+            return 0.0
+        default = self.settings.plan_call_latency_s
+        return sum(self.recorded_latency_s.get(call.model, default) for call in sent) / len(sent)
+
+    def sent_tokens(self) -> int:
+        """Prompt and projected completion tokens of the calls to send."""
+        sent = self.sent_calls
+        return sum(call.prompt_tokens for call in sent) + round(len(sent) * self.completion_tokens_per_call())
+
+    def cost(self) -> float:
+        completion_tokens = round(self.completion_tokens_per_call())
+        return sum(
+            estimate_cost(self.settings, call.model, call.prompt_tokens, completion_tokens) for call in self.sent_calls
+        )
+
+    def wall_time_bounds(self) -> dict[str, float]:
+        """Projected extraction seconds under each constraint; the run takes at least the largest.
+
+        Concurrency sends the calls in waves of `extraction_concurrency` (all at once when 0);
+        rate limits allow `llm_requests_per_minute` calls and `llm_tokens_per_minute` tokens.
+        """
+        n_sent = len(self.sent_calls)
+        if not n_sent:
+            return {"concurrency": 0.0}
+
+        concurrency = self.settings.extraction_concurrency or n_sent
+        bounds = {"concurrency": math.ceil(n_sent / concurrency) * self.call_latency_s()}
+        if self.settings.llm.llm_requests_per_minute:
+            bounds["requests_per_minute"] = 60 * n_sent / self.settings.llm.llm_requests_per_minute
+        if self.settings.llm.llm_tokens_per_minute:
+            bounds["tokens_per_minute"] = 60 * self.sent_tokens() / self.settings.llm.llm_tokens_per_minute
+        return bounds
+
+    def max_concurrency(self) -> int | None:
+        """Calls in flight the rate limits sustain at the projected latency (None: no limit configured)."""
+        sent = self.sent_calls
+        if not sent:
+            return None
+        per_second = []
+        if self.settings.llm.llm_requests_per_minute:
+            per_second.append(self.settings.llm.llm_requests_per_minute / 60)
+        if self.settings.llm.llm_tokens_per_minute:
+            per_second.append(self.settings.llm.llm_tokens_per_minute / 60 / (self.sent_tokens() / len(sent)))
+        if not per_second:
+            return None
+        return max(math.floor(min(per_second) * self.call_latency_s()), 1)
+
+    def write_batches(self, batch_size: int = 1000) -> tuple[int, int, int] | None:
+        """Projected write statements, nodes and relationships (see `groups.group_write_statements`).
+
+        The rule output and the replayed calls' output are merged and counted exactly. Each call
+        still to be sent adds the mean per-call output of the replayed calls, per label and
+        relationship pattern, as if none of it were already in the graph (so an upper bound).
+        None when calls remain to be sent and none were replayed to extrapolate from.
+        """
+        sent = self.sent_calls
+        replayed = [call for call in self.calls if call.cached]
+        if sent and not replayed:
+            return None
+
+        known = GraphBuffer()
+        for buffer in (self.rule_buffer, self.cached_buffer):
+            known.add_buffer(buffer)
+        node_counts, rel_counts = _write_counts(known)
+        scale = len(sent) / len(replayed) if replayed else 0.0
+        for call in replayed:
+            for label, n in call.node_counts.items():
+                node_counts[label] += n * scale
+            for pattern, n in call.rel_counts.items():
+                rel_counts[pattern] += n * scale
+
+        statements = sum(math.ceil(n / batch_size) for n in (*node_counts.values(), *rel_counts.values()))
+        return statements, round(sum(node_counts.values())), round(sum(rel_counts.values()))
+
+    def print_report(self, per_row: bool = True) -> None:
+        if per_row:
+            tokens, n_calls = Counter(), Counter()
+            for call in self.calls:
+                tokens[call.row] += call.prompt_tokens
+                n_calls[call.row] += 1
+            cached_rows = self.cached_rows
+            for row in range(self.n_rows):
+                flags = [
+                    flag
+                    for flag, on in (("cached", row in cached_rows), ("unchanged", row in self.unchanged_rows))
+                    if on
+                ]
+                print(
+                    f"[plan] row #{row + 1}: {n_calls[row]} call(s), {tokens[row]} prompt tokens"
+                    + (f" ({', '.join(flags)})" if flags else "")
+                )
+
+        sent = self.sent_calls
+        print(
+            f"[plan] {self.n_rows} rows, {len(self.calls)} extraction calls, "
+            f"{sum(call.prompt_tokens for call in self.calls)} prompt tokens"
+        )
+        print(
+            f"[plan] {len(self.cached_rows)} rows served from the LLM cassette, "
+            f"{len(self.unchanged_rows)} unchanged since the last load of the sheet"
+        )
+        print(
+            f"[plan] {len(sent)} calls to send: {sum(call.prompt_tokens for call in sent)} prompt tokens, "
+            f"~{round(len(sent) * self.completion_tokens_per_call())} completion tokens, ~${self.cost():.4f}"
+        )
+
+        bounds = self.wall_time_bounds()
+        bottleneck = max(bounds, key=bounds.get)
+        print(
+            f"[plan] projected extraction time: {bounds[bottleneck] / 60:.1f} min, bound by {bottleneck} "
+            f"(~{self.call_latency_s():.1f}s per call, "
+            f"concurrency {self.settings.extraction_concurrency or 'unbounded'})"
+        )
+        max_concurrency = self.max_concurrency()
+        concurrency = self.settings.extraction_concurrency or len(sent)
+        if max_concurrency is not None and concurrency > max_concurrency:
+            print(
+                f"[plan] {concurrency} calls in flight exceed the rate limits; "
+                f"set extraction_concurrency to {max_concurrency} or raise the quotas"
+            )
+
+        batches = self.write_batches()
+        if batches is None:
+            print(
+                f"[plan] graph write: rule output only is known ({self.rule_buffer.n_nodes} nodes, "
+                f"{self.rule_buffer.n_relationships} relations); record some rows to project the LLM's"
+            )
+        else:
+            statements, n_nodes, n_relations = batches
+            print(f"[plan] graph write: ~{n_nodes} nodes, ~{n_relations} relations in {statements} batches")
+
+
+def _write_counts(buffer: GraphBuffer) -> tuple[Counter, Counter]:
+    """Write rows of a buffer per node label and per relationship pattern."""
+    node_rows, rel_rows = buffer.write_rows()
+    return (
+        Counter({label: len(rows) for label, rows in node_rows.items()}),
+        Counter({pattern: len(rows) for pattern, rows in rel_rows.items()}),
+    )
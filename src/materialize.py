@@ -0,0 +1,123 @@
+# Materialized degree counts: after ingestion every node gets one `n_<neighbours>` property per
+# relationship / neighbour label in the schema (e.g. `n_varieties` on DISEASE) plus a total `degree`,
+# all indexed, so ranking questions become index lookups instead of relationship counts per request.
+
+from collections import defaultdict
+
+from graph_buffer import GraphBuffer
+from schema.disease_schema import allowed_relationships
+
+
+def graph_label(label: str) -> str:
+    """Label as written to Neo4j (`LLMGraphTransformer` capitalizes node types, e.g. CROP_PART -> Crop_part)."""
+    return label.capitalize()
+
+
+def _plural(label: str) -> str:
+    name = label.lower()
+    if name.endswith("y") and name[-2:-1] not in "aeiou":
+        return name[:-1] + "ies"
+    if name.endswith("s"):
+        return name + "es"
+    return name + "s"
+
+
+def degree_properties(allowed_relationships: list[tuple] = allowed_relationships) -> list[dict]:
+    """One materialized count per (label, relationship, direction, neighbour label) in the schema."""
+    properties = []
+    for source, rel, target in allowed_relationships:
+        properties.append({"label": source, "relationship": rel, "direction": "out", "neighbour": target})
+        properties.append({"label": target, "relationship": rel, "direction": "in", "neighbour": source})
+
+    # Name each count after the neighbour; add the relationship when a neighbour label is reached two ways
+    seen = defaultdict(int)
+    for prop in properties:
+        seen[(prop["label"], prop["neighbour"])] += 1
+    for prop in properties:
+        name = f"n_{_plural(prop['neighbour'])}"
+        if seen[(prop["label"], prop["neighbour"])] > 1:
+            name += f"_{prop['relationship'].lower()}"
+        if prop["direction"] == "out":
+            pattern = f"(:{graph_label(prop['label'])})-[:{prop['relationship']}]->(:{graph_label(prop['neighbour'])})"
+        else:
+            pattern = f"(:{graph_label(prop['neighbour'])})-[:{prop['relationship']}]->(:{graph_label(prop['label'])})"
+        prop["property"] = name
+        prop["description"] = f"number of {graph_label(prop['neighbour'])} nodes linked by {pattern}"
+    return properties
+
+
+MATERIALIZED_PROPERTIES = degree_properties()
+
+
+def _properties_by_label() -> dict[str, list[dict]]:
+    by_label = defaultdict(list)
+    for prop in MATERIALIZED_PROPERTIES:
+        by_label[prop["label"]].append(prop)
+    return by_label
+
+
+def create_materialized_indexes(graph) -> None:
+    """Create a range index on every materialized property (no-op for existing ones)."""
+    for label, props in _properties_by_label().items():
+        for name in [prop["property"] for prop in props] + ["degree"]:
+            graph.query(
+                f"CREATE INDEX {label.lower()}_{name} IF NOT EXISTS "
+                f"FOR (n:`{graph_label(label)}`) ON (n.`{name}`)"
+            )
+
+
+def materialize_degree_properties(
+    graph, node_ids: dict[str, set[str]] | None = None, group_id: str | None = None
+) -> int:
+    """Recompute the materialized counts; only for `node_ids` (label -> ids) when given, else for all nodes.
+
+    With a `group_id`, only nodes of that group are updated.
+
+    Returns the number of nodes updated.
+    """
+    updated = 0
+    for label, props in _properties_by_label().items():
+        if node_ids is not None and not node_ids.get(label):
+            continue
+
+        assignments = [
+            f"n.`{prop['property']}` = size([(n){'-' if prop['direction'] == 'out' else '<-'}"
+            f"[:`{prop['relationship']}`]{'->' if prop['direction'] == 'out' else '-'}"
+            f"(:`{graph_label(prop['neighbour'])}`) | 1])"
+            for prop in props
+        ]
+        assignments.append("n.degree = size([(n)--() | 1])")
+        rows = graph.query(
+            f"MATCH (n:`{graph_label(label)}`) "
+            "WHERE ($ids IS NULL OR n.id IN $ids) AND ($group_id IS NULL OR n.group_id = $group_id) "
+            f"SET {', '.join(assignments)} "
+            "RETURN count(n) AS updated",
+            {"ids": None if node_ids is None else sorted(node_ids[label]), "group_id": group_id},
+        )
+        updated += rows[0]["updated"] if rows else 0
+    return updated
+
+
+def touched_node_ids(graph_documents) -> dict[str, set[str]]:
+    """Ids per schema label of every node a batch of graph documents (or a `GraphBuffer`) writes or links to."""
+    if not isinstance(graph_documents, GraphBuffer):
+        graph_documents = GraphBuffer.from_graph_documents(graph_documents)
+    return graph_documents.touched_node_ids()
+
+
+def materialized_properties_prompt() -> str:
+    """Describe the materialized properties for the Cypher generation prompt."""
+    lines = [
+        f"- {graph_label(prop['label'])}.{prop['property']}: {prop['description']}" for prop in MATERIALIZED_PROPERTIES
+    ]
+    lines.append("- <any node>.degree: total number of relationships of the node")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    from groups import graph_cli
+
+    graph_client, group_id = graph_cli("Materialize degree properties on the knowledge graph.")
+    create_materialized_indexes(graph_client)
+    n_updated = materialize_degree_properties(graph_client, group_id=group_id)
+    print(f"Materialized degree properties on {n_updated} nodes.")
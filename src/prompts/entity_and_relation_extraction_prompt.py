@@ -7,6 +7,9 @@ You are an expert at extracting structured knowledge from agricultural disease d
 ## KNOWLEDGE GRAPH SCHEMA
 {graph_schema}
 
+## KNOWN ENTITIES:
+{known_entities}
+
 ## DOCUMENT TO PROCESS:
 {document}
 
@@ -28,6 +31,7 @@ Return a structured knowledge graph with:
 entities_and_relationships_extraction_prompt = PromptTemplate(
     template=entities_and_relationships_extraction_template,
     input_variables=["graph_schema", "category", "document"],
+    partial_variables={"known_entities": "None"},
 )
 
 
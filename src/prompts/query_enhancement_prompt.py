@@ -11,6 +11,16 @@ Do not use other relationship types or properties that are not provided.
 ## GRAPH SCHEMA:
 {schema}
 
+## PRECOMPUTED PROPERTIES:
+The following node properties hold precomputed relationship counts. For "most" / "fewest" / ranking
+questions, order by these properties instead of counting relationships.
+{precomputed_properties}
+
+## LINKED ENTITIES:
+Graph nodes matched to terms in the question. Refer to them through the given query parameter
+(e.g. `{{id: $e0}}`) instead of writing their ids literally.
+{linked_entities}
+
 ## NOTE:
 - Do not include explanations or apologies in your answers.
 - Do not answer questions that ask anything other than creating Cypher statements.
@@ -22,6 +32,7 @@ Do not use other relationship types or properties that are not provided.
 query_enhancement_prompt = PromptTemplate(
     template=query_enhancement_template,
     input_variables=["schema", "question"],
+    partial_variables={"precomputed_properties": "None", "linked_entities": "None"},
 )
 
 
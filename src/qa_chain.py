@@ -0,0 +1,467 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional, Union
+
+from langchain_core.callbacks import AsyncCallbackManagerForChainRun, CallbackManagerForChainRun
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.runnables import Runnable
+from langchain_neo4j import GraphCypherQAChain
+from langchain_neo4j.chains.graph_qa.cypher import INTERMEDIATE_STEPS_KEY, extract_cypher, get_function_response
+
+from deps.graph_client import aquery_rows, query_rows
+from deps.llm_client import ModelRouter
+from context_shaping import shape_context
+from diagnosis import DiagnosisIndex
+from entity_linker import EntityLinker, linked_entities_prompt
+from groups import GROUP_PROPERTY, scope_query
+from query_profiler import QueryProfiler
+from text_index import TextIndex
+from deps.token_accounting import TokenLedger, truncate_to_tokens
+
+
+@contextmanager
+def _timed(timings: Dict[str, float], stage: str):
+    """Add the wall time of the block to `timings[stage]`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+
+class KnowledgeGraphQAChain(GraphCypherQAChain):
+    """GraphCypherQAChain that drafts Cypher and answers with the small model.
+
+    Cypher is escalated to `llm_model` when the small model's query fails
+    validation, fails to execute or returns no rows. Questions asking which
+    disease explains the symptoms they name are answered from `diagnosis_index`
+    when given, without generating Cypher.
+    With an `entity_linker`, question terms resolved to node ids are passed to
+    the Cypher prompt and to the query as parameters. When the Cypher of every
+    route returns no rows, a `text_index` (BM25 over node text) supplies the
+    context instead. Cypher results are compressed
+    (`compress_context`) before answering: nodes deduplicated, paths collapsed
+    into adjacency lines, long texts dropped unless asked for, rows capped to the
+    `answer` token budget. A `profiler` samples generated queries with PROFILE.
+    With a `group_id`, every generated query is scoped to that group's partition.
+    `ainvoke` is natively async: the LLM stages are awaited and Cypher runs on the
+    graph's async driver (`aquery`, routed to a reader).
+    """
+
+    router: Optional[ModelRouter] = None
+    escalation_cypher_generation_chain: Optional[Runnable[Dict[str, Any], str]] = None
+    ledger: Optional[TokenLedger] = None
+    diagnosis_index: Optional[DiagnosisIndex] = None
+    entity_linker: Optional[EntityLinker] = None
+    text_index: Optional[TextIndex] = None
+    text_top_k: int = 3
+    compress_context: bool = True
+    context_max_tokens: Optional[int] = None
+    profiler: Optional[QueryProfiler] = None
+    group_id: Optional[str] = None
+
+    @classmethod
+    def from_router(
+        cls,
+        router: ModelRouter,
+        *,
+        cypher_prompt: BasePromptTemplate,
+        **kwargs: Any,
+    ) -> "KnowledgeGraphQAChain":
+        """Build the chain with the router's small model for Cypher and answers, and its large model as fallback."""
+        return cls.from_llm(
+            cypher_llm=router.small_llm,
+            qa_llm=router.small_llm,
+            cypher_prompt=cypher_prompt,
+            router=router,
+            escalation_cypher_generation_chain=cypher_prompt | router.large_llm | StrOutputParser(),
+            **kwargs,
+        )
+
+    def _cypher_generation_chains(self) -> list[tuple[Optional[str], Runnable]]:
+        if self.router is None or self.escalation_cypher_generation_chain is None:
+            return [(None, self.cypher_generation_chain)]
+        chains = {
+            ModelRouter.SMALL: self.cypher_generation_chain,
+            ModelRouter.LARGE: self.escalation_cypher_generation_chain,
+        }
+        return [(route, chains[route]) for route in self.router.routes()]
+
+    def _cypher_prompt(self, cypher_chain: Runnable, args: Dict[str, Any]) -> tuple[Dict[str, Any], str]:
+        """Cypher prompt inputs (schema truncated to the `cypher` budget) and the rendered prompt for tracking."""
+        prompt_text = ""
+        if self.ledger is not None:
+            prompt_text = self._render_prompt(cypher_chain, args)
+            if self.ledger.over_budget("cypher", prompt_text):
+                args, prompt_text = self._fit_schema(cypher_chain, args, prompt_text)
+        return args, prompt_text
+
+    def _parse_cypher(self, generated_cypher: str) -> str:
+        # Extract Cypher code if it is wrapped in backticks
+        generated_cypher = extract_cypher(generated_cypher)
+
+        # Correct Cypher query if enabled
+        if self.cypher_query_corrector:
+            generated_cypher = self.cypher_query_corrector(generated_cypher)
+        return generated_cypher
+
+    def _generate_cypher(
+        self,
+        cypher_chain: Runnable,
+        args: Dict[str, Any],
+        callbacks,
+        run_manager: CallbackManagerForChainRun,
+    ) -> str:
+        args, prompt_text = self._cypher_prompt(cypher_chain, args)
+        with self._track("cypher", prompt_text):
+            generated_cypher = cypher_chain.invoke(args, callbacks=callbacks)
+        generated_cypher = self._parse_cypher(generated_cypher)
+
+        run_manager.on_text("Generated Cypher:", end="\n", verbose=self.verbose)
+        run_manager.on_text(generated_cypher, color="green", end="\n", verbose=self.verbose)
+
+        return generated_cypher
+
+    async def _agenerate_cypher(
+        self,
+        cypher_chain: Runnable,
+        args: Dict[str, Any],
+        callbacks,
+        run_manager: AsyncCallbackManagerForChainRun,
+    ) -> str:
+        args, prompt_text = self._cypher_prompt(cypher_chain, args)
+        with self._track("cypher", prompt_text):
+            generated_cypher = await cypher_chain.ainvoke(args, callbacks=callbacks)
+        generated_cypher = self._parse_cypher(generated_cypher)
+
+        await run_manager.on_text("Generated Cypher:", end="\n", verbose=self.verbose)
+        await run_manager.on_text(generated_cypher, color="green", end="\n", verbose=self.verbose)
+
+        return generated_cypher
+
+    def _scope(self, generated_cypher: str, params: Optional[Dict[str, Any]]) -> tuple[str, Optional[Dict[str, Any]]]:
+        if self.group_id is not None:
+            generated_cypher = scope_query(generated_cypher)
+            params = {**(params or {}), GROUP_PROPERTY: self.group_id}
+        return generated_cypher, params
+
+    def _query_graph(self, generated_cypher: str, params: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        # Generated Cypher be null if query corrector identifies invalid schema
+        if not generated_cypher:
+            return []
+        generated_cypher, params = self._scope(generated_cypher, params)
+        if self.profiler is not None:
+            return self.profiler.query(generated_cypher, params)[: self.top_k]
+        return query_rows(self.graph, generated_cypher, params)[: self.top_k]
+
+    async def _aquery_graph(
+        self, generated_cypher: str, params: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """`_query_graph` on the graph's async driver, routed to a reader."""
+        if not generated_cypher:
+            return []
+        generated_cypher, params = self._scope(generated_cypher, params)
+        if self.profiler is not None:
+            return (await self.profiler.aquery(generated_cypher, params))[: self.top_k]
+        return (await aquery_rows(self.graph, generated_cypher, params))[: self.top_k]
+
+    def _generate_and_query(
+        self,
+        args: Dict[str, Any],
+        callbacks,
+        run_manager: CallbackManagerForChainRun,
+        params: Optional[Dict[str, Any]] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> tuple[str, List[Dict[str, Any]]]:
+        """Try each Cypher route in order and keep the first one whose query validates, runs and returns rows."""
+        timings = {} if timings is None else timings
+        chains = self._cypher_generation_chains()
+        generated_cypher, context = "", []
+
+        for i, (route, cypher_chain) in enumerate(chains):
+            is_last_route = i == len(chains) - 1
+            if route is None:
+                with _timed(timings, "cypher_generation"):
+                    generated_cypher = self._generate_cypher(cypher_chain, args, callbacks, run_manager)
+                with _timed(timings, "cypher_execution"):
+                    return generated_cypher, self._query_graph(generated_cypher, params)
+
+            with self.router.track("cypher", route) as record:
+                with _timed(timings, "cypher_generation"):
+                    generated_cypher = self._generate_cypher(cypher_chain, args, callbacks, run_manager)
+
+                if not generated_cypher:
+                    record.reject("failed validation")
+                    continue
+
+                try:
+                    with _timed(timings, "cypher_execution"):
+                        context = self._query_graph(generated_cypher, params)
+                except Exception as e:
+                    if is_last_route:
+                        raise
+                    record.reject(f"execution failed: {e}")
+                    continue
+
+                if not context:
+                    # BM25 matches almost any question, so it only answers once every route came back empty
+                    record.reject("no rows")
+                    continue
+
+            return generated_cypher, context
+
+        return generated_cypher, context
+
+    async def _agenerate_and_query(
+        self,
+        args: Dict[str, Any],
+        callbacks,
+        run_manager: AsyncCallbackManagerForChainRun,
+        params: Optional[Dict[str, Any]] = None,
+        timings: Optional[Dict[str, float]] = None,
+    ) -> tuple[str, List[Dict[str, Any]]]:
+        """Async `_generate_and_query`."""
+        timings = {} if timings is None else timings
+        chains = self._cypher_generation_chains()
+        generated_cypher, context = "", []
+
+        for i, (route, cypher_chain) in enumerate(chains):
+            is_last_route = i == len(chains) - 1
+            if route is None:
+                with _timed(timings, "cypher_generation"):
+                    generated_cypher = await self._agenerate_cypher(cypher_chain, args, callbacks, run_manager)
+                with _timed(timings, "cypher_execution"):
+                    return generated_cypher, await self._aquery_graph(generated_cypher, params)
+
+            with self.router.track("cypher", route) as record:
+                with _timed(timings, "cypher_generation"):
+                    generated_cypher = await self._agenerate_cypher(cypher_chain, args, callbacks, run_manager)
+
+                if not generated_cypher:
+                    record.reject("failed validation")
+                    continue
+
+                try:
+                    with _timed(timings, "cypher_execution"):
+                        context = await self._aquery_graph(generated_cypher, params)
+                except Exception as e:
+                    if is_last_route:
+                        raise
+                    record.reject(f"execution failed: {e}")
+                    continue
+
+                if not context:
+                    record.reject("no rows")
+                    continue
+
+            return generated_cypher, context
+
+        return generated_cypher, context
+
+    def _link_and_diagnose(
+        self,
+        question: str,
+        args: Dict[str, Any],
+        intermediate_steps: List,
+        timings: Dict[str, float],
+    ) -> tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """Link question terms to node ids (into `args` and the returned query params) and try the diagnosis index."""
+        params: Dict[str, Any] = {}
+        if self.entity_linker is not None:
+            with _timed(timings, "entity_linking"):
+                linked = self.entity_linker.link(question)
+                args["linked_entities"], params = linked_entities_prompt(linked)
+            intermediate_steps.append({"linked_entities": linked})
+
+        diagnosis = []
+        if self.diagnosis_index is not None:
+            with _timed(timings, "diagnosis"):
+                diagnosis = self.diagnosis_index.diagnose_question(question, top_k=self.top_k)
+        if diagnosis:
+            # Fast path: ranked straight from the symptom -> disease index, no Cypher round trip
+            intermediate_steps.append({"diagnosis": diagnosis})
+        return params, diagnosis
+
+    def _cypher_context(
+        self,
+        question: str,
+        generated_cypher: str,
+        context: List[Dict[str, Any]],
+        intermediate_steps: List,
+        timings: Dict[str, float],
+    ) -> List[Dict[str, Any]]:
+        """Context from the Cypher rows: BM25 matches when there are none, compressed rows otherwise."""
+        intermediate_steps.append({"query": generated_cypher})
+        if not context and self.text_index is not None:
+            with _timed(timings, "text_search"):
+                context = self.text_index.search_context(question, top_k=self.text_top_k)
+            intermediate_steps.append({"text_search": [(row["label"], row["id"]) for row in context]})
+        elif context and self.compress_context and not self.return_direct:
+            with _timed(timings, "context_shaping"):
+                context = self._shape_context(question, context, generated_cypher)
+        return context
+
+    def _chain_result(
+        self, final_result: Union[List[Dict[str, Any]], str], intermediate_steps: List, timings: Dict[str, float]
+    ) -> Dict[str, Any]:
+        intermediate_steps.append({"timings": timings})
+        chain_result: Dict[str, Any] = {self.output_key: final_result}
+        if self.return_intermediate_steps:
+            chain_result[INTERMEDIATE_STEPS_KEY] = intermediate_steps
+        return chain_result
+
+    def _call(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[CallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        """Generate Cypher statement, use it to look up in db and answer question."""
+        _run_manager = run_manager or CallbackManagerForChainRun.get_noop_manager()
+        callbacks = _run_manager.get_child()
+        question = inputs[self.input_key]
+        args = {
+            "question": question,
+            "schema": self.graph_schema,
+        }
+        args.update(inputs)
+
+        intermediate_steps: List = []
+        # Seconds spent per stage, reported as the last intermediate step
+        timings: Dict[str, float] = {}
+
+        params, context = self._link_and_diagnose(question, args, intermediate_steps, timings)
+        if not context:
+            generated_cypher, context = self._generate_and_query(args, callbacks, _run_manager, params, timings)
+            context = self._cypher_context(question, generated_cypher, context, intermediate_steps, timings)
+
+        final_result: Union[List[Dict[str, Any]], str]
+        if self.return_direct:
+            final_result = context
+        else:
+            _run_manager.on_text("Full Context:", end="\n", verbose=self.verbose)
+            _run_manager.on_text(str(context), color="green", end="\n", verbose=self.verbose)
+
+            intermediate_steps.append({"context": context})
+            with _timed(timings, "answer"):
+                final_result = self._answer(question, context, callbacks)
+
+        return self._chain_result(final_result, intermediate_steps, timings)
+
+    async def _acall(
+        self,
+        inputs: Dict[str, Any],
+        run_manager: Optional[AsyncCallbackManagerForChainRun] = None,
+    ) -> Dict[str, Any]:
+        """`_call` with the LLM stages awaited and the Cypher run on the graph's async driver."""
+        _run_manager = run_manager or AsyncCallbackManagerForChainRun.get_noop_manager()
+        callbacks = _run_manager.get_child()
+        question = inputs[self.input_key]
+        args = {
+            "question": question,
+            "schema": self.graph_schema,
+        }
+        args.update(inputs)
+
+        intermediate_steps: List = []
+        timings: Dict[str, float] = {}
+
+        params, context = self._link_and_diagnose(question, args, intermediate_steps, timings)
+        if not context:
+            generated_cypher, context = await self._agenerate_and_query(args, callbacks, _run_manager, params, timings)
+            context = self._cypher_context(question, generated_cypher, context, intermediate_steps, timings)
+
+        final_result: Union[List[Dict[str, Any]], str]
+        if self.return_direct:
+            final_result = context
+        else:
+            await _run_manager.on_text("Full Context:", end="\n", verbose=self.verbose)
+            await _run_manager.on_text(str(context), color="green", end="\n", verbose=self.verbose)
+
+            intermediate_steps.append({"context": context})
+            with _timed(timings, "answer"):
+                final_result = await self._aanswer(question, context, callbacks)
+
+        return self._chain_result(final_result, intermediate_steps, timings)
+
+    def _answer_prompt(self, question: str, context: List[Dict[str, Any]]) -> tuple[Dict[str, Any], str]:
+        """Answer prompt inputs (context cut to the `answer` budget) and the rendered prompt for tracking."""
+        qa_inputs = self._qa_inputs(question, context)
+        prompt_text = ""
+        if self.ledger is not None:
+            prompt_text = self._render_prompt(self.qa_chain, qa_inputs)
+            if self.ledger.over_budget("answer", prompt_text):
+                qa_inputs, prompt_text = self._fit_context(question, context)
+        return qa_inputs, prompt_text
+
+    @contextmanager
+    def _track_answer(self, prompt_text: str):
+        route = None
+        if self.router is not None:
+            route = ModelRouter.SMALL if self.router.enabled else ModelRouter.LARGE
+
+        with self.router.track("answer", route) if route else nullcontext(), self._track("answer", prompt_text):
+            yield
+
+    def _answer(self, question: str, context: List[Dict[str, Any]], callbacks) -> str:
+        qa_inputs, prompt_text = self._answer_prompt(question, context)
+        with self._track_answer(prompt_text):
+            return self.qa_chain.invoke(qa_inputs, callbacks=callbacks)
+
+    async def _aanswer(self, question: str, context: List[Dict[str, Any]], callbacks) -> str:
+        qa_inputs, prompt_text = self._answer_prompt(question, context)
+        with self._track_answer(prompt_text):
+            return await self.qa_chain.ainvoke(qa_inputs, callbacks=callbacks)
+
+    def _qa_inputs(self, question: str, context: Union[List[Dict[str, Any]], str]) -> Dict[str, Any]:
+        if self.use_function_response:
+            return {"question": question, "function_response": get_function_response(question, context)}
+        return {"question": question, "context": context}
+
+    @staticmethod
+    def _render_prompt(chain: Runnable, inputs: Dict[str, Any]) -> str:
+        """Render the prompt step of a `prompt | llm | parser` chain, for offline token counting."""
+        return chain.first.invoke(inputs).to_string()
+
+    def _track(self, stage: str, prompt_text: str):
+        if self.ledger is None:
+            return nullcontext()
+        return self.ledger.track(stage, prompt_text)
+
+    def _fit_schema(self, cypher_chain: Runnable, args: Dict[str, Any], prompt_text: str) -> tuple[Dict[str, Any], str]:
+        """Truncate the schema so the Cypher prompt fits the `cypher` token budget."""
+        count_tokens = self.ledger.count_tokens
+        schema_budget = self.ledger.budget("cypher") - (count_tokens(prompt_text) - count_tokens(args["schema"]))
+        args = {**args, "schema": truncate_to_tokens(args["schema"], max(schema_budget, 0), count_tokens)}
+        self.ledger.note("cypher", truncated=1)
+        return args, self._render_prompt(cypher_chain, args)
+
+    def _shape_context(self, question: str, context: List[Dict[str, Any]], query: str = "") -> List[Dict[str, Any]]:
+        """Compress Cypher rows, capped to `context_max_tokens` or what the `answer` budget leaves for them."""
+        if self.ledger is None:
+            return shape_context(context, question, query=query)
+
+        max_tokens = self.context_max_tokens
+        if max_tokens is None and self.ledger.budget("answer") is not None:
+            overhead = self.ledger.count_tokens(self._render_prompt(self.qa_chain, self._qa_inputs(question, [])))
+            max_tokens = max(self.ledger.budget("answer") - overhead, 0)
+        return shape_context(
+            context, question, max_tokens=max_tokens, count_tokens=self.ledger.count_tokens, query=query
+        )
+
+    def _fit_context(self, question: str, context: List[Dict[str, Any]]) -> tuple[Dict[str, Any], str]:
+        """Drop trailing rows (and cut the last one if needed) so the answer prompt fits the `answer` budget."""
+        self.ledger.note("answer", truncated=1)
+        rows = list(context)
+        while len(rows) > 1:
+            rows.pop()
+            qa_inputs = self._qa_inputs(question, rows)
+            prompt_text = self._render_prompt(self.qa_chain, qa_inputs)
+            if not self.ledger.over_budget("answer", prompt_text):
+                return qa_inputs, prompt_text
+
+        count_tokens = self.ledger.count_tokens
+        prompt_text = self._render_prompt(self.qa_chain, self._qa_inputs(question, []))
+        row_budget = self.ledger.budget("answer") - count_tokens(prompt_text)
+        qa_inputs = self._qa_inputs(question, truncate_to_tokens(str(rows), max(row_budget, 0), count_tokens))
+        return qa_inputs, self._render_prompt(self.qa_chain, qa_inputs)
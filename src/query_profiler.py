@@ -0,0 +1,209 @@
+# Profiling of generated Cypher: a sampled fraction of queries runs with PROFILE, and every profiled
+# or slow query is appended to a local JSONL log. Aggregating the log by normalized query shape shows
+# which kinds of generated queries scan labels, build cartesian products or need an index.
+
+import json
+import random
+import re
+import statistics
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Optional
+
+from deps.graph_client import aquery_rows, get_graph_client, query_rows, typed_rows
+from settings import ProjectSettings, settings
+
+# Operators that read far more of the graph than an index lookup would
+SCAN_OPERATORS = {"AllNodesScan", "NodeByLabelScan", "DirectedAllRelationshipsScan", "UndirectedAllRelationshipsScan"}
+
+_STRING_LITERAL = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_LITERAL = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_NODE_PATTERN = re.compile(r"\((\w*)\s*:\s*`?(\w+)`?")
+_INLINE_PROPERTY = re.compile(r"\((\w*)\s*:\s*`?(\w+)`?\s*\{\s*`?(\w+)`?\s*:")
+_PREDICATE = re.compile(
+    r"\b(\w+)\.`?(\w+)`?\s*(=~|=|<>|<=|>=|<|>|\bIN\b|\bSTARTS WITH\b|\bENDS WITH\b|\bCONTAINS\b)", re.IGNORECASE
+)
+
+
+def query_shape(query: str) -> str:
+    """Normalize a query to its shape: literals replaced by `?`, whitespace collapsed."""
+    shape = _STRING_LITERAL.sub("?", query)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    return " ".join(shape.split())
+
+
+def _walk_plan(plan: dict) -> tuple[int, list[str]]:
+    """Total db hits and operator types of a PROFILE plan tree."""
+    db_hits, operators, stack = 0, [], [plan]
+    while stack:
+        operator = stack.pop()
+        db_hits += operator.get("dbHits", 0)
+        operators.append(operator.get("operatorType", "").split("@")[0])
+        stack.extend(operator.get("children", []))
+    return db_hits, operators
+
+
+def property_predicates(query: str) -> set[tuple[str, str, str]]:
+    """(label, property, operator) of every property lookup on a labelled node variable."""
+    variables = {variable: label for variable, label in _NODE_PATTERN.findall(query) if variable}
+    predicates = {(label, prop, "=") for _, label, prop in _INLINE_PROPERTY.findall(query)}
+    for variable, prop, operator in _PREDICATE.findall(query):
+        if variable in variables:
+            predicates.add((variables[variable], prop, " ".join(operator.upper().split())))
+    return predicates
+
+
+class QueryProfiler:
+    """Run Cypher through the graph, profiling a sample and logging profiled and slow queries."""
+
+    def __init__(self, graph, settings: ProjectSettings):
+        self.graph = graph
+        self.sample_rate = settings.cypher_profile_sample_rate
+        self.slow_query_ms = settings.cypher_slow_query_ms
+        self.log_path = settings.cypher_query_log_path
+
+    def _profile(self, query: str, params: dict) -> tuple[list[dict], Optional[dict]]:
+        from neo4j import Query
+
+        records, summary, _ = self.graph._driver.execute_query(
+            Query(text=f"PROFILE {query}", timeout=self.graph.timeout),
+            database_=self.graph._database,
+            parameters_=params,
+        )
+        return typed_rows(records, self.graph.sanitize), summary.profile
+
+    def query(self, query: str, params: Optional[dict] = None) -> list[dict[str, Any]]:
+        params = params or {}
+        # Only a Neo4j driver-backed graph exposes the profile of a query
+        profiled = hasattr(self.graph, "_driver") and random.random() < self.sample_rate
+
+        start = time.perf_counter()
+        profile = None
+        if profiled:
+            rows, profile = self._profile(query, params)
+        else:
+            rows = query_rows(self.graph, query, params)
+        self._log_if_notable(query, params, start, rows, profile)
+        return rows
+
+    async def aquery(self, query: str, params: Optional[dict] = None) -> list[dict[str, Any]]:
+        """`query` on the graph's async driver (read routing), for the async QA path."""
+        params = params or {}
+        profiled = hasattr(self.graph, "aprofile") and random.random() < self.sample_rate
+
+        start = time.perf_counter()
+        profile = None
+        if profiled:
+            rows, profile = await self.graph.aprofile(query, params)
+        else:
+            rows = await aquery_rows(self.graph, query, params)
+        self._log_if_notable(query, params, start, rows, profile)
+        return rows
+
+    def _log_if_notable(self, query: str, params: dict, start: float, rows: list, profile: Optional[dict]) -> None:
+        wall_ms = (time.perf_counter() - start) * 1000
+        if profile is not None or wall_ms >= self.slow_query_ms:
+            self.log(query, params, wall_ms, len(rows), profile)
+
+    def log(self, query: str, params: dict, wall_ms: float, n_rows: int, profile: Optional[dict]) -> None:
+        entry = {
+            "time": time.time(),
+            "shape": query_shape(query),
+            "query": query,
+            "params": sorted(params),
+            "wall_ms": round(wall_ms, 3),
+            "rows": n_rows,
+            "profiled": profile is not None,
+        }
+        if profile is not None:
+            db_hits, operators = _walk_plan(profile)
+            entry.update(
+                db_hits=db_hits,
+                operators=operators,
+                label_scans=sum(operator in SCAN_OPERATORS for operator in operators),
+                cartesian_products=operators.count("CartesianProduct"),
+            )
+        self.log_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def aggregate_query_log(log_path: Path = settings.cypher_query_log_path) -> list[dict[str, Any]]:
+    """Per query shape: count, wall time, db hits and plan flags, most expensive shapes first."""
+    entries = defaultdict(list)
+    with open(log_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entries[entry["shape"]].append(entry)
+
+    shapes = []
+    for shape, shape_entries in entries.items():
+        wall_ms = sorted(entry["wall_ms"] for entry in shape_entries)
+        profiled = [entry for entry in shape_entries if entry["profiled"]]
+        shapes.append(
+            {
+                "shape": shape,
+                "count": len(shape_entries),
+                "profiled": len(profiled),
+                "mean_wall_ms": statistics.fmean(wall_ms),
+                "max_wall_ms": wall_ms[-1],
+                "mean_db_hits": statistics.fmean(entry["db_hits"] for entry in profiled) if profiled else None,
+                "mean_rows": statistics.fmean(entry["rows"] for entry in shape_entries),
+                "label_scans": max((entry["label_scans"] for entry in profiled), default=0),
+                "cartesian_products": max((entry["cartesian_products"] for entry in profiled), default=0),
+                "example": shape_entries[-1]["query"],
+            }
+        )
+    # Most expensive first: total db hits of profiled runs, then total wall time
+    return sorted(
+        shapes,
+        key=lambda shape: (
+            -shape["count"] * (shape["mean_db_hits"] or 0),
+            -shape["count"] * shape["mean_wall_ms"],
+        ),
+    )
+
+
+def existing_indexes(graph) -> set[tuple[str, str]]:
+    """(label, property) pairs covered by a single-property index."""
+    rows = graph.query("SHOW INDEXES YIELD labelsOrTypes, properties, entityType WHERE entityType = 'NODE'")
+    return {
+        (row["labelsOrTypes"][0], row["properties"][0])
+        for row in rows
+        if row["labelsOrTypes"] and row["properties"] and len(row["properties"]) == 1
+    }
+
+
+def suggest_indexes(graph, shape: dict[str, Any]) -> list[str]:
+    """Index statements for the schema properties a query shape looks up without an index."""
+    schema = graph.get_structured_schema["node_props"]
+    node_properties = {label: {prop["property"] for prop in props} for label, props in schema.items()}
+    indexed = existing_indexes(graph)
+    suggestions = []
+    for label, prop, operator in sorted(property_predicates(shape["example"])):
+        if prop not in node_properties.get(label, ()) or (label, prop) in indexed:
+            continue
+        index_type = "TEXT INDEX" if operator in ("CONTAINS", "ENDS WITH") else "INDEX"
+        suggestions.append(
+            f"CREATE {index_type} {label.lower()}_{prop} IF NOT EXISTS FOR (n:`{label}`) ON (n.`{prop}`)"
+        )
+    return suggestions
+
+
+def print_query_report(graph, log_path: Path = settings.cypher_query_log_path, top: int = 5) -> None:
+    for shape in aggregate_query_log(log_path)[:top]:
+        print(
+            f"[cypher] {shape['count']}x, mean {shape['mean_wall_ms']:.1f} ms (max {shape['max_wall_ms']:.1f}), "
+            f"db hits {shape['mean_db_hits'] if shape['mean_db_hits'] is not None else 'n/a'}, "
+            f"{shape['label_scans']} label scans, {shape['cartesian_products']} cartesian products"
+        )
+        print(f"  {shape['shape']}")
+        for suggestion in suggest_indexes(graph, shape):
+            print(f"  suggest: {suggestion}")
+
+
+if __name__ == "__main__":
+    graph_client = get_graph_client(settings)
+    print_query_report(graph_client)
@@ -1,29 +1,49 @@
-from langchain_neo4j import Neo4jGraph
-from langchain_neo4j import GraphCypherQAChain
-
 from prompts.query_enhancement_prompt import query_enhancement_prompt
-from deps.llm_client import get_llm_client
-from settings import settings
+from materialize import materialized_properties_prompt
+from deps.graph_client import get_graph_client
+from deps.llm_client import ModelRouter
+from deps.token_accounting import TokenLedger
+from qa_chain import KnowledgeGraphQAChain
+from diagnosis import load_diagnosis_index
+from entity_linker import load_entity_linker
+from text_index import load_text_index
+from query_profiler import QueryProfiler, print_query_report
+from settings import ProjectSettings, settings
+
+
+def build_chain(settings: ProjectSettings = settings) -> KnowledgeGraphQAChain:
+    """The QA chain over the configured graph, with its clients and local indexes built from `settings`.
 
-graph_client = Neo4jGraph(
-    url=settings.graph_db.graph_db_url,
-    username=settings.graph_db.graph_db_user,
-    password=settings.graph_db.graph_db_password,
-    enhanced_schema=True,  # Add for enhanced schema
-)
+    Callers that need different settings (a cassette, a response cache) pass an
+    updated copy, e.g. `build_chain(settings.model_copy(update={...}))`.
+    """
+    graph_client = get_graph_client(settings, enhanced_schema=True)  # Add for enhanced schema
 
-llm_client = get_llm_client(settings)
+    # Cypher and answers go to `llm_small_model`; Cypher escalates to `llm_model` on failure
+    router = ModelRouter(settings)
+    ledger = TokenLedger(settings)
 
-chain = GraphCypherQAChain.from_llm(
-    graph=graph_client,
-    llm=llm_client,
-    cypher_prompt=query_enhancement_prompt,
-    verbose=True,
-    allow_dangerous_requests=True,
-)
+    group_id = settings.kg_group_id
+    return KnowledgeGraphQAChain.from_router(
+        router,
+        graph=graph_client,
+        cypher_prompt=query_enhancement_prompt.partial(precomputed_properties=materialized_properties_prompt()),
+        ledger=ledger,
+        diagnosis_index=load_diagnosis_index(graph_client, settings.diagnosis_index_path, group_id=group_id),
+        entity_linker=load_entity_linker(graph_client, settings.entity_index_path, group_id=group_id),
+        text_index=load_text_index(graph_client, settings.text_index_dir, group_id=group_id),
+        group_id=group_id,
+        profiler=QueryProfiler(graph_client, settings),
+        validate_cypher=True,
+        verbose=True,
+        allow_dangerous_requests=True,
+    )
 
 
 if __name__ == "__main__":
+    chain = build_chain(settings)
+    graph_client = chain.graph
+
     print("GRAPH SCHEMA:")
     print(graph_client.schema)
     print("-" * 100 + "\n")
@@ -31,7 +51,7 @@ if __name__ == "__main__":
     examples = [
         # "Which disease appears in more than two seasons in a year, and which seasons are they?",
         # "Which disease usually appears on durian trees during the rainy season?",
-        # "If my tree has yellowing leaves, what disease could it be?",
+        "If my tree has yellowing leaves, what disease could it be?",
         # "Which disease appears on the most parts of the durian tree, and which parts are they?",
         "Which disease in Thailand affects the most durian varieties?",
         "Which diseases on durian caused by Phytophthora Palmivora?",
@@ -43,6 +63,11 @@ if __name__ == "__main__":
         print(f"Answer: {response['result']}")
         print("-" * 100)
 
+    chain.router.print_summary()
+    chain.ledger.print_summary()
+    if settings.cypher_query_log_path.exists():
+        print_query_report(graph_client)
+
     # MATCH p=(symptom:Symptom {id: "Unilateral Yellowing"})<-[:HAS_SYMPTOM]-(crop_part:Crop_part)-[:HAS_DISEASE]->(disease:Disease)
     # RETURN p;
 
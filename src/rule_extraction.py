@@ -0,0 +1,141 @@
+# Deterministic extraction of the sheet columns covered by schema/disease_column_rules.py. Each rule
+# matches its vocabulary over the whole column at once (pandas string ops, no per-cell Python loop)
+# and yields graph documents shaped like LLMGraphTransformer output, so they merge with the LLM's
+# graph for the remaining prose columns. Those columns and labels are dropped from the LLM's prompt.
+
+import re
+
+import pandas as pd
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+from langchain_core.documents import Document
+
+from materialize import graph_label
+from schema.disease_column_rules import column_rules, row_entity
+from utils import dataframe_to_documents
+
+# Cells are matched segment by segment (lines, bullets, sentences) so `exclude` drops only
+# the statement it matches, e.g. "Reportedly more tolerant: Gumpun"
+_SEGMENT_SPLIT = r"\n+|(?<=[.;!?])\s+"
+
+
+def _normalize(alias: pd.Series) -> pd.Series:
+    return alias.str.lower().str.split().str.join(" ")
+
+
+def _vocabulary_pattern(vocabulary: dict[str, list[str]]) -> tuple[re.Pattern, dict[str, str]]:
+    """One case-insensitive alternation over every alias, and the alias -> node id lookup."""
+    aliases = {
+        " ".join(alias.lower().split()): node_id
+        for node_id, names in vocabulary.items()
+        for alias in [node_id, *names]
+    }
+    # Longest first, so "monsoon season" wins over "monsoon"
+    alternation = "|".join(
+        r"\s+".join(map(re.escape, alias.split())) for alias in sorted(aliases, key=len, reverse=True)
+    )
+    return re.compile(rf"\b(?:{alternation})\b", re.IGNORECASE), aliases
+
+
+def row_entity_ids(df: pd.DataFrame, entity: dict = row_entity) -> pd.Series:
+    """Node id of each row's entity: its name without parentheticals, title-cased like the LLM's node ids."""
+    return (
+        df[entity["column"]]
+        .fillna("")
+        .astype(str)
+        .str.replace(r"\s*\([^)]*\)", "", regex=True)
+        .str.split()
+        .str.join(" ")
+        .str.title()
+    )
+
+
+def extract_column(values: pd.Series, rule: dict) -> pd.DataFrame:
+    """Vocabulary entries mentioned in a column, as unique (row, id) pairs; `row` is the Series index."""
+    pattern, aliases = _vocabulary_pattern(rule["vocabulary"])
+    segments = values.fillna("").astype(str).str.split(_SEGMENT_SPLIT, regex=True).explode()
+    if rule.get("exclude"):
+        segments = segments[~segments.str.contains(rule["exclude"], case=False, regex=True)]
+
+    mentions = segments.str.findall(pattern).explode().dropna()
+    node_ids = _normalize(mentions).map(aliases)
+    return (
+        pd.DataFrame({"row": node_ids.index, "id": node_ids.to_numpy()})
+        .dropna()
+        .drop_duplicates()
+        .reset_index(drop=True)
+    )
+
+
+def rule_columns(rules: list[dict] = column_rules) -> list[str]:
+    return [rule["column"] for rule in rules]
+
+
+def extract_rule_graph_documents(
+    df: pd.DataFrame, rules: list[dict] = column_rules, entity: dict = row_entity
+) -> list[GraphDocument]:
+    """One graph document per row with the nodes and relationships the rules extract from it.
+
+    Node types and ids follow `LLMGraphTransformer`'s formatting (capitalized types,
+    title-cased ids), so `merge_graph_documents` de-duplicates them against LLM output.
+    """
+    df = df.reset_index(drop=True)
+    entities = [Node(id=entity_id, type=graph_label(entity["label"])) for entity_id in row_entity_ids(df, entity)]
+    nodes = [{} for _ in range(len(df))]
+    relationships = [[] for _ in range(len(df))]
+    for row, entity_node in enumerate(entities):
+        nodes[row][(entity_node.id, entity_node.type)] = entity_node
+
+    for rule in rules:
+        if rule["column"] not in df.columns:
+            continue
+        source_label, rel_type, target_label = rule["relationship"]
+        parent = None
+        if rule.get("parent"):
+            parent_label, parent_id, parent_rel_type = rule["parent"]
+            parent = Node(id=parent_id.title(), type=graph_label(parent_label))
+
+        for row, node_id in extract_column(df[rule["column"]], rule).itertuples(index=False):
+            node = Node(id=node_id.title(), type=graph_label(rule["label"]))
+            nodes[row][(node.id, node.type)] = node
+            if source_label == rule["label"]:
+                relationships[row].append(Relationship(source=node, target=entities[row], type=rel_type))
+            else:
+                relationships[row].append(Relationship(source=entities[row], target=node, type=rel_type))
+            if parent is not None:
+                nodes[row][(parent.id, parent.type)] = parent
+                relationships[row].append(Relationship(source=parent, target=node, type=parent_rel_type))
+
+    # Each document's source is the part of the row the rules read
+    columns = [entity["column"], *(column for column in rule_columns(rules) if column in df.columns)]
+    return [
+        GraphDocument(
+            nodes=list(row_nodes.values()), relationships=row_relationships, source=Document(page_content=text)
+        )
+        for row_nodes, row_relationships, text in zip(nodes, relationships, dataframe_to_documents(df[columns]))
+    ]
+
+
+def llm_schema(
+    node_types: list[dict],
+    relation_types: list[dict],
+    allowed_relationships: list[tuple],
+    rules: list[dict] = column_rules,
+) -> tuple[list[dict], list[dict], list[tuple]]:
+    """The schema left for the LLM: without the labels the rules extract, nor the relationships touching them."""
+    rule_labels = {rule["label"] for rule in rules}
+    allowed = [
+        (source, rel, target)
+        for source, rel, target in allowed_relationships
+        if source not in rule_labels and target not in rule_labels
+    ]
+    rel_types = {rel for _, rel, _ in allowed}
+    return (
+        [node_type for node_type in node_types if node_type["label"] not in rule_labels],
+        [relation_type for relation_type in relation_types if relation_type["label"] in rel_types],
+        allowed,
+    )
+
+
+def known_entities_prompt(entity_id: str, entity: dict = row_entity) -> str:
+    """Prompt section naming the row's entity node, so the LLM's id matches the rule-extracted one."""
+    return f'- The {entity["label"]} node this row describes has the id "{entity_id}"; use exactly this id.'
@@ -0,0 +1,81 @@
+# Sheet columns extracted by vocabulary rules instead of the LLM (see rule_extraction.py).
+# Each rule lists the canonical node ids of one label with the aliases they are written as;
+# every cell segment (line or sentence) mentioning an alias links the row's entity to that node.
+
+# The entity each row describes
+row_entity = {
+    "column": "English Name",
+    "label": "DISEASE",
+}
+
+column_rules = [
+    {
+        "column": "Locations",
+        "label": "LOCATION",
+        "relationship": ("DISEASE", "OCCURS_IN", "LOCATION"),
+        "vocabulary": {
+            "Thailand": ["thai"],
+            "Vietnam": ["viet nam"],
+            "Malaysia": ["peninsular malaysia"],
+            "Indonesia": [],
+            "Philippines": ["the philippines"],
+            "Singapore": [],
+            "Brunei": [],
+            "Cambodia": [],
+            "Laos": [],
+            "Myanmar": [],
+            "Sri Lanka": [],
+            "India": [],
+            "China": [],
+            "Australia": ["northern australia"],
+        },
+    },
+    {
+        "column": "Seasonality",
+        "label": "SEASONALITY",
+        "relationship": ("DISEASE", "PEAKS_DURING", "SEASONALITY"),
+        # Sentences about when the disease is absent or subsides
+        "exclude": r"\bsubsides?\b|\bnot\b",
+        "vocabulary": {
+            "Rainy Season": ["rainy seasons", "wet season", "wet seasons", "onset of rains"],
+            "Monsoon Season": ["monsoon", "monsoons", "monsoon seasons", "monsoon period", "monsoon periods"],
+            "Dry Season": ["dry seasons"],
+            "Leaf Flushing Stage": [
+                "leaf flush",
+                "leaf flushes",
+                "leaf flushing",
+                "new leaf flush",
+                "leaves are flushing",
+                "flushing leaves",
+            ],
+            "Flowering Stage": ["flowering", "flowering period"],
+            "Fruit Development Stage": ["fruit development", "fruit set", "fruit maturation", "fruiting"],
+            "Vegetative Growth Stage": ["vegetative growth", "active vegetative growth"],
+        },
+    },
+    {
+        "column": "Affected Varieties",
+        "label": "VARIETY",
+        "relationship": ("VARIETY", "SUSCEPTIBLE_TO", "DISEASE"),
+        # Cultivars listed as tolerant or resistant are not susceptible
+        "exclude": r"\btolerant\b|\bresistant\b",
+        # Every extracted variety is also linked to the crop: CROP -[HAS_VARIETY]-> VARIETY
+        "parent": ("CROP", "Durian", "HAS_VARIETY"),
+        "vocabulary": {
+            "Monthong": ["mon thong", "d159", "golden pillow"],
+            "Chanee": ["d123"],
+            "Kanyao": ["kan yao", "d158"],
+            "Musang King": ["d197", "raja kunyit", "mao shan wang"],
+            "Black Thorn": ["d200", "ochee"],
+            "D24": ["sultan"],
+            "D99": ["kop kecil"],
+            "D168": ["hajah hasmah", "ioi"],
+            "Red Prawn": ["d175", "udang merah"],
+            "Ri6": ["ri 6"],
+            "Puyat": [],
+            "Gumpun": [],
+            "Kradum": [],
+            "Puangmanee": [],
+        },
+    },
+]
@@ -3,7 +3,7 @@ from abc import ABC
 from pathlib import Path
 from tempfile import gettempdir
 
-from pydantic import Field
+from pydantic import BaseModel, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 TEMP_DIR = Path(gettempdir())
@@ -31,6 +31,18 @@ class ProjectBaseSettings(BaseSettings, ABC):
     )
 
 
+class LLMPoolMember(BaseModel):
+    """One credential / endpoint in a pooled LLM client."""
+
+    provider: str = "openai"
+    # Only serve this model name; None serves whichever model is requested
+    model: str | None = None
+    api_key: str | None = None
+    # OpenAI-compatible base URL (e.g. a local vLLM / Ollama server) or Gemini API endpoint
+    endpoint: str = ""
+    weight: float = 1.0
+
+
 class LLMSettings(ProjectBaseSettings):
     """Settings for the LLM-related options."""
 
@@ -39,9 +51,45 @@ class LLMSettings(ProjectBaseSettings):
     llm_endpoint: str = ""
     llm_api_key: str | None = None
     llm_temperature: float = 0.0
+    # Completion token cap per call
     llm_max_tokens: int = 16384
     llm_small_model: str | None = None
+    # Reasoning token budget (Gemini thinking models only)
     llm_thinking_budget: int | None = None
+    # Prompt token budget per LLM stage; larger inputs are split (extraction) or truncated (cypher, answer)
+    llm_stage_token_budgets: dict[str, int] = Field(
+        default_factory=lambda: {"extraction": 12000, "cypher": 8000, "answer": 8000}
+    )
+    # USD per 1M (input, output) tokens keyed by model name, used to estimate cost per route
+    llm_model_costs: dict[str, tuple[float, float]] = Field(default_factory=dict)
+    # Extraction rows up to this many characters are tried on `llm_small_model` first
+    llm_small_model_max_row_chars: int = 12000
+    # Deadline per LLM request in seconds, passed to the provider SDK; a hedged call is also bounded by it as a
+    # whole, hedges included (None: SDK default)
+    llm_timeout_s: float | None = 120.0
+    # Send a duplicate request when a call has not answered after this many seconds (None: no hedging)
+    llm_hedge_after_s: float | None = None
+    # Maximum fraction of calls that may be hedged
+    llm_hedge_budget: float = 0.1
+    # Extra credentials / endpoints pooled with the primary one, e.g. as JSON in the environment
+    llm_pool: list[LLMPoolMember] = Field(default_factory=list)
+    # "least_outstanding" or "weighted_round_robin"
+    llm_pool_strategy: str = "least_outstanding"
+    # Consecutive failures before a pool member is taken out of rotation, and for how long
+    llm_pool_unhealthy_after: int = 3
+    llm_pool_cooldown_s: float = 30.0
+    # Keep-alive connections per endpoint, shared by every client of that endpoint
+    llm_pool_max_keepalive_connections: int = 20
+    # Record LLM responses to a local cassette and/or replay them: "record", "replay" or "auto" (None: off)
+    llm_cassette_mode: str | None = None
+    llm_cassette_path: Path = TEMP_DIR / "kg_llm_cassette.jsonl"
+    # Replayed responses wait this fraction of their recorded latency (0: served immediately)
+    llm_cassette_latency_scale: float = 0.0
+    # In-memory cache of LLM responses per client, keyed by prompt, model and parameters (0: off)
+    llm_cache_max_size: int = 0
+    # Provider rate limits the ingestion planner projects against (see `ingestion_plan`; None: unlimited)
+    llm_requests_per_minute: int | None = None
+    llm_tokens_per_minute: int | None = None
 
 
 class GraphDBSettings(ProjectBaseSettings):
@@ -51,6 +99,15 @@ class GraphDBSettings(ProjectBaseSettings):
     graph_db_url: str = "neo4j://localhost:7687"
     graph_db_user: str = "neo4j"
     graph_db_password: str = "aisac_kg"
+    # Connections per driver pool, and how long a query waits for a free one before failing
+    graph_db_max_connection_pool_size: int = 100
+    graph_db_connection_acquisition_timeout_s: float = 60.0
+
+    # Fraction of generated Cypher queries run with PROFILE (see `query_profiler.QueryProfiler`)
+    cypher_profile_sample_rate: float = 0.0
+    # Unprofiled queries slower than this are logged too
+    cypher_slow_query_ms: float = 1000.0
+    cypher_query_log_path: Path = TEMP_DIR / "kg_cypher_queries.jsonl"
 
 
 class ProjectSettings(GraphDBSettings, LLMSettings):
@@ -80,7 +137,45 @@ class ProjectSettings(GraphDBSettings, LLMSettings):
     sentry_dsn: str | None = None
     sentry_sample_rate: float = 1.0
 
+    # Groups (crops / clients) that may share the graph database; empty allows any group id
     available_kg_group_ids: list[str] = Field(default_factory=list)
+    # Partition construction writes to and QA reads from (see `groups`); None uses the whole database untagged
+    kg_group_id: str | None = None
+
+    # Local cache of parsed source workbooks (see `utils.load_dataframe_from_excel`)
+    excel_cache_dir: Path = TEMP_DIR / "kg_excel_cache"
+    # Extract the columns in `schema/disease_column_rules.py` with vocabulary rules instead of the LLM
+    rule_based_extraction: bool = True
+    # Extraction calls in flight at once during construction (0: every call at once)
+    extraction_concurrency: int = 0
+    # What the ingestion planner assumes per extraction call when the LLM cassette has no recordings
+    plan_call_latency_s: float = 30.0
+    plan_completion_tokens_per_call: int = 2000
+
+    # Pages written by the Gradio graph explorer (see `graph_view`)
+    graph_view_dir: Path = TEMP_DIR / "kg_graph_views"
+
+    # Warm-up before the QA UI reports ready (see `warmup`): pooled connections opened, schema refreshed
+    # and canonical questions (the UI examples when empty) pre-run to fill the caches
+    qa_warmup: bool = True
+    qa_warmup_questions: list[str] = Field(default_factory=list)
+    qa_warmup_pool_connections: int = 4
+    # Retries of an unreachable graph: the first delay, doubled per attempt up to the max, until the deadline
+    # passes (None: retry until the graph is up)
+    qa_warmup_graph_retry_s: float = 1.0
+    qa_warmup_graph_retry_max_s: float = 30.0
+    qa_warmup_graph_deadline_s: float | None = 300.0
+    qa_warmup_concurrency: int = 2
+    qa_warmup_refresh_schema: bool = True
+    # LLM response cache the UI enables when `llm_cache_max_size` is 0, so pre-run questions are served from it
+    qa_warmup_llm_cache_max_size: int = 1000
+
+    # Symptom -> disease incidence matrix rebuilt after ingestion (see `diagnosis.DiagnosisIndex`)
+    diagnosis_index_path: Path = TEMP_DIR / "kg_diagnosis_index.npz"
+    # Node ids per label for linking question terms (see `entity_linker.EntityLinker`)
+    entity_index_path: Path = TEMP_DIR / "kg_entity_index.json"
+    # BM25 index over node text, used when generated Cypher returns no rows (see `text_index.TextIndex`)
+    text_index_dir: Path = TEMP_DIR / "kg_text_index"
 
     @property
     def graph_db(self) -> GraphDBSettings:
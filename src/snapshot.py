@@ -0,0 +1,366 @@
+# Graph snapshots: export every node (per label set) and relationship (per type) with its properties
+# to a directory of columnar tables plus a manifest, and restore it with batched, concurrent UNWIND
+# writes. Seeding a fresh database takes seconds and no LLM calls, instead of a full
+# `construct_knowledge_graph` run. `admin-import` turns a snapshot into CSVs for `neo4j-admin import`.
+
+import argparse
+import asyncio
+import csv
+import gzip
+import json
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from settings import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; fall back to gzipped JSON lines
+    pa = pq = None
+
+SNAPSHOT_VERSION = 1
+# Temporary label / key linking restored relationships to restored nodes; removed after the restore
+SNAPSHOT_LABEL = "__Snapshot__"
+SNAPSHOT_KEY = "__snapshot_key"
+
+NODES_QUERY = """
+MATCH (n)
+WHERE $group_id IS NULL OR n.group_id = $group_id
+RETURN elementId(n) AS element_id, labels(n) AS labels, properties(n) AS properties
+"""
+
+RELATIONSHIPS_QUERY = """
+MATCH (a)-[r]->(b)
+WHERE $group_id IS NULL OR a.group_id = $group_id
+RETURN elementId(a) AS source, type(r) AS type, elementId(b) AS target, properties(r) AS properties
+"""
+
+# neo4j-admin header types of the scalar column kinds
+_ADMIN_TYPES = {"int": "long", "float": "double", "bool": "boolean", "str": "string", "json": "string"}
+
+
+def _column_kind(values: list) -> str:
+    """Storage kind of a property column: a uniform scalar type, else JSON-encoded strings."""
+    kinds = set()
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            kinds.add("bool")
+        elif isinstance(value, int):
+            kinds.add("int")
+        elif isinstance(value, float):
+            kinds.add("float")
+        elif isinstance(value, str):
+            kinds.add("str")
+        else:  # lists, maps and temporal / spatial values
+            kinds.add("json")
+    if kinds == {"int", "float"}:
+        return "float"
+    if len(kinds) == 1:
+        return kinds.pop()
+    return "str" if not kinds else "json"
+
+
+def _encode_table(rows: list[dict[str, Any]], key_columns: list[str]) -> tuple[list[dict[str, Any]], dict[str, str]]:
+    """Flatten `properties` into one column per property; returns the rows and each property column's kind."""
+    names = sorted({name for row in rows for name in row["properties"]})
+    kinds = {name: _column_kind([row["properties"].get(name) for row in rows]) for name in names}
+    table = []
+    for row in rows:
+        record = {column: row[column] for column in key_columns}
+        for name in names:
+            value = row["properties"].get(name)
+            if value is not None and kinds[name] == "json":
+                value = json.dumps(value, ensure_ascii=False, default=str)
+            elif value is not None and kinds[name] == "float":
+                value = float(value)
+            record[name] = value
+        table.append(record)
+    return table, kinds
+
+
+def _decode_table(table: list[dict[str, Any]], key_columns: list[str], kinds: dict[str, str]) -> list[dict]:
+    """Inverse of `_encode_table`: key columns plus a `properties` map without the null columns."""
+    rows = []
+    for record in table:
+        row = {column: record[column] for column in key_columns}
+        row["properties"] = {
+            name: json.loads(record[name]) if kind == "json" else record[name]
+            for name, kind in kinds.items()
+            if record.get(name) is not None
+        }
+        rows.append(row)
+    return rows
+
+
+def _write_table(table: list[dict[str, Any]], path: Path) -> Path:
+    if pq is not None:
+        path = path.with_suffix(".parquet")
+        pq.write_table(pa.Table.from_pylist(table), path, compression="zstd")
+    else:
+        path = path.with_suffix(".jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for record in table:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
+
+
+def _read_table(path: Path) -> list[dict[str, Any]]:
+    if path.suffix == ".parquet":
+        if pq is None:
+            raise ImportError(f"Reading {path.name} requires pyarrow.")
+        return pq.read_table(path).to_pylist()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _slug(name: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in name).strip("_").lower() or "unlabelled"
+
+
+def export_snapshot(graph, path: Path, group_id: str | None = None) -> dict[str, Any]:
+    """Dump nodes per label set and relationships per type into `path`; returns the manifest."""
+    start = time.perf_counter()
+    path.mkdir(parents=True, exist_ok=True)
+    node_rows = graph.query(NODES_QUERY, {"group_id": group_id})
+    relationship_rows = graph.query(RELATIONSHIPS_QUERY, {"group_id": group_id})
+
+    # Nodes get dense integer keys; relationships refer to them instead of element ids
+    keys, nodes_by_labels = {}, defaultdict(list)
+    for key, row in enumerate(node_rows):
+        keys[row["element_id"]] = key
+        nodes_by_labels[tuple(sorted(row["labels"]))].append({"_key": key, "properties": row["properties"]})
+
+    relationships_by_type = defaultdict(list)
+    for row in relationship_rows:
+        if row["source"] in keys and row["target"] in keys:
+            relationships_by_type[row["type"]].append(
+                {"_start": keys[row["source"]], "_end": keys[row["target"]], "properties": row["properties"]}
+            )
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": {"url": settings.graph_db_url, "database": getattr(graph, "_database", None)},
+        "group_id": group_id,
+        "nodes": [],
+        "relationships": [],
+    }
+    for i, (labels, rows) in enumerate(sorted(nodes_by_labels.items())):
+        table, kinds = _encode_table(rows, ["_key"])
+        file = _write_table(table, path / f"nodes_{i:03d}_{_slug('_'.join(labels))}")
+        manifest["nodes"].append({"file": file.name, "labels": list(labels), "count": len(rows), "columns": kinds})
+    for i, (rel_type, rows) in enumerate(sorted(relationships_by_type.items())):
+        table, kinds = _encode_table(rows, ["_start", "_end"])
+        file = _write_table(table, path / f"relationships_{i:03d}_{_slug(rel_type)}")
+        manifest["relationships"].append({"file": file.name, "type": rel_type, "count": len(rows), "columns": kinds})
+
+    files = [entry["file"] for entry in manifest["nodes"] + manifest["relationships"]]
+    manifest["bytes"] = sum((path / file).stat().st_size for file in files)
+    manifest["export_s"] = round(time.perf_counter() - start, 3)
+    (path / "manifest.json").write_text(json.dumps(manifest, indent=2, ensure_ascii=False), encoding="utf-8")
+    return manifest
+
+
+def load_manifest(path: Path) -> dict[str, Any]:
+    manifest = json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+    if manifest["version"] != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest['version']} (expected {SNAPSHOT_VERSION}).")
+    return manifest
+
+
+def _batches(rows: list, batch_size: int) -> list[list]:
+    return [rows[start : start + batch_size] for start in range(0, len(rows), batch_size)]
+
+
+async def restore_snapshot(
+    graph, path: Path, batch_size: int = 5000, concurrency: int = 4, clear: bool = False
+) -> dict[str, Any]:
+    """Load a snapshot into an `AsyncNeo4jGraph` with concurrent UNWIND batches; returns restore statistics.
+
+    Nodes are created, not merged, so the target database (or the snapshot's
+    group, with `clear`) should be empty. Materialized properties and group ids
+    are ordinary node properties and come back with the nodes; schema indexes
+    and the local indexes are rebuilt afterwards.
+    """
+    from groups import clear_group, create_group_indexes
+    from materialize import create_materialized_indexes
+
+    manifest = load_manifest(path)
+    group_id = manifest["group_id"]
+    start = time.perf_counter()
+
+    if clear:
+        # An untagged snapshot clears only the untagged nodes, keeping the groups sharing the database
+        await asyncio.to_thread(clear_group, graph, group_id)
+
+    await graph.aquery(f"CREATE INDEX snapshot_key IF NOT EXISTS FOR (n:`{SNAPSHOT_LABEL}`) ON (n.`{SNAPSHOT_KEY}`)")
+    await graph.aquery("CALL db.awaitIndexes(300)")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def write(query: str, rows: list[dict]) -> None:
+        async with semaphore:
+            await graph.aquery(query, {"rows": rows})
+
+    # Node batches are independent CREATEs; relationship batches need every node in place first
+    node_writes = []
+    for entry in manifest["nodes"]:
+        rows = _decode_table(_read_table(path / entry["file"]), ["_key"], entry["columns"])
+        labels = "".join(f":`{label}`" for label in entry["labels"] + [SNAPSHOT_LABEL])
+        query = f"UNWIND $rows AS row CREATE (n{labels} {{`{SNAPSHOT_KEY}`: row._key}}) SET n += row.properties"
+        node_writes += [write(query, batch) for batch in _batches(rows, batch_size)]
+    await asyncio.gather(*node_writes)
+    nodes_s = time.perf_counter() - start
+
+    relationship_writes = []
+    for entry in manifest["relationships"]:
+        rows = _decode_table(_read_table(path / entry["file"]), ["_start", "_end"], entry["columns"])
+        query = (
+            f"UNWIND $rows AS row "
+            f"MATCH (a:`{SNAPSHOT_LABEL}` {{`{SNAPSHOT_KEY}`: row._start}}) "
+            f"MATCH (b:`{SNAPSHOT_LABEL}` {{`{SNAPSHOT_KEY}`: row._end}}) "
+            f"CREATE (a)-[r:`{entry['type']}`]->(b) SET r += row.properties"
+        )
+        relationship_writes += [write(query, batch) for batch in _batches(rows, batch_size)]
+    # Concurrent batches touching the same nodes can deadlock; managed transactions retry those
+    await asyncio.gather(*relationship_writes)
+
+    while True:
+        rows = await graph.aquery(
+            f"MATCH (n:`{SNAPSHOT_LABEL}`) WITH n LIMIT $batch_size "
+            f"REMOVE n:`{SNAPSHOT_LABEL}`, n.`{SNAPSHOT_KEY}` RETURN count(*) AS cleaned",
+            {"batch_size": batch_size},
+        )
+        if not rows or rows[0]["cleaned"] < batch_size:
+            break
+    await graph.aquery("DROP INDEX snapshot_key IF EXISTS")
+    restore_s = time.perf_counter() - start
+
+    await asyncio.to_thread(create_materialized_indexes, graph)
+    if group_id is not None:
+        await asyncio.to_thread(create_group_indexes, graph)
+
+    n_nodes = sum(entry["count"] for entry in manifest["nodes"])
+    n_relationships = sum(entry["count"] for entry in manifest["relationships"])
+    return {
+        "group_id": group_id,
+        "nodes": n_nodes,
+        "relationships": n_relationships,
+        "bytes": manifest["bytes"],
+        "nodes_s": nodes_s,
+        "restore_s": restore_s,
+        "nodes_per_s": n_nodes / max(nodes_s, 1e-9),
+        "relationships_per_s": n_relationships / max(restore_s - nodes_s, 1e-9),
+    }
+
+
+def write_admin_import_files(path: Path, output: Path) -> list[str]:
+    """Convert a snapshot to `neo4j-admin database import full` CSVs; returns the import command's arguments.
+
+    Lists, maps and temporal values are imported as their JSON strings.
+    """
+    manifest = load_manifest(path)
+    output.mkdir(parents=True, exist_ok=True)
+
+    def header(kinds: dict[str, str]) -> list[str]:
+        return [f"{name}:{_ADMIN_TYPES[kind]}" for name, kind in kinds.items()]
+
+    def cell(value: Any) -> Any:
+        return "true" if value is True else "false" if value is False else value
+
+    arguments = []
+    for entry in manifest["nodes"]:
+        file = output / f"{Path(entry['file']).name.split('.')[0]}.csv"
+        with open(file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            # An unnamed :ID column links relationships without being stored as a property
+            writer.writerow([":ID", *header(entry["columns"]), ":LABEL"])
+            for record in _read_table(path / entry["file"]):
+                writer.writerow(
+                    [record["_key"], *(cell(record.get(name)) for name in entry["columns"]), ";".join(entry["labels"])]
+                )
+        arguments.append(f"--nodes={file}")
+    for entry in manifest["relationships"]:
+        file = output / f"{Path(entry['file']).name.split('.')[0]}.csv"
+        with open(file, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow([":START_ID", ":END_ID", ":TYPE", *header(entry["columns"])])
+            for record in _read_table(path / entry["file"]):
+                writer.writerow(
+                    [record["_start"], record["_end"], entry["type"], *(cell(record.get(n)) for n in entry["columns"])]
+                )
+        arguments.append(f"--relationships={file}")
+    return arguments
+
+
+def print_restore_report(stats: dict[str, Any]) -> None:
+    print(
+        f"Restored {stats['nodes']} nodes and {stats['relationships']} relationships "
+        f"from {stats['bytes'] / 1024:.1f} KiB in {stats['restore_s']:.2f}s "
+        f"({stats['nodes_per_s']:.0f} nodes/s, {stats['relationships_per_s']:.0f} relationships/s)."
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Export / restore compact knowledge graph snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_parser = commands.add_parser("export", help="dump the graph (or one group) to a snapshot directory")
+    export_parser.add_argument("path", type=Path)
+    export_parser.add_argument("--group", default=settings.kg_group_id, help="export only this group's partition")
+    restore_parser = commands.add_parser("restore", help="load a snapshot directory into the graph")
+    restore_parser.add_argument("path", type=Path)
+    restore_parser.add_argument("--batch-size", type=int, default=5000, help="rows per UNWIND")
+    restore_parser.add_argument("--concurrency", type=int, default=4, help="UNWIND batches in flight")
+    restore_parser.add_argument("--clear", action="store_true", help="clear the untagged nodes (or the group) first")
+    admin_parser = commands.add_parser("admin-import", help="write neo4j-admin import CSVs for a snapshot")
+    admin_parser.add_argument("path", type=Path)
+    admin_parser.add_argument("output", type=Path)
+    args = parser.parse_args()
+
+    if args.command == "admin-import":
+        arguments = write_admin_import_files(args.path, args.output)
+        print("neo4j-admin database import full " + " ".join(arguments) + " neo4j")
+        return
+
+    from deps.graph_client import get_graph_client
+
+    graph_client = get_graph_client(settings, refresh_schema=False)
+    if args.command == "export":
+        manifest = export_snapshot(graph_client, args.path, args.group)
+        n_nodes = sum(entry["count"] for entry in manifest["nodes"])
+        n_relationships = sum(entry["count"] for entry in manifest["relationships"])
+        print(
+            f"Exported {n_nodes} nodes and {n_relationships} relationships to {args.path} "
+            f"({manifest['bytes'] / 1024:.1f} KiB) in {manifest['export_s']:.2f}s."
+        )
+        return
+
+    async def restore() -> dict[str, Any]:
+        try:
+            return await restore_snapshot(
+                graph_client, args.path, batch_size=args.batch_size, concurrency=args.concurrency, clear=args.clear
+            )
+        finally:
+            await graph_client.aclose()
+
+    stats = asyncio.run(restore())
+    print_restore_report(stats)
+
+    from diagnosis import build_diagnosis_index
+    from entity_linker import update_entity_index
+    from text_index import build_text_index
+
+    # The local indexes are derived from the graph, so they are rebuilt rather than snapshotted
+    update_entity_index(None, graph_client, group_id=stats["group_id"])
+    build_text_index(graph_client, group_id=stats["group_id"])
+    build_diagnosis_index(graph_client, group_id=stats["group_id"])
+    print("Rebuilt the entity, text and diagnosis indexes.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+# Offline text retrieval over graph nodes: a BM25 index of node ids and text properties (e.g.
+# DISEASE.description) plus the one-hop adjacency, saved as .npy arrays and memory-mapped on load.
+# Used when generated Cypher returns no rows, instead of another LLM round trip.
+
+import json
+import math
+import os
+import shutil
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+from entity_linker import IGNORED_LABELS, STOP_WORDS, fold, stem
+from groups import graph_cli, group_path
+from settings import settings
+
+NODES_QUERY = """
+MATCH (n)
+WHERE n.id IS NOT NULL AND ($group_id IS NULL OR n.group_id = $group_id)
+RETURN labels(n) AS labels, n.id AS id, properties(n) AS properties
+"""
+
+EDGES_QUERY = """
+MATCH (a)-[r]->(b)
+WHERE a.id IS NOT NULL AND b.id IS NOT NULL AND ($group_id IS NULL OR a.group_id = $group_id)
+RETURN a.id AS source, labels(a) AS source_labels, type(r) AS type, b.id AS target, labels(b) AS target_labels
+"""
+
+ARRAYS = ("term_indptr", "term_nodes", "term_weights", "edge_indptr", "edge_nodes", "edge_types")
+
+
+def tokenize(text: str) -> list[str]:
+    return [stem(token) for token in fold(text).split() if token not in STOP_WORDS]
+
+
+def _domain_label(labels: list[str]) -> str | None:
+    return next((label for label in labels if label not in IGNORED_LABELS), None)
+
+
+def _csr(rows: list[list], dtype) -> tuple[np.ndarray, np.ndarray]:
+    """(indptr, values) of a ragged list of lists."""
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    values = np.fromiter((value for row in rows for value in row), dtype=dtype, count=int(indptr[-1]))
+    return indptr, values
+
+
+class TextIndex:
+    """BM25 search over node text, returning nodes with their one-hop neighbourhood.
+
+    Postings are stored term-major with BM25 weights precomputed, so scoring a
+    query is a scatter-add over the postings of its terms followed by a top-k.
+    """
+
+    def __init__(self, nodes: list[list[str]], vocabulary: list[str], relationship_types: list[str], arrays: dict):
+        self.nodes = nodes  # [label, id, text]
+        self.vocabulary = {term: i for i, term in enumerate(vocabulary)}
+        self.relationship_types = relationship_types
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_graph(cls, graph, k1: float = 1.5, b: float = 0.75, group_id: str | None = None) -> "TextIndex":
+        nodes, node_ids, documents = [], {}, []
+        for row in graph.query(NODES_QUERY, {"group_id": group_id}):
+            label = _domain_label(row["labels"])
+            if label is None or (label, row["id"]) in node_ids:
+                continue
+            text = " ".join(
+                str(value) for key, value in row["properties"].items() if key != "id" and isinstance(value, str)
+            )
+            node_ids[(label, row["id"])] = len(nodes)
+            nodes.append([label, row["id"], text])
+            # The id is counted twice: it names the node, properties only describe it
+            documents.append(Counter(tokenize(f"{row['id']} {row['id']} {label} {text}")))
+
+        # BM25 weight of every (term, node) pair
+        vocabulary = sorted({term for document in documents for term in document})
+        term_ids = {term: i for i, term in enumerate(vocabulary)}
+        lengths = np.array([sum(document.values()) for document in documents], dtype=np.float32)
+        average_length = float(lengths.mean()) if len(lengths) else 1.0
+        postings = [[] for _ in vocabulary]
+        for node, document in enumerate(documents):
+            for term, frequency in document.items():
+                postings[term_ids[term]].append((node, frequency))
+
+        n_nodes = len(nodes)
+        weighted = []
+        for term_postings in postings:
+            idf = math.log(1 + (n_nodes - len(term_postings) + 0.5) / (len(term_postings) + 0.5))
+            weighted.append(
+                [
+                    (node, idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * lengths[node] / average_length)))
+                    for node, frequency in term_postings
+                ]
+            )
+        term_indptr, term_nodes = _csr([[node for node, _ in row] for row in weighted], np.int32)
+        _, term_weights = _csr([[weight for _, weight in row] for row in weighted], np.float32)
+
+        # One-hop adjacency; edge types are stored as 2 * relationship type + (1 if incoming)
+        relationship_types, type_ids, adjacency = [], {}, [[] for _ in nodes]
+        for row in graph.query(EDGES_QUERY, {"group_id": group_id}):
+            source = node_ids.get((_domain_label(row["source_labels"]), row["source"]))
+            target = node_ids.get((_domain_label(row["target_labels"]), row["target"]))
+            if source is None or target is None:
+                continue
+            if row["type"] not in type_ids:
+                type_ids[row["type"]] = len(relationship_types)
+                relationship_types.append(row["type"])
+            adjacency[source].append((target, 2 * type_ids[row["type"]]))
+            adjacency[target].append((source, 2 * type_ids[row["type"]] + 1))
+        edge_indptr, edge_nodes = _csr([[node for node, _ in row] for row in adjacency], np.int32)
+        _, edge_types = _csr([[edge_type for _, edge_type in row] for row in adjacency], np.int32)
+
+        arrays = {
+            "term_indptr": term_indptr,
+            "term_nodes": term_nodes,
+            "term_weights": term_weights,
+            "edge_indptr": edge_indptr,
+            "edge_nodes": edge_nodes,
+            "edge_types": edge_types,
+        }
+        return cls(nodes, vocabulary, relationship_types, arrays)
+
+    def save(self, path: Path = settings.text_index_dir) -> None:
+        """Write the index to a new directory next to `path` and atomically point the `path` symlink at it.
+
+        Files a running process has memory-mapped are never rewritten; the version it
+        loaded is kept until the next save replaces its successor.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        version = Path(tempfile.mkdtemp(prefix=f".{path.name}-", dir=path.parent))
+        for name in ARRAYS:
+            np.save(version / f"{name}.npy", getattr(self, name))
+        meta = {"nodes": self.nodes, "vocabulary": list(self.vocabulary), "relationship_types": self.relationship_types}
+        (version / "meta.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+        previous = path.resolve() if path.is_symlink() else None
+        if path.is_dir() and not path.is_symlink():
+            # Saved before indexes were versioned; a directory cannot be replaced by a symlink
+            shutil.rmtree(path)
+        link = version.with_name(f"{version.name}.link")
+        link.symlink_to(version.name)
+        os.replace(link, path)
+
+        for old in path.parent.glob(f".{path.name}-*"):
+            if old.is_dir() and not old.is_symlink() and old not in (version, previous):
+                shutil.rmtree(old, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path: Path = settings.text_index_dir) -> "TextIndex":
+        """Load the index with its arrays memory-mapped (paged in on first use, shared between processes)."""
+        # Metadata and arrays come from the same version even if a save swaps it meanwhile
+        path = Path(path).resolve()
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r") for name in ARRAYS}
+        return cls(meta["nodes"], meta["vocabulary"], meta["relationship_types"], arrays)
+
+    def search(self, query: str, top_k: int = 5) -> list[tuple[int, float]]:
+        """(node index, BM25 score) of the best matching nodes."""
+        terms = [self.vocabulary[term] for term in set(tokenize(query)) if term in self.vocabulary]
+        if not terms:
+            return []
+
+        scores = np.zeros(len(self.nodes), dtype=np.float32)
+        for term in terms:
+            start, end = self.term_indptr[term], self.term_indptr[term + 1]
+            np.add.at(scores, self.term_nodes[start:end], self.term_weights[start:end])
+
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k)[:top_k]]
+        candidates = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return [(int(node), float(scores[node])) for node in candidates]
+
+    def neighbours(self, node: int, limit: int = 20) -> list[str]:
+        """One-hop neighbourhood of a node, as `-[TYPE]-> (Label id)` strings."""
+        start, end = self.edge_indptr[node], self.edge_indptr[node + 1]
+        neighbours = []
+        for other, edge_type in zip(self.edge_nodes[start:end][:limit], self.edge_types[start:end][:limit]):
+            relationship = self.relationship_types[edge_type // 2]
+            label, node_id, _ = self.nodes[other]
+            arrow = f"<-[{relationship}]-" if edge_type % 2 else f"-[{relationship}]->"
+            neighbours.append(f"{arrow} ({label} {node_id})")
+        return neighbours
+
+    def search_context(
+        self, query: str, top_k: int = 3, max_neighbours: int = 20, min_relative_score: float = 0.1
+    ) -> list[dict]:
+        """Context rows for the QA prompt: the best matching nodes, their text and their neighbourhoods.
+
+        Hits scoring below `min_relative_score` of the best hit are dropped.
+        """
+        hits = self.search(query, top_k=top_k)
+        context = []
+        for node, score in hits:
+            if score < min_relative_score * hits[0][1]:
+                break
+            label, node_id, text = self.nodes[node]
+            row = {"label": label, "id": node_id, "score": round(score, 4)}
+            if text:
+                row["text"] = text
+            row["neighbours"] = self.neighbours(node, limit=max_neighbours)
+            context.append(row)
+        return context
+
+
+def build_text_index(graph, path: Path = settings.text_index_dir, group_id: str | None = None) -> TextIndex:
+    """Rebuild the text index from the graph (of `group_id` only, saved per group) and save it."""
+    path = group_path(path, group_id)
+    index = TextIndex.from_graph(graph, group_id=group_id)
+    index.save(path)
+    return TextIndex.load(path)
+
+
+def load_text_index(graph, path: Path = settings.text_index_dir, group_id: str | None = None) -> TextIndex:
+    """Load the saved text index (of `group_id`), building it from the graph the first time."""
+    if (group_path(path, group_id) / "meta.json").exists():
+        return TextIndex.load(group_path(path, group_id))
+    return build_text_index(graph, path, group_id)
+
+
+if __name__ == "__main__":
+    graph_client, group_id = graph_cli("Rebuild the BM25 text index from the knowledge graph.")
+    index = build_text_index(graph_client, group_id=group_id)
+    print(f"Indexed {len(index.nodes)} nodes, {len(index.vocabulary)} terms.")
+
+    question = "How does the disease damage the roots and what happens to yield?"
+    start = time.perf_counter()
+    context = index.search_context(question)
+    print(f"{question}\n{context}\n({(time.perf_counter() - start) * 1e3:.2f} ms)")
@@ -1,26 +1,196 @@
+import hashlib
+import json
+import re
+from pathlib import Path
+
 import pandas as pd
 
+from graph_buffer import GraphBuffer
+from settings import settings
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow is optional; fall back to pickle caches
+    feather = None
+
+
+def _file_hash(file_path: str) -> str:
+    """Return the sha256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _cache_source_key(file_path: str, sheet_name: str, ignored_column_names: list[str]) -> str:
+    """Key identifying a (workbook path, sheet, ignored columns) source regardless of its content."""
+    return json.dumps([str(Path(file_path).resolve()), sheet_name, sorted(ignored_column_names)])
+
+
+def _read_cache_index(cache_dir: Path) -> dict:
+    index_path = cache_dir / "index.json"
+    if not index_path.exists():
+        return {}
+    return json.loads(index_path.read_text(encoding="utf-8"))
+
+
+def _write_cache_index(cache_dir: Path, index: dict) -> None:
+    (cache_dir / "index.json").write_text(json.dumps(index, indent=2), encoding="utf-8")
+
+
+def _read_cached_sheet(cache_path: Path) -> pd.DataFrame:
+    if cache_path.suffix == ".feather":
+        # Memory-mapped read: columns are paged in lazily instead of parsed
+        return feather.read_table(cache_path, memory_map=True).to_pandas()
+    return pd.read_pickle(cache_path)
+
+
+def _write_cached_sheet(df: pd.DataFrame, cache_base: Path) -> Path:
+    if feather is not None:
+        cache_path = cache_base.with_suffix(".feather")
+        try:
+            feather.write_feather(df.reset_index(drop=True), cache_path, compression="uncompressed")
+            return cache_path
+        except (TypeError, ValueError) as e:  # e.g. mixed-type object columns Arrow cannot encode
+            print(f"Feather cache unavailable for {cache_base.name} ({e}); using pickle instead.")
+            cache_path.unlink(missing_ok=True)
+
+    cache_path = cache_base.with_suffix(".pkl")
+    df.to_pickle(cache_path)
+    return cache_path
+
+
+def load_dataframe_from_excel(
+    file_path: str,
+    sheet_name: str,
+    ignored_column_names: list[str] = None,
+    use_cache: bool = True,
+    cache_dir: str | Path | None = None,
+) -> pd.DataFrame:
+    """Load an Excel sheet as a DataFrame, caching the parsed sheet in a columnar file.
+
+    The cache is keyed by the workbook's content hash, the sheet name and the ignored
+    columns, so an edited workbook is parsed again while repeated loads of the same
+    sheet are served from the (memory-mapped) cache instead of openpyxl.
+    """
+    if ignored_column_names is None:
+        ignored_column_names = []
+
+    if not use_cache:
+        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        return df.drop(columns=[c for c in ignored_column_names if c in df.columns])
+
+    cache_dir = Path(cache_dir or settings.excel_cache_dir)
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    file_hash = _file_hash(file_path)
+    key = hashlib.sha256(
+        json.dumps([file_hash, sheet_name, sorted(ignored_column_names)]).encode("utf-8")
+    ).hexdigest()[:16]
+    cache_base = cache_dir / f"{Path(file_path).stem}-{key}"
+
+    df = None
+    for suffix in (".feather", ".pkl"):
+        cache_path = cache_base.with_suffix(suffix)
+        if cache_path.exists() and (suffix != ".feather" or feather is not None):
+            df = _read_cached_sheet(cache_path)
+            break
+    if df is None:
+        df = pd.read_excel(file_path, sheet_name=sheet_name)
+        df = df.drop(columns=[c for c in ignored_column_names if c in df.columns])
+        cache_path = _write_cached_sheet(df, cache_base)
+
+    # Remember the version loaded last (hits included, e.g. a workbook reverted to an earlier version)
+    # so `diff_excel_rows` diffs against it
+    index = _read_cache_index(cache_dir)
+    source_key = _cache_source_key(file_path, sheet_name, ignored_column_names)
+    entry = {"file_hash": file_hash, "cache_file": cache_path.name}
+    if index.get(source_key) != entry:
+        index[source_key] = entry
+        _write_cache_index(cache_dir, index)
+
+    return df
+
+
+def diff_excel_rows(
+    file_path: str,
+    sheet_name: str,
+    ignored_column_names: list[str] = None,
+    key_column: str | None = None,
+    cache_dir: str | Path | None = None,
+    update_cache: bool = True,
+) -> dict[str, pd.DataFrame]:
+    """Row-level diff between the last cached version of a sheet and the workbook on disk.
+
+    Rows are matched on `key_column` (by position when not given). Returns a dict with
+    `added`, `removed`, `changed` and `unchanged` DataFrames taken from the new version
+    (`removed` comes from the cached one). The new version becomes the cached one
+    unless `update_cache` is False.
+    """
+    if ignored_column_names is None:
+        ignored_column_names = []
+
+    cache_dir = Path(cache_dir or settings.excel_cache_dir)
+    entry = _read_cache_index(cache_dir).get(_cache_source_key(file_path, sheet_name, ignored_column_names))
+    previous_path = cache_dir / entry["cache_file"] if entry else None
+
+    if previous_path is not None and previous_path.exists():
+        old_df = _read_cached_sheet(previous_path)
+    else:
+        old_df = None
+
+    new_df = load_dataframe_from_excel(
+        file_path, sheet_name, ignored_column_names, use_cache=update_cache, cache_dir=cache_dir
+    )
+    if old_df is None:
+        old_df = new_df.iloc[0:0]
+
+    if key_column is not None:
+        old_df = old_df.set_index(key_column, drop=False)
+        new_df = new_df.set_index(key_column, drop=False)
+
+    old_hashes = pd.util.hash_pandas_object(old_df.astype(str), index=False)
+    new_hashes = pd.util.hash_pandas_object(new_df.astype(str), index=False)
+    old_hashes.index, new_hashes.index = old_df.index, new_df.index
+
+    added = ~new_df.index.isin(old_df.index)
+    removed = ~old_df.index.isin(new_df.index)
+    common = new_df.index[~added]
+    changed_keys = common[new_hashes.loc[common].to_numpy() != old_hashes.loc[common].to_numpy()]
+    changed = new_df.index.isin(changed_keys)
+
+    return {
+        "added": new_df[added],
+        "removed": old_df[removed],
+        "changed": new_df[changed],
+        "unchanged": new_df[~added & ~changed],
+    }
+
 
 def load_document_from_excel(
     file_path: str,
     sheet_name: str,
     ignored_column_names: list[str] = None,
+    use_cache: bool = True,
 ) -> list[str]:
     """Load Excel file and convert rows to text format."""
     if ignored_column_names is None:
         ignored_column_names = []
 
-    df = pd.read_excel(file_path, sheet_name=sheet_name)
+    df = load_dataframe_from_excel(file_path, sheet_name, ignored_column_names, use_cache=use_cache)
+
+    return dataframe_to_documents(df)
 
+
+def dataframe_to_documents(df: pd.DataFrame) -> list[str]:
+    """Convert DataFrame rows to the numbered `column: value` text format."""
     row_infos = []
     for _, row in df.iterrows():
         text_parts = []
 
         column_id = 0
         for column in df.columns:
-            if column in ignored_column_names:
-                continue
-
             if pd.notna(row[column]) and str(row[column]).strip():
                 column_id += 1
                 text_parts.append(f"{column_id}. `{column}`: {row[column]}")
@@ -30,3 +200,43 @@ def load_document_from_excel(
         row_infos.append(full_text)
 
     return row_infos
+
+
+def split_document(document: str, max_tokens: int, count_tokens) -> list[str]:
+    """Split a row document into parts of at most `max_tokens`, cutting between its numbered columns.
+
+    The first column (the row's name) is repeated in every part so each part can be
+    extracted on its own; a single column larger than the budget is truncated.
+    """
+    blocks = [block for block in re.split(r"\n(?=\d+\. `)", document) if block.strip()]
+    if len(blocks) <= 1 or count_tokens(document) <= max_tokens:
+        return [document]
+
+    header, blocks = blocks[0], blocks[1:]
+    parts, current = [], [header]
+    for block in blocks:
+        candidate = "\n".join(current + [block])
+        if count_tokens(candidate) <= max_tokens:
+            current.append(block)
+            continue
+        if len(current) > 1:
+            parts.append("\n".join(current))
+        current = [header, block]
+        tokens = count_tokens("\n".join(current))
+        if tokens > max_tokens:
+            keep_chars = int(len(block) * max(max_tokens - count_tokens(header), 0) / tokens)
+            current = [header, block[:keep_chars]]
+    parts.append("\n".join(current))
+    return parts
+
+
+def merge_graph_documents(graph_documents: list, source=None):
+    """Merge the graph documents extracted from the parts of one row, de-duplicating nodes and relationships."""
+    return GraphBuffer.from_graph_documents(graph_documents).to_graph_document(
+        source=source or graph_documents[0].source
+    )
+
+
+def validate_graph_document(graph_document, node_types: list[dict], allowed_relationships: list[tuple]) -> list[str]:
+    """Check an extracted graph document against the schema; return the problems found (empty when valid)."""
+    return GraphBuffer.from_graph_documents([graph_document]).validate(node_types, allowed_relationships)
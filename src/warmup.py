@@ -0,0 +1,111 @@
+# Startup warm-up for the QA service. Right after a deploy every cold cost (driver connections,
+# schema introspection, LLM TLS handshakes, uncached Cypher generation) lands on the first users;
+# the warm-up pays them before the service reports ready: it opens pooled graph connections,
+# refreshes the schema and pre-runs canonical questions so their LLM calls are cached
+# (`llm_cache_max_size`). `Warmup.ready` is the readiness signal.
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from settings import ProjectSettings, settings
+
+
+class Warmup:
+    """Runs the warm-up steps once (in the background with `start`) and holds the readiness signal.
+
+    The graph is retried with backoff until `qa_warmup_graph_deadline_s` passes, after
+    which the service stays not ready; a failing question is recorded and skipped.
+    """
+
+    def __init__(self, chain, graph, questions: list[str], settings: ProjectSettings = settings) -> None:
+        self.chain = chain
+        self.graph = graph
+        self.questions = questions
+        self.settings = settings
+        self.ready = threading.Event()
+        # Step name -> {"seconds": ..., and "error" when it failed}
+        self.steps: dict[str, dict] = {}
+        self.question_seconds: dict[str, float] = {}
+        self.question_errors: dict[str, str] = {}
+
+    def _step(self, name: str, fn) -> bool:
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            self.steps[name] = {"seconds": round(time.perf_counter() - start, 3), "error": str(e)}
+            print(f"[warmup] {name} failed: {e}")
+            return False
+        self.steps[name] = {"seconds": round(time.perf_counter() - start, 3)}
+        print(f"[warmup] {name}: {self.steps[name]['seconds']:.2f}s")
+        return True
+
+    def _open_pool(self) -> None:
+        # Concurrent sessions make the driver open (and keep) that many connections
+        n_connections = max(self.settings.qa_warmup_pool_connections, 1)
+        with ThreadPoolExecutor(max_workers=n_connections) as executor:
+            list(executor.map(lambda _: self.graph.query("RETURN 1"), range(n_connections)))
+
+    def _connect(self) -> bool:
+        """Open the graph pool, retrying with exponential backoff until the deadline passes."""
+        deadline_s = self.settings.qa_warmup_graph_deadline_s
+        deadline = None if deadline_s is None else time.monotonic() + deadline_s
+        delay = self.settings.qa_warmup_graph_retry_s
+        attempts = 1
+        while not self._step("graph_pool", self._open_pool):
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                self.steps["graph_pool"]["attempts"] = attempts
+                return False
+            print(f"[warmup] retrying graph_pool in {delay:.1f}s")
+            time.sleep(delay if remaining is None else min(delay, remaining))
+            delay = min(delay * 2, self.settings.qa_warmup_graph_retry_max_s)
+            attempts += 1
+        self.steps["graph_pool"]["attempts"] = attempts
+        return True
+
+    def _refresh_schema(self) -> None:
+        self.graph.refresh_schema()
+        self.chain.graph_schema = self.graph.get_schema
+
+    def _run_question(self, question: str) -> None:
+        start = time.perf_counter()
+        try:
+            self.chain.invoke({"query": question})
+        except Exception as e:
+            self.question_errors[question] = str(e)
+        finally:
+            self.question_seconds[question] = round(time.perf_counter() - start, 3)
+
+    def _run_questions(self) -> None:
+        with ThreadPoolExecutor(max_workers=max(self.settings.qa_warmup_concurrency, 1)) as executor:
+            list(executor.map(self._run_question, self.questions))
+        if self.question_errors:
+            print(f"[warmup] {len(self.question_errors)} of {len(self.questions)} questions failed")
+
+    def run(self) -> bool:
+        """Run every step, then mark the service ready unless the graph could not be reached in time."""
+        start = time.perf_counter()
+        if not self._connect():
+            return False
+        if self.settings.qa_warmup_refresh_schema:
+            self._step("schema", self._refresh_schema)
+        if self.questions:
+            self._step("questions", self._run_questions)
+        self.ready.set()
+        print(f"[warmup] ready after {time.perf_counter() - start:.2f}s")
+        return True
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.run, name="qa-warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> dict:
+        return {
+            "ready": self.ready.is_set(),
+            "steps": self.steps,
+            "questions": self.question_seconds,
+            "question_errors": self.question_errors,
+        }
@@ -0,0 +1,7 @@
+import os
+import sys
+from pathlib import Path
+
+# Modules import each other flat from src/, as when they run as scripts
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+os.environ.setdefault("OPENAI_API_KEY", "test")
@@ -0,0 +1,40 @@
+import asyncio
+import random
+import time
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import Field
+
+
+class HeavyTailFakeChatModel(BaseChatModel):
+    """Local fake chat model with Pareto-distributed latency, for exercising hedging and deadlines."""
+
+    model_name: str = "heavy-tail-fake"
+    scale_s: float = 0.05
+    alpha: float = 1.5
+    max_latency_s: float = 10.0
+    response: str = "ok"
+    # Latencies served in order before falling back to the Pareto distribution, for deterministic tests
+    latencies_s: list[float] = Field(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "heavy-tail-fake"
+
+    def _latency(self) -> float:
+        if self.latencies_s:
+            return self.latencies_s.pop(0)
+        return min(self.scale_s * random.paretovariate(self.alpha), self.max_latency_s)
+
+    def _result(self) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.response))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self._latency())
+        return self._result()
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        await asyncio.sleep(self._latency())
+        return self._result()
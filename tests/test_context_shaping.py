@@ -0,0 +1,52 @@
+from neo4j.graph import Graph, Node, Path
+
+from context_shaping import shape_context
+from deps.graph_client import GraphNode, typed_rows
+
+
+class FakeRecord(dict):
+    pass
+
+
+def make_graph():
+    graph = Graph()
+    disease = Node(graph, "1", 1, ["Disease"], {"id": "Root Rot", "n_varieties": 4, "degree": 9})
+    crop = Node(graph, "2", 2, ["Crop"], {"id": "Durian"})
+    relationship = graph.relationship_type("AFFECTS")(graph, "3", 3, {})
+    relationship._start_node, relationship._end_node = disease, crop
+    return disease, crop, relationship
+
+
+def test_typed_rows_keep_nodes_apart_from_maps():
+    disease, crop, relationship = make_graph()
+    rows = typed_rows([FakeRecord(d=disease, p=Path(disease, relationship), m={"id": "Root Rot"})])
+
+    assert isinstance(rows[0]["d"], GraphNode) and rows[0]["d"].labels == {"Disease"}
+    assert rows[0]["p"] == [{"id": "Root Rot", "n_varieties": 4, "degree": 9}, "AFFECTS", {"id": "Durian"}]
+    assert not isinstance(rows[0]["m"], GraphNode)
+
+
+def test_typed_rows_sanitize_drops_oversized_lists():
+    rows = typed_rows([FakeRecord(embedding=[0.0] * 200, tags=["a"])], sanitize=True)
+    assert rows == [{"tags": ["a"]}]
+
+
+def test_map_projection_with_id_keeps_its_values():
+    context = [{"d": {"id": "Root Rot", "n_varieties": 4}}]
+    assert shape_context(context, "Which disease affects the most varieties?") == context
+
+
+def test_materialized_properties_are_kept_when_the_query_references_them():
+    disease, _, _ = make_graph()
+    context = typed_rows([FakeRecord(d=disease)])
+    query = "MATCH (d:Disease) RETURN d ORDER BY d.n_varieties DESC LIMIT 1"
+
+    shaped = shape_context(context, "Which disease affects the most varieties?", query=query)
+
+    assert shaped == [{"d": "Root Rot"}, {"nodes": {"Root Rot": {"n_varieties": 4}}}]
+
+
+def test_unreferenced_materialized_properties_are_dropped_from_nodes():
+    disease, _, _ = make_graph()
+    shaped = shape_context(typed_rows([FakeRecord(d=disease)]), "Which disease?", query="MATCH (d:Disease) RETURN d")
+    assert shaped == [{"d": "Root Rot"}]
@@ -0,0 +1,34 @@
+import sys
+
+import evaluate
+import retrieve
+from settings import settings
+
+
+def test_cassette_flags_reach_the_chain_without_changing_global_settings(monkeypatch, tmp_path):
+    built = {}
+
+    class FakeChain:
+        pass
+
+    def build_chain(settings):
+        built["settings"] = settings
+        return FakeChain()
+
+    async def run_questions(chain, questions, concurrency):
+        return [], 0.0
+
+    monkeypatch.setattr(retrieve, "build_chain", build_chain)
+    monkeypatch.setattr(evaluate, "run_questions", run_questions)
+    monkeypatch.setattr(evaluate, "load_questions", lambda path: [])
+    monkeypatch.setattr(evaluate, "summarize", lambda results, wall_time_s=None: {})
+    monkeypatch.setattr(evaluate, "print_summary", lambda summary: None)
+    cassette = tmp_path / "cassette.jsonl"
+    argv = ["evaluate.py", "questions.jsonl", "--cassette", str(cassette), "--cassette-mode", "replay"]
+    monkeypatch.setattr(sys, "argv", argv)
+
+    evaluate.main()
+
+    assert (built["settings"].llm_cassette_mode, built["settings"].llm_cassette_path) == ("replay", cassette)
+    assert built["settings"].llm.llm_cassette_mode == "replay"
+    assert settings.llm_cassette_mode is None
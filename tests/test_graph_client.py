@@ -0,0 +1,132 @@
+import asyncio
+
+import neo4j
+import pytest
+
+from deps.graph_client import AsyncNeo4jGraph
+
+
+class FakeRecord:
+    def __init__(self, data: dict):
+        self._data = data
+
+    def data(self) -> dict:
+        return self._data
+
+    def items(self):
+        return self._data.items()
+
+
+class FakeResult:
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for row in self.rows:
+            yield FakeRecord(row)
+
+
+class FakeTransaction:
+    def __init__(self):
+        self.runs = []
+
+    async def run(self, query, parameters=None):
+        # Like the driver's transactions: `Query` objects are only accepted by `session.run`
+        if isinstance(query, neo4j.Query):
+            raise ValueError("Query object is only supported for session.run")
+        self.runs.append((query, parameters))
+        return FakeResult([{"n": len(self.runs)}])
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute_write(self, work):
+        self.driver.work = work
+        return await work(self.driver.tx)
+
+
+class FakeDriver:
+    def __init__(self, *args, **kwargs):
+        self.tx = FakeTransaction()
+        self.work = None
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+    def session(self, database=None):
+        return FakeSession(self)
+
+
+@pytest.fixture
+def graph(monkeypatch):
+    # Skip Neo4jGraph.__init__, which connects and introspects the schema
+    graph = AsyncNeo4jGraph.__new__(AsyncNeo4jGraph)
+    graph.timeout = 30.0
+    graph.sanitize = False
+    graph._database = "neo4j"
+    driver = FakeDriver()
+
+    async def get_async_driver():
+        return driver
+
+    monkeypatch.setattr(graph, "_get_async_driver", get_async_driver)
+    return graph, driver
+
+
+def test_aexecute_write_runs_plain_queries_in_one_transaction(graph):
+    graph, driver = graph
+    results = asyncio.run(graph.aexecute_write([("RETURN 1", None), ("RETURN $x", {"x": 2})]))
+
+    assert driver.tx.runs == [("RETURN 1", {}), ("RETURN $x", {"x": 2})]
+    assert results == [[{"n": 1}], [{"n": 2}]]
+
+
+def test_aexecute_write_sets_timeout_on_unit_of_work(graph):
+    graph, driver = graph
+    asyncio.run(graph.aexecute_write([("RETURN 1", None)]))
+
+    assert driver.work.timeout == 30.0
+
+
+def test_aquery_sanitizes_oversized_lists(graph):
+    graph, driver = graph
+    graph.sanitize = True
+
+    async def execute_query(query, **kwargs):
+        return [FakeRecord({"id": "Root Rot", "embedding": [0.0] * 128, "tags": ["a"]})], None, None
+
+    driver.execute_query = execute_query
+    assert asyncio.run(graph.aquery("MATCH (n) RETURN n")) == [{"id": "Root Rot", "tags": ["a"]}]
+
+
+def test_async_driver_per_event_loop_is_closed(monkeypatch):
+    graph = AsyncNeo4jGraph.__new__(AsyncNeo4jGraph)
+    graph._url, graph._auth, graph._driver_config = "neo4j://localhost", None, {}
+    graph._async_drivers = {}
+    monkeypatch.setattr(neo4j.AsyncGraphDatabase, "driver", FakeDriver)
+
+    first = asyncio.run(graph._get_async_driver())
+    # A new `asyncio.run` gets its own driver, and the one of the ended loop is closed
+    second = asyncio.run(graph._get_async_driver())
+    assert second is not first and first.closed and not second.closed
+
+    async def reuse_then_close():
+        driver = await graph._get_async_driver()
+        assert await graph._get_async_driver() is driver
+        await graph.aclose()
+        return driver
+
+    third = asyncio.run(reuse_then_close())
+    assert second.closed and third.closed and not graph._async_drivers
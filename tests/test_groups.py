@@ -0,0 +1,56 @@
+from groups import clear_group, scope_query
+
+
+def test_scope_query_scopes_unlabelled_nodes_of_relationship_patterns():
+    assert scope_query("MATCH (a)-[:OCCURS_IN]->(b) RETURN a.id, b.id") == (
+        "MATCH (a {group_id: $group_id})-[:OCCURS_IN]->(b {group_id: $group_id}) RETURN a.id, b.id"
+    )
+
+
+def test_scope_query_scopes_labelled_anonymous_and_predicate_nodes():
+    query = "MATCH (d:Disease {id: 'Root Rot'})-[*1..2]-() WHERE NOT (d)-[:X]->() RETURN d.id"
+    assert scope_query(query) == (
+        "MATCH (d:Disease {id: 'Root Rot', group_id: $group_id})-[*1..2]-({group_id: $group_id}) "
+        "WHERE NOT (d {group_id: $group_id})-[:X]->({group_id: $group_id}) RETURN d.id"
+    )
+
+
+def test_scope_query_scopes_every_pattern_of_a_match_clause():
+    assert scope_query("MATCH (a:Crop), (b) RETURN a, b") == (
+        "MATCH (a:Crop {group_id: $group_id}), (b {group_id: $group_id}) RETURN a, b"
+    )
+
+
+def test_scope_query_leaves_expressions_and_literals_alone():
+    query = "MATCH (n) WHERE n.id = '(x)' RETURN count(n), (n.degree) - (m)"
+    assert scope_query(query) == "MATCH (n {group_id: $group_id}) WHERE n.id = '(x)' RETURN count(n), (n.degree) - (m)"
+
+
+class FakeGraph:
+    def __init__(self, labels: list[str], to_delete: int):
+        self.labels = labels
+        self.to_delete = to_delete
+        self.queries = []
+
+    def query(self, query: str, params: dict | None = None) -> list[dict]:
+        self.queries.append((query, params))
+        if query.startswith("CALL db.labels()"):
+            return [{"label": label} for label in self.labels]
+        deleted = min(self.to_delete, params["batch_size"])
+        self.to_delete -= deleted
+        return [{"deleted": deleted}]
+
+
+def test_clear_group_without_group_only_deletes_untagged_nodes_in_batches():
+    graph = FakeGraph(labels=["Disease"], to_delete=5)
+    assert clear_group(graph, None, batch_size=2) == 5
+    assert len(graph.queries) == 3
+    assert all("n.`group_id` IS NULL" in query and "LIMIT $batch_size" in query for query, _ in graph.queries)
+
+
+def test_clear_group_deletes_the_group_label_by_label():
+    graph = FakeGraph(labels=["Disease", "Crop"], to_delete=3)
+    assert clear_group(graph, "durian", batch_size=10) == 3
+    deletes = [(query, params) for query, params in graph.queries if "DETACH DELETE" in query]
+    assert [query.split(")")[0] for query, _ in deletes] == ["MATCH (n:`Disease`", "MATCH (n:`Crop`"]
+    assert all(params["group_id"] == "durian" for _, params in deletes)
@@ -0,0 +1,63 @@
+from langchain_community.graphs.graph_document import GraphDocument, Node, Relationship
+from langchain_core.documents import Document
+
+from graph_buffer import GraphBuffer
+from ingestion_plan import IngestionPlan, PlannedCall
+
+
+def row_graph(row: int) -> GraphDocument:
+    disease = Node(id=f"Disease {row}", type="Disease")
+    crop = Node(id="Durian", type="Crop")
+    symptom = Node(id=f"Symptom {row}", type="Symptom")
+    return GraphDocument(
+        nodes=[disease, crop, symptom],
+        relationships=[
+            Relationship(source=crop, target=disease, type="AFFECTED_BY"),
+            Relationship(source=disease, target=symptom, type="HAS_SYMPTOM"),
+        ],
+        source=Document(page_content=f"row {row}"),
+    )
+
+
+def rule_graph(row: int) -> GraphDocument:
+    disease = Node(id=f"Disease {row}", type="Disease")
+    crop = Node(id="Durian", type="Crop")
+    return GraphDocument(
+        nodes=[disease, crop],
+        relationships=[Relationship(source=crop, target=disease, type="AFFECTED_BY")],
+        source=Document(page_content=f"row {row}"),
+    )
+
+
+def test_write_batches_merges_rule_and_replayed_output():
+    plan = IngestionPlan(n_rows=2, calls=[])
+    for row in range(2):
+        plan.rule_buffer.add_graph_document(rule_graph(row))
+        call = PlannedCall(row=row, model="m", prompt_tokens=10)
+        plan.add_replayed(call, row_graph(row))
+        plan.calls.append(call)
+
+    # Durian, two diseases and two symptoms in 3 label and 2 pattern batches;
+    # each row's rule edge is also extracted by the LLM
+    assert plan.write_batches() == (5, 5, 4)
+
+
+def test_write_batches_extrapolates_per_call_counts():
+    plan = IngestionPlan(n_rows=4, calls=[])
+    for row in range(4):
+        call = PlannedCall(row=row, model="m", prompt_tokens=10)
+        if row < 2:
+            plan.add_replayed(call, row_graph(row))
+        plan.calls.append(call)
+
+    known = GraphBuffer.from_graph_documents(row_graph(row) for row in range(2))
+    statements, n_nodes, n_relations = plan.write_batches()
+    # Two more calls of three nodes and two relationships each, Durian included
+    assert (n_nodes, n_relations) == (known.n_nodes + 6, known.n_relationships + 4)
+    assert statements == 5
+
+
+def test_write_batches_unknown_without_replayed_calls():
+    plan = IngestionPlan(n_rows=1, calls=[PlannedCall(row=0, model="m", prompt_tokens=10)])
+    plan.rule_buffer.add_graph_document(rule_graph(0))
+    assert plan.write_batches() is None
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+
+from deps.llm_client import find_proxy, get_llm_client
+from deps.llm_hedging import HedgedChatModel, HedgeStats
+from fakes import HeavyTailFakeChatModel
+from settings import ProjectSettings
+
+
+class RecordingFakeChatModel(HeavyTailFakeChatModel):
+    """Heavy-tail fake that records the calls it served, lost to cancellation, and their run managers."""
+
+    events: list = []
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        self.events.append(("start", run_manager is not None))
+        try:
+            result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+        except asyncio.CancelledError:
+            self.events.append(("cancelled", run_manager is not None))
+            raise
+        self.events.append(("done", run_manager is not None))
+        return result
+
+
+def make_hedged(latencies_s: list[float], **kwargs) -> tuple[HedgedChatModel, RecordingFakeChatModel]:
+    fake = RecordingFakeChatModel(latencies_s=latencies_s, events=[])
+    return HedgedChatModel(llm=fake, stats=HedgeStats(), **kwargs), fake
+
+
+def test_deadline_raises_and_cancels_the_attempt():
+    hedged, fake = make_hedged([5.0], timeout_s=0.1)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        asyncio.run(hedged.ainvoke("ping"))
+
+    assert time.perf_counter() - start < 1.0
+    assert [event for event, _ in fake.events] == ["start", "cancelled"]
+    assert hedged.stats.timeouts == 1
+
+
+def test_sync_deadline_cancels_the_attempt_instead_of_holding_a_thread():
+    hedged, fake = make_hedged([5.0], timeout_s=0.1)
+    start = time.perf_counter()
+    with pytest.raises(TimeoutError):
+        hedged.invoke("ping")
+    time.sleep(0.05)
+
+    assert time.perf_counter() - start < 1.0
+    assert [event for event, _ in fake.events] == ["start", "cancelled"]
+
+
+@pytest.mark.parametrize("sync", [False, True])
+def test_hedge_wins_and_the_slow_attempt_is_cancelled(sync):
+    hedged, fake = make_hedged([5.0, 0.01], timeout_s=2.0, hedge_after_s=0.05, hedge_budget=1.0)
+    start = time.perf_counter()
+    result = hedged.invoke("ping") if sync else asyncio.run(hedged.ainvoke("ping"))
+    time.sleep(0.05)
+
+    assert result.content == "ok"
+    assert time.perf_counter() - start < 1.0
+    assert sorted(event for event, _ in fake.events) == ["cancelled", "done", "start", "start"]
+    assert hedged.stats.hedged == 1 and hedged.stats.hedge_wins == 1
+
+
+def test_no_hedge_beyond_the_budget():
+    hedged, fake = make_hedged([0.2], timeout_s=2.0, hedge_after_s=0.05, hedge_budget=0.0)
+    asyncio.run(hedged.ainvoke("ping"))
+
+    assert [event for event, _ in fake.events] == ["start", "done"]
+    assert hedged.stats.hedged == 0
+
+
+class StartCounter(BaseCallbackHandler):
+    def __init__(self):
+        self.starts = 0
+
+    def on_chat_model_start(self, *args, **kwargs):
+        self.starts += 1
+
+
+@pytest.mark.parametrize("sync", [False, True])
+def test_run_manager_reaches_the_wrapped_model(sync):
+    hedged, fake = make_hedged([0.0], timeout_s=2.0)
+    config = {"callbacks": [StartCounter()]}
+    hedged.invoke("ping", config=config) if sync else asyncio.run(hedged.ainvoke("ping", config=config))
+
+    assert fake.events == [("start", True), ("done", True)]
+
+
+@pytest.mark.parametrize("hedge_after_s", [None, 1.0])
+def test_only_hedged_clients_are_wrapped(hedge_after_s):
+    settings = ProjectSettings(llm_provider="openai", llm_timeout_s=30.0, llm_hedge_after_s=hedge_after_s)
+    llm = get_llm_client(settings)
+
+    assert (find_proxy(llm, HedgedChatModel) is not None) == (hedge_after_s is not None)
@@ -0,0 +1,101 @@
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from deps.llm_client import _PerLoopTransport
+from deps.llm_pool import PooledChatModel, is_transient
+
+
+class StatusError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class FailingChatModel(BaseChatModel):
+    """Raises `error` (when set) and counts its calls."""
+
+    error: Exception | None = None
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "failing-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="ok"))])
+
+
+@pytest.mark.parametrize(
+    "error, transient",
+    [
+        (TimeoutError(), True),
+        (httpx.ConnectError("refused"), True),
+        (StatusError(429), True),
+        (StatusError(503), True),
+        (StatusError(400), False),
+        (ValueError("invalid tool call"), False),
+    ],
+)
+def test_is_transient(error, transient):
+    assert is_transient(error) is transient
+
+
+def make_pool(first_error: Exception) -> PooledChatModel:
+    members = [FailingChatModel(error=first_error), FailingChatModel()]
+    return PooledChatModel(llm=members[0], members=members, unhealthy_after=1)
+
+
+def test_transient_error_is_retried_on_the_next_member():
+    pool = make_pool(StatusError(503))
+    assert pool.invoke("ping").content == "ok"
+    assert [member.calls for member in pool.members] == [1, 1]
+    assert [stats["healthy"] for stats in pool.member_stats()] == [False, True]
+
+
+def test_request_error_is_raised_without_retrying_or_marking_the_member_down():
+    pool = make_pool(StatusError(400))
+    with pytest.raises(StatusError):
+        pool.invoke("ping")
+    assert [member.calls for member in pool.members] == [1, 0]
+    assert all(stats["healthy"] for stats in pool.member_stats())
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+def test_async_client_is_reusable_across_event_loops():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    transport = _PerLoopTransport(httpx.Limits(max_keepalive_connections=2))
+    client = httpx.AsyncClient(transport=transport)
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+
+    async def get() -> str:
+        return (await client.get(url)).text
+
+    try:
+        # Each asyncio.run is a new loop; keep-alive connections of the previous one must not be reused
+        assert [asyncio.run(get()) for _ in range(3)] == ["ok"] * 3
+        assert len(transport.transports) <= 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,137 @@
+from contextlib import contextmanager
+
+import asyncio
+
+import numpy as np
+import pytest
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+
+from deps.llm_client import ModelRouter
+from diagnosis import DiagnosisIndex
+from qa_chain import KnowledgeGraphQAChain
+
+
+class FakeRecord:
+    def __init__(self, route: str, rejections: list):
+        self.route = route
+        self.rejections = rejections
+
+    def reject(self, reason: str) -> None:
+        self.rejections.append((self.route, reason))
+
+
+class FakeRouter:
+    enabled = True
+
+    def __init__(self):
+        self.rejections = []
+
+    def routes(self, prefer_small: bool = True) -> list[str]:
+        return [ModelRouter.SMALL, ModelRouter.LARGE]
+
+    @contextmanager
+    def track(self, task: str, route: str):
+        yield FakeRecord(route, self.rejections)
+
+
+class FakeTextIndex:
+    """Matches every question, like BM25 over node text does."""
+
+    def search(self, query: str, top_k: int = 5) -> list[tuple[int, float]]:
+        return [(0, 1.0)]
+
+
+def test_empty_small_route_escalates_even_when_text_index_matches(monkeypatch):
+    chain = KnowledgeGraphQAChain.model_construct(
+        router=FakeRouter(),
+        cypher_generation_chain="small",
+        escalation_cypher_generation_chain="large",
+        text_index=FakeTextIndex(),
+    )
+    monkeypatch.setattr(
+        KnowledgeGraphQAChain, "_generate_cypher", lambda self, cypher_chain, *args: f"MATCH ({cypher_chain})"
+    )
+    rows = {"MATCH (small)": [], "MATCH (large)": [{"id": "Root Rot"}]}
+    monkeypatch.setattr(KnowledgeGraphQAChain, "_query_graph", lambda self, cypher, params=None: rows[cypher])
+
+    generated_cypher, context = chain._generate_and_query({"question": "Which disease?"}, None, None)
+
+    assert (generated_cypher, context) == ("MATCH (large)", [{"id": "Root Rot"}])
+    assert chain.router.rejections == [(ModelRouter.SMALL, "no rows")]
+
+
+def diagnosis_index() -> DiagnosisIndex:
+    return DiagnosisIndex(
+        symptoms=["Leaf Spots", "Yellowing Leaves"],
+        crop_parts=["Leaf"],
+        diseases=["Leaf Blight", "Root Rot"],
+        seasons=[],
+        paths=np.array([(0, 0, 0), (1, 0, 1)]),
+        disease_seasons=np.empty((0, 2)),
+    )
+
+
+CYPHER_CONTEXT = [{"treatment": "Metalaxyl"}]
+
+
+@pytest.mark.parametrize(
+    "question, diagnosed",
+    [
+        ("If my tree has yellowing leaves, what disease could it be?", True),
+        ("What's wrong with my durian? It has leaf spots.", True),
+        ("Which fungicide may control yellowing leaves?", False),
+        ("What are the symptoms of Leaf Blight besides leaf spots?", False),
+        ("Which disease causes leaf spots on Leaf Blight-resistant varieties?", False),
+    ],
+)
+def test_only_diagnosis_questions_skip_cypher(monkeypatch, question, diagnosed):
+    chain = KnowledgeGraphQAChain.model_construct(
+        diagnosis_index=diagnosis_index(), graph_schema="", return_direct=True, return_intermediate_steps=True
+    )
+    monkeypatch.setattr(
+        KnowledgeGraphQAChain, "_generate_and_query", lambda self, *args: ("MATCH (t:Treatment)", CYPHER_CONTEXT)
+    )
+
+    result = chain._call({"query": question})
+
+    steps = {key for step in result["intermediate_steps"] for key in step}
+    assert ("diagnosis" in steps) == diagnosed
+    assert (result["result"] == CYPHER_CONTEXT) != diagnosed
+
+
+class AsyncOnlyGraph:
+    """Serves rows through `aquery` only; a sync query would block the event loop."""
+
+    def __init__(self):
+        self.queries = []
+
+    async def aquery(self, query, params=None, *, read=False):
+        self.queries.append((query, read))
+        return [{"disease": "Root Rot"}]
+
+    def query(self, query, params=None):
+        raise AssertionError("the async path ran a sync query")
+
+
+def test_ainvoke_awaits_the_llm_stages_and_queries_a_reader():
+    async def generate_cypher(args):
+        return "MATCH (d:Disease) RETURN d.id AS disease"
+
+    async def answer(inputs):
+        return f"It is {inputs['context'][0]['disease']}."
+
+    chain = KnowledgeGraphQAChain.model_construct(
+        graph=AsyncOnlyGraph(),
+        graph_schema="",
+        # Sequences like the real `prompt | llm | parser` chains
+        cypher_generation_chain=RunnablePassthrough() | RunnableLambda(generate_cypher),
+        qa_chain=RunnablePassthrough() | RunnableLambda(answer),
+        compress_context=False,
+        return_intermediate_steps=True,
+    )
+
+    result = asyncio.run(chain._acall({"query": "Which disease affects durian?"}))
+
+    assert result["result"] == "It is Root Rot."
+    assert chain.graph.queries == [("MATCH (d:Disease) RETURN d.id AS disease", True)]
+    assert {"query": "MATCH (d:Disease) RETURN d.id AS disease"} in result["intermediate_steps"]
@@ -0,0 +1,51 @@
+import numpy as np
+
+from text_index import TextIndex
+
+
+def make_index(node_id: str) -> TextIndex:
+    arrays = {
+        "term_indptr": np.array([0, 1], dtype=np.int64),
+        "term_nodes": np.array([0], dtype=np.int32),
+        "term_weights": np.array([1.0], dtype=np.float32),
+        "edge_indptr": np.array([0, 0], dtype=np.int64),
+        "edge_nodes": np.array([], dtype=np.int32),
+        "edge_types": np.array([], dtype=np.int32),
+    }
+    return TextIndex([["Disease", node_id, ""]], [node_id.lower()], [], arrays)
+
+
+def test_save_swaps_in_a_new_version_without_touching_mapped_files(tmp_path):
+    path = tmp_path / "text_index"
+    make_index("Root Rot").save(path)
+    loaded = TextIndex.load(path)
+    first_version = path.resolve()
+
+    make_index("Leaf Blight").save(path)
+
+    assert path.is_symlink() and path.resolve() != first_version
+    # The first process keeps reading the version it mapped
+    assert loaded.nodes[0][1] == "Root Rot" and loaded.term_weights[0] == 1.0
+    assert (first_version / "term_weights.npy").exists()
+    assert TextIndex.load(path).nodes[0][1] == "Leaf Blight"
+
+
+def test_save_keeps_only_the_current_and_previous_versions(tmp_path):
+    path = tmp_path / "text_index"
+    for node_id in ("A", "B", "C"):
+        make_index(node_id).save(path)
+
+    versions = [p for p in tmp_path.iterdir() if p.is_dir() and not p.is_symlink()]
+    assert len(versions) == 2
+    assert TextIndex.load(path).nodes[0][1] == "C"
+
+
+def test_save_replaces_an_unversioned_directory(tmp_path):
+    path = tmp_path / "text_index"
+    path.mkdir()
+    (path / "meta.json").write_text("{}")
+
+    make_index("Root Rot").save(path)
+
+    assert path.is_symlink()
+    assert TextIndex.load(path).nodes[0][1] == "Root Rot"
@@ -0,0 +1,33 @@
+import pandas as pd
+
+from utils import diff_excel_rows, load_dataframe_from_excel
+
+
+def write_workbook(path, names: list[str]) -> None:
+    pd.DataFrame({"Name": names}).to_excel(path, sheet_name="Sheet", index=False)
+
+
+def test_diff_uses_the_version_loaded_last_even_when_served_from_cache(tmp_path):
+    workbook, cache_dir = tmp_path / "data.xlsx", tmp_path / "cache"
+    write_workbook(workbook, ["A", "B"])
+    load_dataframe_from_excel(str(workbook), "Sheet", cache_dir=cache_dir)
+    write_workbook(workbook, ["A", "C"])
+    load_dataframe_from_excel(str(workbook), "Sheet", cache_dir=cache_dir)
+
+    # Reverted: the first version is a cache hit, and becomes the baseline again
+    write_workbook(workbook, ["A", "B"])
+    load_dataframe_from_excel(str(workbook), "Sheet", cache_dir=cache_dir)
+
+    diff = diff_excel_rows(str(workbook), "Sheet", cache_dir=cache_dir)
+    assert diff["changed"].empty and len(diff["unchanged"]) == 2
+
+
+def test_diff_without_updating_the_cache_keeps_the_baseline(tmp_path):
+    workbook, cache_dir = tmp_path / "data.xlsx", tmp_path / "cache"
+    write_workbook(workbook, ["A", "B"])
+    load_dataframe_from_excel(str(workbook), "Sheet", cache_dir=cache_dir)
+    write_workbook(workbook, ["A", "C"])
+
+    for _ in range(2):
+        diff = diff_excel_rows(str(workbook), "Sheet", cache_dir=cache_dir, update_cache=False)
+        assert diff["changed"]["Name"].tolist() == ["C"]
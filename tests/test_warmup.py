@@ -0,0 +1,43 @@
+from settings import ProjectSettings
+from warmup import Warmup
+
+
+class FlakyGraph:
+    """A graph that refuses connections for its first `failures` queries."""
+
+    def __init__(self, failures: int) -> None:
+        self.failures = failures
+        self.queries = 0
+
+    def query(self, query: str):
+        self.queries += 1
+        if self.queries <= self.failures:
+            raise ConnectionError("graph unavailable")
+        return [{"1": 1}]
+
+
+def warmup(graph, **overrides) -> Warmup:
+    settings = ProjectSettings(
+        qa_warmup_pool_connections=1,
+        qa_warmup_refresh_schema=False,
+        qa_warmup_graph_retry_s=0.01,
+        qa_warmup_graph_retry_max_s=0.02,
+        **overrides,
+    )
+    return Warmup(chain=None, graph=graph, questions=[], settings=settings)
+
+
+def test_graph_pool_is_retried_until_the_graph_is_up():
+    warm = warmup(FlakyGraph(failures=3), qa_warmup_graph_deadline_s=5.0)
+    assert warm.run()
+    assert warm.ready.is_set()
+    assert warm.steps["graph_pool"]["attempts"] == 4
+    assert "error" not in warm.steps["graph_pool"]
+
+
+def test_graph_pool_gives_up_after_the_deadline():
+    warm = warmup(FlakyGraph(failures=10**6), qa_warmup_graph_deadline_s=0.05)
+    assert not warm.run()
+    assert not warm.ready.is_set()
+    assert warm.steps["graph_pool"]["attempts"] > 1
+    assert warm.steps["graph_pool"]["error"] == "graph unavailable"